@@ -7,10 +7,10 @@ import sys
 import os
 from typing import List, Dict
 
-# Add the app directory to the Python path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from supabase_client import SupabaseClient
+from app.supabase_client import SupabaseClient
 
 # Master accounts emails
 MASTER_EMAILS = [
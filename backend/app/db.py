@@ -1,48 +1,158 @@
 from __future__ import annotations
 
+import logging
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from datetime import datetime
 import uuid
 
 from pydantic import BaseModel
 
+from .cache import TTLCache
+from .metrics import SQLITE_SECONDS
+from .pagination import decode_cursor, encode_cursor
+from .services.invite_tokens import hash_token
+
+logger = logging.getLogger(__name__)
+
 
 DB_PATH = os.getenv("APP_DB_PATH", str(Path(__file__).resolve().parent / "app.db"))
 
+# Connection pool tuning (see docs/ENV.md)
+DB_POOL_ENABLED = os.getenv("APP_DB_POOL", "true").lower() != "false"
+DB_CACHE_SIZE_KB = int(os.getenv("APP_DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("APP_DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("APP_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE = int(os.getenv("APP_DB_STATEMENT_CACHE", "256"))
 
-def _get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Public profile fields served by /api/me; writes to usuarios drop the user's entry
+PROFILE_CACHE_TTL_SECS = float(os.getenv("PROFILE_CACHE_TTL_SECS", "60"))
+_profile_cache = TTLCache(ttl=PROFILE_CACHE_TTL_SECS)
 
 
-def init_db() -> None:
-    conn = _get_conn()
-    cur = conn.cursor()
+class ConnectionPool:
+    """Per-thread SQLite connections in WAL mode.
 
-    # usuarios table
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id TEXT PRIMARY KEY,
-            nome TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            senha_hash TEXT NOT NULL,
-            papel TEXT NOT NULL CHECK(papel IN ('master','colaborador')),
-            criado_em TEXT NOT NULL
+    Each worker thread keeps one open connection, so the connect/schema-parse
+    cost is paid once per thread instead of once per query. Prepared statements
+    are cached per connection by the sqlite3 module (``cached_statements``).
+    With ``pooled=False`` every acquire opens a fresh connection that is closed
+    on release (the legacy behaviour, kept for benchmarks and debugging).
+    close() drops every connection; threads reconnect on their next acquire.
+    """
+
+    def __init__(self, path: str, *, pooled: bool = True) -> None:
+        self.path = path
+        self.pooled = pooled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: List[sqlite3.Connection] = []
+        # Bumped by close() so threads notice their cached connection is gone
+        self._generation = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=DB_STATEMENT_CACHE,
         )
-        """
-    )
+        conn.row_factory = sqlite3.Row
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if not self.pooled:
+            return self._connect()
+        cached = getattr(self._local, "conn", None)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        conn = self._connect()
+        with self._lock:
+            self._conns.append(conn)
+            self._local.conn = (self._generation, conn)
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if not self.pooled:
+            conn.close()
+        elif conn.in_transaction:
+            # Never hand a half-finished transaction to the next caller
+            conn.rollback()
+
+    def close(self) -> None:
+        with self._lock:
+            self._generation += 1
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, (re)creating it if DB_PATH changed."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.path == DB_PATH:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH, pooled=DB_POOL_ENABLED)
+        return _pool
+
 
-    # tokens_convite table
-    cur.execute(
+def close_pool() -> None:
+    """Close every pooled connection. Called from the FastAPI lifespan on shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def _connection() -> Iterator[sqlite3.Connection]:
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        with SQLITE_SECONDS.time("app"):
+            yield conn
+    finally:
+        pool.release(conn)
+
+
+def _hash_tokens_at_rest(conn: sqlite3.Connection) -> None:
+    """Rebuild tokens_convite with HMAC digests in place of the plain tokens."""
+    rows = conn.execute("SELECT id, token, usado, criado_por, criado_em, usado_em FROM tokens_convite").fetchall()
+    # Only hashes (and so only needs INVITE_TOKEN_SECRET) if there are rows
+    if rows and not os.getenv("INVITE_TOKEN_SECRET"):
+        raise RuntimeError(
+            f"INVITE_TOKEN_SECRET must be set to migrate {DB_PATH} to schema version 3: "
+            f"its {len(rows)} invite tokens are stored hashed with it from now on"
+        )
+    conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS tokens_convite (
+        CREATE TABLE tokens_convite_novo (
             id TEXT PRIMARY KEY,
-            token TEXT NOT NULL,
+            token_hash TEXT NOT NULL,
             usado INTEGER NOT NULL DEFAULT 0,
             criado_por TEXT NOT NULL,
             criado_em TEXT NOT NULL,
@@ -51,9 +161,144 @@ def init_db() -> None:
         )
         """
     )
+    conn.executemany(
+        "INSERT INTO tokens_convite_novo (id, token_hash, usado, criado_por, criado_em, usado_em) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        ((r[0], hash_token(r[1]), r[2], r[3], r[4], r[5]) for r in rows),
+    )
+    conn.execute("DROP TABLE tokens_convite")
+    conn.execute("ALTER TABLE tokens_convite_novo RENAME TO tokens_convite")
+    conn.execute("CREATE UNIQUE INDEX idx_tokens_convite_token_hash ON tokens_convite(token_hash)")
+    conn.execute("CREATE INDEX idx_tokens_convite_criado_em ON tokens_convite(criado_em, id)")
+    conn.execute("CREATE INDEX idx_tokens_convite_usado ON tokens_convite(usado, criado_em, id)")
+    conn.execute("CREATE INDEX idx_tokens_convite_criado_por ON tokens_convite(criado_por)")
+
+
+# Ordered schema steps, each a tuple of SQL strings or callables taking the
+# connection. A released step is never edited: change the schema by appending
+# a new one. Step 1 uses IF NOT EXISTS so databases created before the runner
+# existed are adopted as-is.
+MigrationStep = Union[str, Callable[[sqlite3.Connection], None]]
+MIGRATIONS: List[Tuple[int, str, Tuple[MigrationStep, ...]]] = [
+    (
+        1,
+        "usuarios e tokens_convite",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS usuarios (
+                id TEXT PRIMARY KEY,
+                nome TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE,
+                senha_hash TEXT NOT NULL,
+                papel TEXT NOT NULL CHECK(papel IN ('master','colaborador')),
+                criado_em TEXT NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS tokens_convite (
+                id TEXT PRIMARY KEY,
+                token TEXT NOT NULL,
+                usado INTEGER NOT NULL DEFAULT 0,
+                criado_por TEXT NOT NULL,
+                criado_em TEXT NOT NULL,
+                usado_em TEXT,
+                FOREIGN KEY(criado_por) REFERENCES usuarios(id)
+            )
+            """,
+        ),
+    ),
+    (
+        2,
+        "índices de tokens_convite",
+        (
+            # get_token_record_by_token
+            "CREATE INDEX IF NOT EXISTS idx_tokens_convite_token ON tokens_convite(token)",
+            # Keyset pagination newest-first, overall and per status (also purge_used_tokens)
+            "CREATE INDEX IF NOT EXISTS idx_tokens_convite_criado_em ON tokens_convite(criado_em, id)",
+            "CREATE INDEX IF NOT EXISTS idx_tokens_convite_usado ON tokens_convite(usado, criado_em, id)",
+            # Foreign key to usuarios
+            "CREATE INDEX IF NOT EXISTS idx_tokens_convite_criado_por ON tokens_convite(criado_por)",
+        ),
+    ),
+    (3, "tokens_convite guarda só o HMAC do token", (_hash_tokens_at_rest,)),
+    (
+        4,
+        "alimentos_custom",
+        (
+            # Like CustomFood in utils/customFoods.ts: values per `grams` (the base portion).
+            # usuario_id is the JWT subject, which may be a Supabase user with no usuarios row
+            """
+            CREATE TABLE IF NOT EXISTS alimentos_custom (
+                id TEXT PRIMARY KEY,
+                usuario_id TEXT NOT NULL,
+                food_name TEXT NOT NULL,
+                grams REAL NOT NULL,
+                energy_kcal REAL NOT NULL,
+                carbs_g REAL NOT NULL,
+                protein_g REAL NOT NULL,
+                fat_g REAL NOT NULL,
+                fiber_g REAL NOT NULL DEFAULT 0,
+                category TEXT,
+                criado_em TEXT NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_alimentos_custom_usuario ON alimentos_custom(usuario_id, criado_em)",
+        ),
+    ),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()
+    return row["version"] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations in order. Returns the versions applied."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TEXT NOT NULL
+        )
+        """
+    )
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return []
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        # IMMEDIATE takes the write lock first, so two workers starting together
+        # can't both apply the same step; the loser re-reads the version and skips
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.execute("COMMIT")
+                continue
+            for step in statements:
+                if isinstance(step, str):
+                    conn.execute(step)
+                else:
+                    step(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, descricao, aplicada_em) VALUES (?, ?, ?)",
+                (version, description, _now_iso()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        applied.append(version)
+    return applied
+
 
-    conn.commit()
-    conn.close()
+def init_db() -> None:
+    with _connection() as conn:
+        applied = migrate(conn)
+    if applied:
+        logger.info("SQLite schema migrated to version %s (applied %s)", applied[-1], applied)
 
 
 def _now_iso() -> str:
@@ -61,33 +306,43 @@ def _now_iso() -> str:
 
 
 def get_usuario_by_email(email: str) -> Optional[sqlite3.Row]:
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM usuarios WHERE email = ?", (email.lower(),))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    with _connection() as conn:
+        return conn.execute("SELECT * FROM usuarios WHERE email = ?", (email.lower(),)).fetchone()
 
 
 def get_usuario_by_id(user_id: str) -> Optional[sqlite3.Row]:
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM usuarios WHERE id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    with _connection() as conn:
+        return conn.execute("SELECT * FROM usuarios WHERE id = ?", (user_id,)).fetchone()
+
+
+def get_usuario_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    """id, nome, email and papel of a user, cached for PROFILE_CACHE_TTL_SECS."""
+    def load() -> Optional[Dict[str, Any]]:
+        row = get_usuario_by_id(user_id)
+        return {k: row[k] for k in ("id", "nome", "email", "papel")} if row else None
+
+    profile = _profile_cache.get_or_load(user_id, load)
+    return dict(profile) if profile else None
+
+
+def invalidate_usuario(user_id: str) -> None:
+    """Drop cached copies of a user; call after any write to their usuarios row."""
+    _profile_cache.invalidate(user_id)
+
+
+def profile_cache_stats() -> Dict[str, Any]:
+    return _profile_cache.stats()
 
 
 def create_usuario(nome: str, email: str, senha_hash: str, papel: str) -> str:
     user_id = str(uuid.uuid4())
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO usuarios (id, nome, email, senha_hash, papel, criado_em) VALUES (?, ?, ?, ?, ?, ?)",
-        (user_id, nome, email.lower(), senha_hash, papel, _now_iso()),
-    )
-    conn.commit()
-    conn.close()
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                "INSERT INTO usuarios (id, nome, email, senha_hash, papel, criado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, nome, email.lower(), senha_hash, papel, _now_iso()),
+            )
+    invalidate_usuario(user_id)
     return user_id
 
 
@@ -103,48 +358,131 @@ def ensure_master(email: Optional[str], senha_hash: Optional[str]) -> Optional[s
 
 
 def insert_token(criado_por: str) -> Tuple[str, str]:
+    """Create a token. Only its HMAC is stored, so the plain token returned here is the only copy."""
     token_id = str(uuid.uuid4())
     token_plain = str(uuid.uuid4())
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO tokens_convite (id, token, criado_por, criado_em, usado) VALUES (?, ?, ?, ?, 0)",
-        (token_id, token_plain, criado_por, _now_iso()),
-    )
-    conn.commit()
-    conn.close()
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                "INSERT INTO tokens_convite (id, token_hash, criado_por, criado_em, usado) VALUES (?, ?, ?, ?, 0)",
+                (token_id, hash_token(token_plain), criado_por, _now_iso()),
+            )
     return token_id, token_plain
 
 
-def mark_token_used(token_id: str) -> None:
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE tokens_convite SET usado = 1, usado_em = ? WHERE id = ?",
-        (_now_iso(), token_id),
-    )
-    conn.commit()
-    conn.close()
+def mark_token_used(token_id: str) -> bool:
+    """Claim a single-use token; False when it was already used (e.g. by a concurrent sign-up)."""
+    with _connection() as conn:
+        with conn:
+            cursor = conn.execute(
+                "UPDATE tokens_convite SET usado = 1, usado_em = ? WHERE id = ? AND usado = 0",
+                (_now_iso(), token_id),
+            )
+            return cursor.rowcount == 1
+
+
+def create_usuario_with_token(token_id: str, nome: str, email: str, senha_hash: str, papel: str) -> Optional[str]:
+    """Claim a token and create its user in one transaction.
+
+    Returns None when the token was already used. A failed insert (sqlite3.IntegrityError
+    on a duplicate email) rolls the claim back, so the token stays usable.
+    """
+    user_id = str(uuid.uuid4())
+    now = _now_iso()
+    with _connection() as conn:
+        with conn:
+            claimed = conn.execute(
+                "UPDATE tokens_convite SET usado = 1, usado_em = ? WHERE id = ? AND usado = 0", (now, token_id)
+            ).rowcount
+            if claimed != 1:
+                return None
+            conn.execute(
+                "INSERT INTO usuarios (id, nome, email, senha_hash, papel, criado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, nome, email.lower(), senha_hash, papel, now),
+            )
+    invalidate_usuario(user_id)
+    return user_id
 
 
 def get_token_record_by_token(token: str) -> Optional[sqlite3.Row]:
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tokens_convite WHERE token = ?", (token,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    # One probe of the UNIQUE digest index; the comparison never sees the plain token
+    token_hash = hash_token(token)
+    with _connection() as conn:
+        return conn.execute("SELECT * FROM tokens_convite WHERE token_hash = ?", (token_hash,)).fetchone()
+
+
+def purge_used_tokens(used_before: datetime, limit: int) -> int:
+    """Delete up to `limit` tokens used before used_before. Returns how many were deleted."""
+    with _connection() as conn:
+        with conn:
+            cur = conn.execute(
+                "DELETE FROM tokens_convite WHERE id IN "
+                "(SELECT id FROM tokens_convite WHERE usado = 1 AND usado_em < ? LIMIT ?)",
+                (used_before.isoformat(timespec="seconds") + "Z", limit),
+            )
+            return cur.rowcount
+
+
+TOKEN_STATUSES = ("used", "active")
+
+
+def list_tokens_page(
+    limit: int = 20, cursor: Optional[str] = None, status: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Newest-first page of tokens plus the cursor of the next page (None on the last page)."""
+    where: List[str] = []
+    params: List[Any] = []
+    if status == "used":
+        where.append("usado = 1")
+    elif status == "active":
+        where.append("usado = 0")
+    elif status:
+        raise ValueError(f"Unknown token status: {status}")
+    after = decode_cursor(cursor)
+    if after:
+        where.append("(criado_em, id) < (?, ?)")
+        params.extend(after)
+    sql = "SELECT id, usado, criado_por, criado_em, usado_em FROM tokens_convite"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY criado_em DESC, id DESC LIMIT ?"
+    # One extra row tells whether another page exists
+    params.append(limit + 1)
+    with _connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["criado_em"], items[-1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
 
 
 def list_tokens(limit: int = 20) -> List[Dict[str, Any]]:
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, token, usado, criado_por, criado_em, usado_em FROM tokens_convite ORDER BY criado_em DESC LIMIT ?",
-        (limit,),
-    )
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    return list_tokens_page(limit)[0]
+
+
+CUSTOM_FOOD_COLUMNS = ("food_name", "grams", "energy_kcal", "carbs_g", "protein_g", "fat_g", "fiber_g", "category")
+
+
+def insert_custom_food(usuario_id: str, food: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a custom food (values per `grams`); returns the stored row."""
+    row = {column: food.get(column) for column in CUSTOM_FOOD_COLUMNS}
+    row.update(id=str(uuid.uuid4()), usuario_id=usuario_id, criado_em=_now_iso())
+    with _connection() as conn:
+        with conn:
+            conn.execute(
+                f"INSERT INTO alimentos_custom (id, usuario_id, criado_em, {', '.join(CUSTOM_FOOD_COLUMNS)}) "
+                f"VALUES (?, ?, ?{', ?' * len(CUSTOM_FOOD_COLUMNS)})",
+                (row["id"], usuario_id, row["criado_em"], *(row[column] for column in CUSTOM_FOOD_COLUMNS)),
+            )
+    return row
 
 
+def list_custom_foods(usuario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Custom foods of one user, or of everyone, oldest first."""
+    with _connection() as conn:
+        if usuario_id is None:
+            rows = conn.execute("SELECT * FROM alimentos_custom ORDER BY criado_em, id").fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM alimentos_custom WHERE usuario_id = ? ORDER BY criado_em, id", (usuario_id,)
+            ).fetchall()
+    return [dict(row) for row in rows]
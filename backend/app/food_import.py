@@ -0,0 +1,519 @@
+"""
+Bulk import of TACO/TBCA food tables into the foods catalog.
+
+CSV and XLSX exports are read a row at a time (csv, or openpyxl in
+read-only mode) and written in chunks, so a table of any size imports in
+constant memory:
+
+- the header row is found by its column names, as printed in the tables or
+  as in the foods table ("Descrição dos alimentos", "Energia (kcal)",
+  "Lipídeos (g)", "carbs_g", ...); title rows above it are skipped and a
+  unit in parentheses is applied (kJ, mg)
+- values take decimal commas; "Tr" (traces) reads as 0, and "NA", "*" or
+  "-" as missing
+- unit and portion_grams are normalized (kg -> 1000 g, l -> 1000 ml; the
+  100 g base of TACO/TBCA when there is no portion), and a missing or zero
+  energy_kcal is filled from kJ or from the macros (4/4/9 kcal per gram)
+- a row holding a single text cell is a group heading ("Cereais e
+  derivados" in TACO) and becomes the category of the rows below it
+- every food gets generateSlug's slug (datafoods.ts) and is upserted by it:
+  a name repeated within a chunk keeps its last row, one already stored is
+  updated
+
+Foods go to an SQLite file (FOOD_IMPORT_DB_PATH; point FOOD_CATALOG_PATH at
+it to serve them) or to the Supabase foods table (without slug and
+category, which it doesn't have), FOOD_IMPORT_CHUNK_SIZE rows per
+transaction or request. A progress callback gets the running
+totals after every chunk.
+
+CLI: scripts/import_foods.py. API: POST /api/foods/import (master only).
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .food_search import fold
+
+try:
+    import openpyxl
+except ImportError:  # CSV imports work without it
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+FOOD_IMPORT_DB_PATH = os.getenv("FOOD_IMPORT_DB_PATH")
+FOOD_IMPORT_CHUNK_SIZE = int(os.getenv("FOOD_IMPORT_CHUNK_SIZE", "500"))
+
+# Columns written for every food (the Food interface in datafoods.ts, plus slug and category)
+IMPORT_COLUMNS = (
+    "slug", "food_name", "unit", "portion_grams", "carbs_g", "protein_g", "fat_g", "fiber_g", "energy_kcal", "source",
+    "category",
+)
+# The ones the Supabase foods table has (the Food interface itself)
+SUPABASE_COLUMNS = IMPORT_COLUMNS[1:-1]
+
+# Header names, folded and without the unit in parentheses -> field
+HEADER_ALIASES = {
+    **dict.fromkeys(("food name", "descricao dos alimentos", "descricao", "alimento", "nome", "nome do alimento"),
+                    "food_name"),
+    **dict.fromkeys(("energy", "energia", "valor energetico"), "energy"),
+    **dict.fromkeys(("energy kcal", "energia kcal", "kcal"), "energy_kcal"),
+    **dict.fromkeys(("energy kj", "energia kj", "kj"), "energy_kj"),
+    **dict.fromkeys(("protein g", "protein", "proteina", "proteinas"), "protein_g"),
+    **dict.fromkeys(("fat g", "fat", "lipideos", "lipidios", "lipideos totais", "gordura", "gorduras totais"), "fat_g"),
+    **dict.fromkeys(("carbs g", "carbs", "carboidrato", "carboidratos", "carboidrato total", "carboidratos totais"),
+                    "carbs_g"),
+    **dict.fromkeys(("fiber g", "fiber", "fibra", "fibras", "fibra alimentar"), "fiber_g"),
+    **dict.fromkeys(("category", "categoria", "grupo", "grupo de alimentos"), "category"),
+    **dict.fromkeys(("unit", "unidade", "medida"), "unit"),
+    **dict.fromkeys(("portion grams", "portion", "porcao", "porcao gramas"), "portion_grams"),
+    **dict.fromkeys(("source", "fonte"), "source"),
+}
+MACRO_COLUMNS = ("carbs_g", "protein_g", "fat_g", "fiber_g")
+NUTRIENT_FIELDS = ("energy_kcal", "energy_kj") + MACRO_COLUMNS
+KJ_PER_KCAL = 4.184
+# kcal per gram of protein, carbs and fat
+ATWATER = {"protein_g": 4, "carbs_g": 4, "fat_g": 9}
+
+_MASS_UNITS = {"g": 1.0, "mg": 1e-3, "mcg": 1e-6, "ug": 1e-6}
+# Portion unit -> (stored unit, grams or ml per unit)
+_UNITS = {
+    **dict.fromkeys(("", "g", "gr", "grama", "gramas"), ("g", 1.0)),
+    **dict.fromkeys(("kg", "quilo", "quilos"), ("g", 1000.0)),
+    **dict.fromkeys(("ml", "mililitro", "mililitros"), ("ml", 1.0)),
+    **dict.fromkeys(("l", "litro", "litros"), ("ml", 1000.0)),
+}
+_COUNT_UNITS = {"un", "und", "unid", "unidade", "unidades"}
+_MISSING = {"", "na", "n/a", "nd", "*", "-", "--"}
+_TRACES = {"tr", "traco", "tracos"}
+_UNIT_IN_PARENS = re.compile(r"\(([^)]*)\)")
+_AMOUNT = re.compile(r"^\s*(\d[\d.,]*)\s*([^\d\s].*)?$")
+# Title rows a table may have above its header
+_HEADER_SEARCH_ROWS = 50
+
+Cell = Any
+ProgressCallback = Callable[["ImportStats"], None]
+
+
+class ImportFormatError(ValueError):
+    """The file can't be read as a food table."""
+
+
+def generate_slug(name: str) -> str:
+    """generateSlug in datafoods.ts: "Feijão, carioca, cru" -> "feijao_carioca_cru"."""
+    return fold(name).replace(" ", "_")
+
+
+def parse_number(value: Cell) -> Optional[float]:
+    """A table value as a float: decimal commas, "Tr" (traces) as 0, None when missing."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    text = str(value).strip().lower().replace(" ", "")
+    if text in _MISSING:
+        return None
+    if text in _TRACES:
+        return 0.0
+    if "," in text:
+        # 1.234,5 -> 1234.5
+        text = text.replace(".", "").replace(",", ".")
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _unit(text: str) -> Tuple[str, Optional[float]]:
+    """(stored unit, grams or ml per unit); None for household measures, which have no fixed weight."""
+    if text in _UNITS:
+        return _UNITS[text]
+    return ("unidade" if text in _COUNT_UNITS else text), None
+
+
+def normalize_portion(portion: Cell, unit: Cell) -> Tuple[str, float]:
+    """(unit, portion_grams): "1,5 kg" -> ("g", 1500.0); no portion -> the 100 g base."""
+    unit_text = fold(str(unit)) if unit is not None else ""
+    stored, factor = _unit(unit_text)
+    # A bare number next to "unidade" is the weight of one, in grams
+    factor = factor or 1.0
+    if isinstance(portion, str):
+        match = _AMOUNT.match(portion)
+        amount = parse_number(match.group(1)) if match else None
+        if match and match.group(2):
+            own, own_factor = _unit(fold(match.group(2)))
+            stored = stored if unit_text else own
+            if own_factor is None:
+                amount = None  # "1 fatia"
+            else:
+                factor = own_factor
+    else:
+        amount = parse_number(portion)
+    return stored, round(amount * factor, 2) if amount and amount > 0 else 100.0
+
+
+def header_fields(row: Sequence[Cell]) -> Dict[int, Tuple[str, float]]:
+    """Column position -> (field, scale) for the columns of a header row that name a known field."""
+    fields: Dict[int, Tuple[str, float]] = {}
+    taken = set()
+    for position, cell in enumerate(row):
+        if cell is None:
+            continue
+        text = str(cell)
+        match = _UNIT_IN_PARENS.search(text)
+        unit = fold(match.group(1)) if match else ""
+        field = HEADER_ALIASES.get(fold(_UNIT_IN_PARENS.sub(" ", text).replace("_", " ")))
+        if field == "energy":
+            field = "energy_kj" if unit == "kj" else "energy_kcal"
+        # The first column naming a field wins
+        if field is None or field in taken:
+            continue
+        taken.add(field)
+        fields[position] = (field, _MASS_UNITS.get(unit, 1.0) if field in MACRO_COLUMNS else 1.0)
+    return fields
+
+
+def _source_from_filename(filename: str) -> Optional[str]:
+    name = fold(os.path.basename(filename).replace("_", " ").replace(".", " "))
+    for source in ("TACO", "TBCA"):
+        if source.lower() in name.split():
+            return source
+    return None
+
+
+def _heading(row: Sequence[Cell]) -> Optional[str]:
+    cells = [cell for cell in row if cell is not None and str(cell).strip()]
+    if len(cells) == 1 and isinstance(cells[0], str) and parse_number(cells[0]) is None:
+        return " ".join(cells[0].split())
+    return None
+
+
+class RowNormalizer:
+    """Turns data rows into foods, given the header's columns; tracks the current group heading."""
+
+    def __init__(self, fields: Dict[int, Tuple[str, float]], source: Optional[str] = None) -> None:
+        self.fields = fields
+        self.source = source
+        self.category: Optional[str] = None
+        self.has_category = any(field == "category" for field, _ in fields.values())
+
+    def __call__(self, row: Sequence[Cell]) -> Optional[Dict[str, Any]]:
+        """The food in a row, or None for a row without a name or without any value."""
+        cells: Dict[str, Cell] = {}
+        nutrients: Dict[str, Optional[float]] = {}
+        for position, (field, scale) in self.fields.items():
+            cell = row[position] if position < len(row) else None
+            if field in NUTRIENT_FIELDS:
+                value = parse_number(cell)
+                nutrients[field] = None if value is None else value * scale
+            else:
+                cells[field] = cell
+        name = " ".join(str(cells.get("food_name") or "").split())
+        slug = generate_slug(name)
+        if not slug or all(value is None for value in nutrients.values()):
+            return None
+
+        unit, portion_grams = normalize_portion(cells.get("portion_grams"), cells.get("unit"))
+        food: Dict[str, Any] = {"slug": slug, "food_name": name, "unit": unit, "portion_grams": portion_grams}
+        for column in ("carbs_g", "protein_g", "fat_g"):
+            food[column] = round(nutrients.get(column) or 0.0, 2)
+        fiber = nutrients.get("fiber_g")
+        food["fiber_g"] = None if fiber is None else round(fiber, 2)
+        energy = nutrients.get("energy_kcal")
+        if not energy:
+            kj = nutrients.get("energy_kj")
+            energy = kj / KJ_PER_KCAL if kj else sum(food[column] * kcal for column, kcal in ATWATER.items())
+        food["energy_kcal"] = round(energy, 1)
+        source = str(cells.get("source") or "").strip() or self.source
+        food["source"] = source.upper() if source else None
+        category = " ".join(str(cells.get("category") or "").split())
+        food["category"] = category or self.category
+        return food
+
+
+# ===== Reading =====
+
+def _delimiter(sample: str) -> str:
+    """
+    The separator that splits most lines into the same number of cells:
+    tables saved by a Brazilian Excel use ";", and their decimal commas make
+    the count of "," vary from line to line.
+    """
+    lines = [line for line in sample.splitlines()[:50] if line.strip()]
+    best, best_cells = ",", 0
+    for candidate in ";\t,":
+        counts = Counter(line.count(candidate) for line in lines)
+        count, _ = max(counts.items(), key=lambda item: (item[1], item[0]), default=(0, 0))
+        if count > best_cells:
+            best, best_cells = candidate, count
+    return best
+
+
+def _csv_rows(file: BinaryIO) -> Iterator[List[Cell]]:
+    sample = file.read(65536)
+    file.seek(0)
+    encoding = "utf-8-sig"
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(sample) - 3:  # not just a character cut at the end of the sample
+            encoding = "cp1252"  # Excel's CSV on Windows
+    delimiter = _delimiter(sample.decode(encoding, errors="ignore"))
+    reader = io.TextIOWrapper(file, encoding=encoding, newline="")
+    try:
+        yield from csv.reader(reader, delimiter=delimiter)
+    except UnicodeDecodeError as e:
+        # The encoding was guessed from the first 64 KB
+        raise ImportFormatError(
+            f"Codificação do arquivo não reconhecida ({e.reason}); salve o CSV como UTF-8."
+        ) from e
+    finally:
+        reader.detach()  # the caller closes the file
+
+
+def _xlsx_rows(file: BinaryIO, sheet: Optional[str]) -> Iterator[List[Cell]]:
+    if openpyxl is None:
+        raise ImportFormatError("Importar XLSX requer o pacote openpyxl; exporte a tabela como CSV ou instale-o.")
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        if sheet and sheet not in workbook.sheetnames:
+            raise ImportFormatError(f"Planilha não encontrada: {sheet}")
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        for row in worksheet.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def iter_rows(file: Union[str, os.PathLike, BinaryIO], sheet: Optional[str] = None) -> Iterator[List[Cell]]:
+    """Rows of a CSV or XLSX file (a path or a seekable binary file) as lists of cells, read lazily."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            yield from iter_rows(f, sheet)
+        return
+    magic = file.read(4)
+    file.seek(0)
+    # XLSX is a zip archive
+    yield from _xlsx_rows(file, sheet) if magic == b"PK\x03\x04" else _csv_rows(file)
+
+
+def read_foods(
+    file: Union[str, os.PathLike, BinaryIO],
+    source: Optional[str] = None,
+    sheet: Optional[str] = None,
+    filename: str = "",
+    stats: Optional["ImportStats"] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Normalized foods from a TACO/TBCA table, one row at a time. `source`
+    defaults to the source column, or to TACO/TBCA when the file name says so.
+    Raises ImportFormatError when no header row is found.
+    """
+    if not filename and isinstance(file, (str, os.PathLike)):
+        filename = os.fspath(file)
+    stats = stats if stats is not None else ImportStats()
+    normalize: Optional[RowNormalizer] = None
+    for position, row in enumerate(iter_rows(file, sheet)):
+        if normalize is None:
+            fields = header_fields(row)
+            named = {field for field, _ in fields.values()}
+            if "food_name" in named and named & set(NUTRIENT_FIELDS):
+                normalize = RowNormalizer(fields, source or _source_from_filename(filename))
+            elif position >= _HEADER_SEARCH_ROWS:
+                break
+            continue
+
+        heading = _heading(row)
+        if heading is not None and not normalize.has_category:
+            normalize.category = heading
+            continue
+        if not any(cell is not None and str(cell).strip() for cell in row):
+            continue
+        stats.read += 1
+        food = normalize(row)
+        if food is None:
+            stats.skipped += 1
+        else:
+            yield food
+    if normalize is None:
+        raise ImportFormatError(
+            "Cabeçalho não encontrado: a tabela precisa de uma coluna de nome do alimento e uma de nutriente."
+        )
+
+
+# ===== Writing =====
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SQLiteFoodSink:
+    """A foods table, unique by slug, in an SQLite file (created on first use); one transaction per chunk."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS foods ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, slug TEXT NOT NULL UNIQUE, food_name TEXT NOT NULL, unit TEXT, "
+            "portion_grams REAL, carbs_g REAL, protein_g REAL, fat_g REAL, fiber_g REAL, energy_kcal REAL, "
+            "source TEXT, category TEXT, created_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        updates = ", ".join(f"{column} = excluded.{column}" for column in IMPORT_COLUMNS[1:])
+        self._upsert = (
+            f"INSERT INTO foods ({', '.join(IMPORT_COLUMNS)}, created_at, updated_at) "
+            f"VALUES ({', '.join('?' * (len(IMPORT_COLUMNS) + 2))}) "
+            f"ON CONFLICT(slug) DO UPDATE SET {updates}, updated_at = excluded.updated_at"
+        )
+
+    def upsert(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Insert or update rows (distinct slugs); returns (inserted, updated)."""
+        now = _now_iso()
+        with self.conn:
+            # One parameter however large the chunk (SQLite caps the number of ?s)
+            (existing,) = self.conn.execute(
+                "SELECT COUNT(*) FROM foods WHERE slug IN (SELECT value FROM json_each(?))",
+                (json.dumps([row["slug"] for row in rows]),),
+            ).fetchone()
+            self.conn.executemany(self._upsert, [[row[c] for c in IMPORT_COLUMNS] + [now, now] for row in rows])
+        return len(rows) - existing, existing
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class SupabaseFoodSink:
+    """
+    The Supabase foods table. It has only the columns of the Food interface
+    (no slug, no category), so stored foods are matched by food_name and
+    each chunk is one insert for new foods plus one upsert by id for the
+    ones already there.
+    """
+
+    # Names per existence lookup: they travel in the query string
+    LOOKUP_BATCH = 100
+
+    def __init__(self, client: Any = None) -> None:
+        if client is None:
+            # Imported here: SQLite imports need no Supabase setup
+            from .supabase_client import get_supabase_client
+
+            client = get_supabase_client().client
+        self.client = client
+
+    def upsert(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        from postgrest.types import ReturnMethod
+
+        foods = self.client.table("foods")
+        names = [row["food_name"] for row in rows]
+        ids: Dict[str, Any] = {}
+        for start in range(0, len(names), self.LOOKUP_BATCH):
+            found = foods.select("id, food_name").in_("food_name", names[start:start + self.LOOKUP_BATCH]).execute()
+            ids.update((row["food_name"], row["id"]) for row in found.data)
+        new, stored = [], []
+        for row in rows:
+            food = {c: row[c] for c in SUPABASE_COLUMNS}
+            if row["food_name"] in ids:
+                stored.append({"id": ids[row["food_name"]], **food})
+            else:
+                new.append(food)
+        if new:
+            self.client.table("foods").insert(new, returning=ReturnMethod.minimal).execute()
+        if stored:
+            self.client.table("foods").upsert(stored, on_conflict="id", returning=ReturnMethod.minimal).execute()
+        return len(new), len(stored)
+
+    def close(self) -> None:
+        pass
+
+
+def default_sink() -> Union[SQLiteFoodSink, SupabaseFoodSink]:
+    """FOOD_IMPORT_DB_PATH when set, else Supabase (ValueError when it isn't configured either)."""
+    return SQLiteFoodSink(FOOD_IMPORT_DB_PATH) if FOOD_IMPORT_DB_PATH else SupabaseFoodSink()
+
+
+class ImportStats:
+    """Running totals of an import: rows read, foods written, and throughput."""
+
+    __slots__ = ("read", "imported", "inserted", "updated", "duplicates", "skipped", "chunks", "started", "elapsed")
+
+    def __init__(self) -> None:
+        self.read = self.imported = self.inserted = self.updated = 0
+        self.duplicates = self.skipped = self.chunks = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "read": self.read,
+            "imported": self.imported,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+            "elapsed_s": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+        }
+
+
+def import_foods(
+    file: Union[str, os.PathLike, BinaryIO],
+    sink: Any,
+    source: Optional[str] = None,
+    sheet: Optional[str] = None,
+    filename: str = "",
+    chunk_size: int = FOOD_IMPORT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> ImportStats:
+    """
+    Stream a food table into `sink` (an object with upsert(rows) ->
+    (inserted, updated)), `chunk_size` foods at a time, deduplicated by slug
+    within each chunk. `progress` is called after every chunk.
+    """
+    stats = ImportStats()
+    pending: Dict[str, Dict[str, Any]] = {}
+
+    def flush() -> None:
+        inserted, updated = sink.upsert(list(pending.values()))
+        stats.inserted += inserted
+        stats.updated += updated
+        stats.imported += len(pending)
+        stats.chunks += 1
+        stats.elapsed = time.perf_counter() - stats.started
+        pending.clear()
+        if progress is not None:
+            progress(stats)
+
+    for food in read_foods(file, source=source, sheet=sheet, filename=filename, stats=stats):
+        if food["slug"] in pending:
+            stats.duplicates += 1
+        pending[food["slug"]] = food
+        if len(pending) >= max(1, chunk_size):
+            flush()
+    if pending:
+        flush()
+    stats.elapsed = time.perf_counter() - stats.started
+    logger.info(
+        "Food import: %d rows, %d foods (%d new, %d updated) in %.2fs, %.0f rows/s",
+        stats.read, stats.imported, stats.inserted, stats.updated, stats.elapsed, stats.rows_per_sec,
+    )
+    return stats
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from pydantic import BaseModel, Field
+
+from .food_import import ImportFormatError, ImportStats, default_sink, import_foods
+from .food_search import decode_search_cursor, encode_search_cursor, get_index, refresh_catalog
+from .pt_routes import require_auth, require_master
+from .rate_limit import RateLimiter
+from .substitutions import add_custom_food, get_substitution_index
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Same default as the Node endpoint this replaces (server/index.js): 30 per minute por IP
+_SEARCH_LIMIT = int(os.getenv("FOOD_SEARCH_RATE_LIMIT_PER_MIN", "30"))
+_search_limiter = RateLimiter("food_search", _SEARCH_LIMIT, period=60)
+
+_CACHE_CONTROL = "public, max-age=60, s-maxage=300, stale-while-revalidate=60"
+
+
+class CustomFoodIn(BaseModel):
+    """CustomFoodInput in utils/customFoods.ts: values per `grams`, the base portion"""
+    food_name: str = Field(min_length=1, max_length=100)
+    grams: float = Field(100, gt=0, le=10000)
+    energy_kcal: float = Field(ge=0, lt=10000)
+    carbs_g: float = Field(ge=0)
+    protein_g: float = Field(ge=0)
+    fat_g: float = Field(ge=0)
+    fiber_g: float = Field(0, ge=0)
+    category: Optional[str] = Field(None, max_length=80)
+
+
+def _catalog_loading() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Catálogo de alimentos ainda carregando.",
+        headers={"Retry-After": "1"},
+    )
+
+
+@router.get("/api/foods/search")
+async def api_foods_search(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=80),
+    sources: str = "TACO,TBCA",
+    limit: int = Query(25, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    ip = request.client.host if request.client else "unknown"
+    # With RATE_LIMIT_BACKEND=sqlite this is a write, so it must not run on the event loop
+    retry_after = await asyncio.to_thread(_search_limiter.hit, ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Muitas buscas. Tente novamente em instantes.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    index = get_index()
+    if index is None:
+        raise _catalog_loading()
+    try:
+        after = decode_search_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido.")
+    source_list = [s.strip() for s in sources.split(",") if s.strip()]
+    items, next_key = index.search(q, sources=source_list, limit=limit, cursor=after)
+    response.headers["Cache-Control"] = _CACHE_CONTROL
+    return {"items": items, "next_cursor": encode_search_cursor(next_key) if next_key else None}
+
+
+@router.get("/api/foods/{food_id}/substitutes")
+def api_foods_substitutes(
+    food_id: str,
+    grams: float = Query(100, gt=0, le=5000),
+    k: int = Query(10, ge=1, le=50),
+    same_source: bool = False,
+    same_category: bool = False,
+    sources: Optional[str] = None,
+    payload: dict = Depends(require_auth),
+):
+    index = get_substitution_index()
+    if index is None:
+        raise _catalog_loading()
+    source_list = [s.strip() for s in sources.split(",") if s.strip()] if sources else None
+    try:
+        items = index.substitutes(
+            food_id, grams, k=k, same_source=same_source, same_category=same_category,
+            sources=source_list, owner=payload.get("sub"),
+        )
+    except KeyError:
+        # Also foods without calories, which have no macro profile to compare
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alimento não encontrado.")
+    return {"food_id": food_id, "grams": grams, "items": items}
+
+
+@router.post("/api/foods/custom", status_code=status.HTTP_201_CREATED)
+def api_foods_custom_create(body: CustomFoodIn, payload: dict = Depends(require_auth)):
+    return add_custom_food(payload["sub"], body.model_dump())
+
+
+def _import_upload(upload: UploadFile, sink, source: Optional[str], sheet: Optional[str]) -> ImportStats:
+    try:
+        # The upload is spooled to disk past 1 MB; it is read from there a row at a time
+        return import_foods(upload.file, sink, source=source, sheet=sheet, filename=upload.filename or "")
+    finally:
+        sink.close()
+
+
+@router.post("/api/foods/import")
+async def api_foods_import(
+    file: UploadFile = File(...),
+    source: Optional[str] = Query(None, max_length=20),
+    sheet: Optional[str] = Query(None, max_length=100),
+    _: dict = Depends(require_master),
+):
+    try:
+        sink = default_sink()
+    except ValueError:
+        # Neither FOOD_IMPORT_DB_PATH nor Supabase configured
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Destino da importação não configurado.")
+    try:
+        stats = await asyncio.to_thread(_import_upload, file, sink, source, sheet)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    # Serve the new foods now rather than at the next scheduled reload
+    try:
+        await refresh_catalog()
+    except Exception:
+        logger.exception("Food catalog reload after import failed")
+    return stats.as_dict()
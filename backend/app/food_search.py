@@ -0,0 +1,319 @@
+"""
+In-memory food search over the TACO/TBCA catalog.
+
+The whole catalog (a few thousand rows) is loaded once and indexed, so a
+search never leaves the process:
+
+- names are folded like generateSlug in datafoods.ts (lowercase, NFD with
+  the accents stripped, only [a-z0-9] and spaces), so "pão" finds "Pao"
+- a sorted vocabulary of name words answers prefix queries with two
+  bisects: "arr int" matches every food with a word starting "arr" and one
+  starting "int"
+- a trigram index catches typos ("fejao") when no name matches by prefix
+
+Ranking follows the search_foods RPC: source (FOOD_SOURCE_PRIORITY, TACO
+first), then exact name, name prefix, word prefixes, fuzzy (by similarity);
+ties go alphabetically. Pages are keyset cursors over that order, and ranked results
+are cached per query, so later pages cost a bisect.
+
+The catalog comes from FOOD_CATALOG_PATH (JSON list, CSV, or the SQLite
+file food_import writes) when set, else from the Supabase foods table, and is
+reloaded every FOOD_CATALOG_REFRESH_SECS (0 loads it once). A reload builds a
+new index and swaps it in; searches in flight keep the old one.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+FOOD_CATALOG_PATH = os.getenv("FOOD_CATALOG_PATH")
+FOOD_CATALOG_REFRESH_SECS = float(os.getenv("FOOD_CATALOG_REFRESH_SECS", "3600"))
+FOOD_SOURCE_PRIORITY = [s.strip().upper() for s in os.getenv("FOOD_SOURCE_PRIORITY", "TACO,TBCA").split(",") if s.strip()]
+FOOD_SEARCH_FUZZY_THRESHOLD = float(os.getenv("FOOD_SEARCH_FUZZY_THRESHOLD", "0.3"))
+FOOD_SEARCH_CACHE_SIZE = int(os.getenv("FOOD_SEARCH_CACHE_SIZE", "2000"))
+
+# Columns served to the SPA (the Food interface in datafoods.ts, plus the
+# TACO/TBCA group as `category` when the catalog has one: file catalogs only,
+# the Supabase foods table has no such column)
+FOOD_COLUMNS = (
+    "id", "food_name", "unit", "portion_grams", "carbs_g", "protein_g", "fat_g", "fiber_g", "energy_kcal", "source",
+    "category",
+)
+
+EXACT, PREFIX, WORDS, FUZZY = range(4)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9\s]")
+
+
+def fold(text: str) -> str:
+    """Search form of a name: generateSlug's folding, with single spaces instead of underscores."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_NON_ALNUM.sub("", text).split())
+
+
+def trigrams(word: str) -> set:
+    """pg_trgm-style trigrams: the word padded with two spaces in front and one behind."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def encode_search_cursor(key: Tuple[int, int, str, str]) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int, str, str]]:
+    """(source rank, match class, folded name, id), or None for the first page. Raises ValueError if malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        source_rank, match, name, food_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not (isinstance(source_rank, int) and isinstance(match, int) and isinstance(name, str) and isinstance(food_id, str)):
+        raise ValueError("Invalid cursor")
+    return source_rank, match, name, food_id
+
+
+class FoodIndex:
+    """Immutable index over one catalog snapshot. Safe to share between threads."""
+
+    def __init__(self, foods: Iterable[Dict[str, Any]], source_priority: Sequence[str] = FOOD_SOURCE_PRIORITY) -> None:
+        priority = {source: rank for rank, source in enumerate(source_priority)}
+        rows = []
+        for food in foods:
+            name = food.get("food_name") or ""
+            item = {column: food.get(column) for column in FOOD_COLUMNS}
+            item["id"] = str(item["id"])
+            source = (item["source"] or "").upper()
+            rows.append((priority.get(source, len(priority)), fold(name), item["id"], source, item))
+        # Doc ids are positions in (source rank, name, id) order, so sorting ids sorts alphabetically too
+        rows.sort(key=lambda row: row[:3])
+        self.items: List[Dict[str, Any]] = [row[4] for row in rows]
+        self.names: List[str] = [row[1] for row in rows]
+        self.sources: List[str] = [row[3] for row in rows]
+        self.source_ranks: List[int] = [row[0] for row in rows]
+        self.loaded_at = time.time()
+
+        postings: Dict[str, List[int]] = {}
+        for doc, name in enumerate(self.names):
+            for word in set(name.split()):
+                postings.setdefault(word, []).append(doc)
+        self.vocabulary: List[str] = sorted(postings)
+        self.postings: List[List[int]] = [postings[word] for word in self.vocabulary]
+        # Trigrams index the vocabulary, not the names: a typo is matched against single words
+        self.trigram_postings: Dict[str, List[int]] = {}
+        self.trigram_counts: List[int] = []
+        for position, word in enumerate(self.vocabulary):
+            grams = trigrams(word)
+            for gram in grams:
+                self.trigram_postings.setdefault(gram, []).append(position)
+            self.trigram_counts.append(len(grams))
+        self._ranked = TTLCache(ttl=FOOD_CATALOG_REFRESH_SECS or 3600, max_size=max(FOOD_SEARCH_CACHE_SIZE, 1))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _prefix_docs(self, prefix: str) -> set:
+        lo = bisect_left(self.vocabulary, prefix)
+        # Every word starting with prefix sorts before prefix + U+FFFF
+        hi = bisect_left(self.vocabulary, prefix + "\uffff", lo)
+        docs: set = set()
+        for postings in self.postings[lo:hi]:
+            docs.update(postings)
+        return docs
+
+    def _word_scores(self, word: str) -> Dict[int, float]:
+        """doc -> best similarity of one of its words to `word` (1.0 for a prefix match)."""
+        grams = trigrams(word)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self.trigram_postings.get(gram, ()))
+        scores: Dict[int, float] = {}
+        for position, n in shared.items():
+            similarity = n / (len(grams) + self.trigram_counts[position] - n)
+            if similarity >= FOOD_SEARCH_FUZZY_THRESHOLD:
+                for doc in self.postings[position]:
+                    if similarity > scores.get(doc, 0.0):
+                        scores[doc] = similarity
+        for doc in self._prefix_docs(word):
+            scores[doc] = 1.0
+        return scores
+
+    def _fuzzy_docs(self, words: List[str]) -> List[Tuple[int, float]]:
+        """(doc, similarity) for names with a close word for every query word; the weakest word counts."""
+        scores: Optional[Dict[int, float]] = None
+        for word in words:
+            word_scores = self._word_scores(word)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {doc: min(score, word_scores[doc]) for doc, score in scores.items() if doc in word_scores}
+            if not scores:
+                return []
+        return list(scores.items()) if scores else []
+
+    def _rank(self, query: str) -> List[Tuple[int, int, int]]:
+        """(source rank, match class, doc) for every match of a folded query, best first."""
+        words = query.split()
+        candidates: Optional[set] = None
+        # Rarest (longest) words first keeps the running intersection small
+        for word in sorted(words, key=len, reverse=True):
+            docs = self._prefix_docs(word)
+            candidates = docs if candidates is None else candidates & docs
+            if not candidates:
+                break
+        ranked = []
+        if candidates:
+            for doc in candidates:
+                name = self.names[doc]
+                match = EXACT if name == query else PREFIX if name.startswith(query) else WORDS
+                ranked.append((self.source_ranks[doc], match, doc))
+        else:
+            # Closer matches first: similarity in tenths extends the match class
+            ranked = [
+                (self.source_ranks[doc], FUZZY + round((1 - similarity) * 10), doc)
+                for doc, similarity in self._fuzzy_docs(words)
+            ]
+        ranked.sort()
+        return ranked
+
+    def _key(self, entry: Tuple[int, int, int]) -> Tuple[int, int, str, str]:
+        source_rank, match, doc = entry
+        return source_rank, match, self.names[doc], self.items[doc]["id"]
+
+    def search(
+        self,
+        query: str,
+        sources: Optional[Iterable[str]] = None,
+        limit: int = 25,
+        cursor: Optional[Tuple[int, int, str, str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int, str, str]]]:
+        """One page of matches and the key to pass as `cursor` for the next (None on the last page)."""
+        query = fold(query)
+        if not query:
+            return [], None
+        ranked = self._ranked.get(query)
+        if ranked is None:
+            ranked = self._rank(query)
+            self._ranked.set(query, ranked)
+        start = 0
+        if cursor is not None:
+            # Keys are compared by value, so cursors survive a catalog reload
+            lo, hi = 0, len(ranked)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._key(ranked[mid]) <= cursor:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            start = lo
+        wanted = {s.upper() for s in sources} if sources else None
+        page: List[Tuple[int, int, int]] = []
+        for entry in ranked[start:] if start else ranked:
+            if wanted is None or self.sources[entry[2]] in wanted:
+                page.append(entry)
+                if len(page) > limit:
+                    break
+        next_cursor = self._key(page[limit - 1]) if len(page) > limit else None
+        return [dict(self.items[doc]) for _, _, doc in page[:limit]], next_cursor
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._ranked.stats()
+
+
+# ===== Catalog loading =====
+
+def read_catalog_file(path: str) -> List[Dict[str, Any]]:
+    """
+    Foods from a JSON list, a CSV file with a header row (columns as in
+    FOOD_COLUMNS) or the foods table of an SQLite file written by food_import.
+    """
+    if path.lower().endswith((".db", ".sqlite", ".sqlite3")):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(f"SELECT {', '.join(FOOD_COLUMNS)} FROM foods ORDER BY id")]
+        finally:
+            conn.close()
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            return list(csv.DictReader(f))
+        return json.load(f)
+
+
+async def load_catalog() -> Optional[List[Dict[str, Any]]]:
+    """The catalog rows, or None when there is nowhere to load them from."""
+    if FOOD_CATALOG_PATH:
+        return await asyncio.to_thread(read_catalog_file, FOOD_CATALOG_PATH)
+    # Imported here: reading the catalog from a file needs no Supabase setup
+    from .supabase_async import get_async_dal
+
+    try:
+        dal = get_async_dal()
+    except ValueError:
+        return None  # Supabase not configured
+    return await dal.foods.all()
+
+
+_index: Optional[FoodIndex] = None
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the current index's ranked-results cache."""
+    if _index is None:
+        return {"size": 0, "hits": 0, "misses": 0, "hit_ratio": 0.0}
+    return _index.cache_stats()
+
+
+def get_index() -> Optional[FoodIndex]:
+    """The current index, or None until the catalog has been loaded once."""
+    return _index
+
+
+def set_index(index: Optional[FoodIndex]) -> None:
+    global _index
+    _index = index
+
+
+async def refresh_catalog() -> Optional[FoodIndex]:
+    started = time.perf_counter()
+    foods = await load_catalog()
+    if foods is None:
+        return None
+    index = await asyncio.to_thread(FoodIndex, foods)
+    set_index(index)
+    logger.info("Food catalog indexed: %d foods in %.3fs", len(index), time.perf_counter() - started)
+    return index
+
+
+async def run_catalog_refresh(interval: float = FOOD_CATALOG_REFRESH_SECS) -> None:
+    """Load the catalog now, then every `interval` seconds (0: once), until cancelled."""
+    while True:
+        try:
+            if await refresh_catalog() is None:
+                logger.warning("Food search disabled: set FOOD_CATALOG_PATH or the Supabase variables")
+                return
+        except Exception as e:
+            # Keep serving the previous snapshot
+            logger.error("Food catalog load failed: %s", e)
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
@@ -1,18 +1,35 @@
 from __future__ import annotations
 
 import logging
+import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
 from fastapi import HTTPException, status
+from postgrest.types import ReturnMethod
 from pydantic import BaseModel
 import secrets
 import uuid
 
-from .supabase_client import SupabaseClient
-from .services.invite_tokens import generate_token, hash_token
+from .supabase_client import SupabaseClient, get_supabase_client
+from .supabase_async import AsyncSupabaseDAL, Filter, SupabaseAPIError, filter_params, get_async_dal, pg_quote
+from .pagination import decode_cursor, encode_cursor
+from .maintenance import TOKEN_SWEEP_BATCH_SIZE, purge_in_batches
+from .organizations import get_organization_id_for_user, get_organization_id_for_user_async
+from .services.invite_tokens import generate_token, generate_tokens, hash_token
 
 logger = logging.getLogger(__name__)
 
+# Bulk creation: rows per multi-row INSERT, and the most invites one request may ask for
+INVITE_BULK_CHUNK_SIZE = int(os.getenv("INVITE_BULK_CHUNK_SIZE", "500"))
+INVITE_BULK_MAX = int(os.getenv("INVITE_BULK_MAX", "10000"))
+
+VALID_ROLES = ("member", "admin", "owner")
+
+INVITE_STATUSES = ("used", "expired", "active")
+
+# Columns of each bulk result record (CSV header order)
+BULK_FIELDS = ("id", "token", "email", "role", "expires_at", "created_at")
+
 # Pydantic models for invite token management
 class CreateInviteTokenRequest(BaseModel):
     email: str
@@ -39,11 +56,158 @@ class InviteTokenValidationResponse(BaseModel):
     organization_id: Optional[str]
     expires_at: str
 
+class BulkInviteEntry(BaseModel):
+    email: str
+    role: str = "member"
+
+class BulkCreateInviteTokensRequest(BaseModel):
+    invites: List[BulkInviteEntry]
+    expires_in_hours: int = 72
+
+def _check_invite(invite: dict) -> InviteTokenValidationResponse:
+    """Reject used or expired invites; otherwise build the validation response"""
+    if invite["used_at"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invite token has already been used"
+        )
+
+    expires_at = datetime.fromisoformat(invite["expires_at"].replace('Z', '+00:00'))
+    if datetime.utcnow() > expires_at.replace(tzinfo=None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invite token has expired"
+        )
+
+    return InviteTokenValidationResponse(
+        valid=True,
+        email=invite["email"],
+        role=invite["role"],
+        organization_id=invite["organization_id"],
+        expires_at=invite["expires_at"]
+    )
+
+
+def _check_bulk(entries: List[Tuple[str, str]]) -> None:
+    if len(entries) > INVITE_BULK_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many invites. At most {INVITE_BULK_MAX} per request"
+        )
+    for _, role in entries:
+        if role not in VALID_ROLES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid role. Must be member, admin, or owner"
+            )
+
+
+def iter_invite_chunks(
+    entries: Iterable[Tuple[str, str]],
+    organization_id: str,
+    expires_at: datetime,
+    created_by_user_id: Optional[str] = None,
+    chunk_size: int = INVITE_BULK_CHUNK_SIZE,
+) -> Iterator[Tuple[List[dict], List[dict]]]:
+    """Turn (email, role) pairs into chunks of (insert rows, result records).
+
+    Only one chunk of tokens exists at a time, so the caller can insert and
+    stream each chunk before the next one is generated.
+    """
+    entries = iter(entries)
+    expires_iso = expires_at.isoformat()
+    while True:
+        chunk = []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                break
+        if not chunk:
+            return
+        for _, role in chunk:
+            if role not in VALID_ROLES:
+                raise ValueError(f"Invalid role {role!r}. Must be member, admin, or owner")
+        created_at = datetime.utcnow().isoformat()
+        rows, records = [], []
+        for (email, role), (token, token_hash) in zip(chunk, generate_tokens(len(chunk))):
+            row = {
+                "id": str(uuid.uuid4()),
+                "token_hash": token_hash,
+                "email": email.lower().strip(),
+                "role": role,
+                "organization_id": organization_id,
+                "expires_at": expires_iso,
+                "created_at": created_at,
+            }
+            if created_by_user_id:
+                row["created_by"] = created_by_user_id
+            rows.append(row)
+            records.append({field: token if field == "token" else row[field] for field in BULK_FIELDS})
+        yield rows, records
+
+
+def _list_item(token: dict) -> dict:
+    # Plain dicts in InviteTokenResponse's shape: pages are serialized as-is
+    return {
+        "id": token["id"],
+        "token": "[hidden]",  # Don't expose token hashes
+        "email": token["email"],
+        "role": token["role"],
+        "expires_at": token["expires_at"],
+        "created_at": token["created_at"],
+        "used": bool(token["used_at"]),
+    }
+
+
+def invite_list_filters(
+    status: Optional[str] = None,
+    email_prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> List[Filter]:
+    """PostgREST filters for one page of the invite listing. Raises ValueError on bad input."""
+    filters: List[Filter] = []
+    if status == "used":
+        filters.append(("used_at", "not.is", None))
+    elif status in ("expired", "active"):
+        filters.append(("used_at", "is", None))
+        filters.append(("expires_at", "lt" if status == "expired" else "gte", datetime.utcnow().isoformat()))
+    elif status:
+        raise ValueError(f"Unknown invite status: {status}")
+    if email_prefix:
+        # Emails are stored lowercased; PostgREST spells the LIKE wildcard as *
+        prefix = email_prefix.lower().strip().replace("*", "").replace("%", "")
+        if prefix:
+            filters.append(("email", "like", f"{prefix}*"))
+    after = decode_cursor(cursor)
+    if after:
+        created_at, token_id = after
+        # Both values end up inside a PostgREST or=() expression, so only accept what they can be
+        datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        token_id = str(uuid.UUID(token_id))
+        filters.append((
+            "or", None,
+            f"(created_at.lt.{pg_quote(created_at)},and(created_at.eq.{pg_quote(created_at)},id.lt.{token_id}))"
+        ))
+    return filters
+
+
+def _invite_page(rows: List[dict], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """Trim the look-ahead row and build the next cursor from the last row kept."""
+    items = [_list_item(token) for token in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1]["created_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
+
+
 class InviteTokenManager:
     """Manages invite tokens for organization-based user registration"""
     
-    def __init__(self):
-        self.supabase = SupabaseClient()
+    def __init__(self, supabase: Optional[SupabaseClient] = None):
+        self._supabase = supabase
+
+    @property
+    def supabase(self) -> SupabaseClient:
+        # Resolved on first use so importing this module never needs Supabase env vars
+        return self._supabase or get_supabase_client()
     
     def create_invite_token(
         self, 
@@ -69,14 +233,13 @@ class InviteTokenManager:
             # Calculate expiration
             expires_at = datetime.utcnow() + timedelta(hours=expires_in_hours)
             
-            # Get organization ID (assuming single organization for now)
-            org_result = self.supabase.client.table("organizations").select("id").limit(1).execute()
-            if not org_result.data:
+            # Creator's organization, else the default one (cached)
+            organization_id = get_organization_id_for_user(self.supabase, created_by_user_id)
+            if not organization_id:
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail="No organization found"
                 )
-            organization_id = org_result.data[0]["id"]
             
             # Insert invite token
             invite_data = {
@@ -110,7 +273,7 @@ class InviteTokenManager:
             )
             
         except Exception as e:
-            logger.error(f"Error creating invite token: {e}")
+            logger.error("Error creating invite token: %s", e)
             if isinstance(e, HTTPException):
                 raise
             raise HTTPException(
@@ -118,6 +281,37 @@ class InviteTokenManager:
                 detail="Failed to create invite token"
             )
     
+    def create_invite_tokens_bulk(
+        self,
+        entries: Iterable[Tuple[str, str]],
+        expires_in_hours: int = 72,
+        created_by_user_id: str = None,
+        organization_id: Optional[str] = None
+    ) -> Iterator[List[dict]]:
+        """Create invite tokens for (email, role) pairs, yielding each chunk's records once inserted.
+
+        Every pair is validated before the first insert, so a bad role can't
+        leave the earlier chunks written.
+        """
+        entries = list(entries)
+        _check_bulk(entries)
+        organization_id = organization_id or get_organization_id_for_user(self.supabase, created_by_user_id)
+        if not organization_id:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="No organization found"
+            )
+        expires_at = datetime.utcnow() + timedelta(hours=expires_in_hours)
+        chunks = iter_invite_chunks(entries, organization_id, expires_at, created_by_user_id)
+
+        def insert_chunks() -> Iterator[List[dict]]:
+            table = self.supabase.client.table("invite_tokens")
+            for rows, records in chunks:
+                table.insert(rows, returning=ReturnMethod.minimal).execute()
+                yield records
+
+        return insert_chunks()
+
     def validate_invite_token(self, token: str, email: str) -> InviteTokenValidationResponse:
         """Validate an invite token for user registration"""
         try:
@@ -135,33 +329,11 @@ class InviteTokenManager:
                     detail="Invalid token"
                 )
             
-            invite = result.data[0]
-            
-            # Check if token is already used
-            if invite["used_at"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invite token has already been used"
-                )
-            
-            # Check if token is expired
-            expires_at = datetime.fromisoformat(invite["expires_at"].replace('Z', '+00:00'))
-            if datetime.utcnow() > expires_at.replace(tzinfo=None):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invite token has expired"
-                )
-            
-            return InviteTokenValidationResponse(
-                valid=True,
-                email=invite["email"],
-                role=invite["role"],
-                organization_id=invite["organization_id"],
-                expires_at=invite["expires_at"]
-            )
+            # Reject used or expired tokens
+            return _check_invite(result.data[0])
             
         except Exception as e:
-            logger.error(f"Error validating invite token: {e}")
+            logger.error("Error validating invite token: %s", e)
             if isinstance(e, HTTPException):
                 raise
             raise HTTPException(
@@ -182,11 +354,22 @@ class InviteTokenManager:
             return len(result.data) > 0
             
         except Exception as e:
-            logger.error(f"Error marking token as used: {e}")
+            logger.error("Error marking token as used: %s", e)
             return False
     
-    def list_invite_tokens(self, organization_id: str = None) -> list[InviteTokenResponse]:
-        """List all invite tokens for an organization"""
+    def list_invite_tokens(
+        self,
+        organization_id: str = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status_filter: Optional[str] = None,
+        email_prefix: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """One page of an organization's invite tokens, newest first, plus the next page's cursor"""
+        try:
+            filters = invite_list_filters(status_filter, email_prefix, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         try:
             query = self.supabase.client.table("invite_tokens").select(
                 "id, email, role, expires_at, created_at, used_at"
@@ -194,24 +377,16 @@ class InviteTokenManager:
             
             if organization_id:
                 query = query.eq("organization_id", organization_id)
+            # The builder has no or_() and overwrites repeated order(); set the raw params
+            for key, value in filter_params(filters) + [("order", "created_at.desc,id.desc")]:
+                query.params = query.params.add(key, value)
             
-            result = query.order("created_at", desc=True).execute()
-            
-            return [
-                InviteTokenResponse(
-                    id=token["id"],
-                    token="[hidden]",  # Don't expose token hashes
-                    email=token["email"],
-                    role=token["role"],
-                    expires_at=token["expires_at"],
-                    created_at=token["created_at"],
-                    used=bool(token["used_at"])
-                )
-                for token in result.data
-            ]
+            result = query.limit(limit + 1).execute()
+            
+            return _invite_page(result.data, limit)
             
         except Exception as e:
-            logger.error(f"Error listing invite tokens: {e}")
+            logger.error("Error listing invite tokens: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to list invite tokens"
@@ -224,19 +399,212 @@ class InviteTokenManager:
             return len(result.data) > 0
             
         except Exception as e:
-            logger.error(f"Error revoking invite token: {e}")
+            logger.error("Error revoking invite token: %s", e)
             return False
     
-    def cleanup_expired_tokens(self) -> int:
-        """Remove expired invite tokens from the database"""
+    def cleanup_expired_tokens(self, batch_size: int = TOKEN_SWEEP_BATCH_SIZE) -> int:
+        """Remove expired invite tokens from the database, batch_size rows per delete"""
+        removed = 0
         try:
             current_time = datetime.utcnow().isoformat()
-            result = self.supabase.client.table("invite_tokens").delete().lt("expires_at", current_time).execute()
-            return len(result.data)
+            table = self.supabase.client.table("invite_tokens")
+            while True:
+                batch = table.select("id").lt("expires_at", current_time).limit(batch_size).execute()
+                if not batch.data:
+                    break
+                result = table.delete().in_("id", [row["id"] for row in batch.data]).execute()
+                removed += len(result.data)
+                if len(batch.data) < batch_size:
+                    break
+            return removed
             
         except Exception as e:
-            logger.error(f"Error cleaning up expired tokens: {e}")
+            logger.error("Error cleaning up expired tokens: %s", e)
+            return 0
+
+class AsyncInviteTokenManager:
+    """Async counterpart of InviteTokenManager on top of the async Supabase DAL"""
+
+    def __init__(self, dal: Optional[AsyncSupabaseDAL] = None):
+        self._dal = dal
+
+    @property
+    def dal(self) -> AsyncSupabaseDAL:
+        return self._dal or get_async_dal()
+
+    async def create_invite_token(
+        self,
+        email: str,
+        role: str = "member",
+        expires_in_hours: int = 72,
+        created_by_user_id: str = None
+    ) -> InviteTokenResponse:
+        """Create a new invite token for user registration"""
+        try:
+            if role not in ["member", "admin", "owner"]:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid role. Must be member, admin, or owner"
+                )
+
+            expires_at = datetime.utcnow() + timedelta(hours=expires_in_hours)
+
+            # Creator's organization, else the default one (cached, so usually no round-trip)
+            organization_id = await get_organization_id_for_user_async(self.dal, created_by_user_id)
+            if not organization_id:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="No organization found"
+                )
+
+            # token_hash is UNIQUE: a (practically impossible) collision fails the
+            # insert with 409 and is retried with a fresh token instead of pre-checking
+            for attempt in range(2):
+                token = generate_token()
+                try:
+                    created_token = await self.dal.invite_tokens.insert({
+                        "id": str(uuid.uuid4()),
+                        "token_hash": hash_token(token),
+                        "email": email.lower().strip(),
+                        "role": role,
+                        "organization_id": organization_id,
+                        "expires_at": expires_at.isoformat(),
+                        "created_by": created_by_user_id
+                    })
+                    break
+                except SupabaseAPIError as e:
+                    if e.status_code != 409 or attempt:
+                        raise
+            if not created_token:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to create invite token"
+                )
+
+            return InviteTokenResponse(
+                id=created_token["id"],
+                token=token,
+                email=created_token["email"],
+                role=created_token["role"],
+                expires_at=created_token["expires_at"],
+                created_at=created_token["created_at"],
+                used=created_token.get("used_at") is not None
+            )
+
+        except Exception as e:
+            logger.error("Error creating invite token: %s", e)
+            if isinstance(e, HTTPException):
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create invite token"
+            )
+
+    async def create_invite_tokens_bulk(
+        self,
+        entries: List[Tuple[str, str]],
+        expires_in_hours: int = 72,
+        created_by_user_id: str = None
+    ) -> AsyncIterator[List[dict]]:
+        """Create invite tokens for (email, role) pairs.
+
+        Validation and the organization lookup happen here, before anything is
+        written; the returned iterator then inserts one chunk per multi-row
+        write and yields that chunk's records (plain tokens included).
+        """
+        _check_bulk(entries)
+        organization_id = await get_organization_id_for_user_async(self.dal, created_by_user_id)
+        if not organization_id:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="No organization found"
+            )
+        expires_at = datetime.utcnow() + timedelta(hours=expires_in_hours)
+        chunks = iter_invite_chunks(entries, organization_id, expires_at, created_by_user_id)
+
+        async def insert_chunks() -> AsyncIterator[List[dict]]:
+            for rows, records in chunks:
+                await self.dal.invite_tokens.insert_many(rows)
+                yield records
+
+        return insert_chunks()
+
+    async def validate_invite_token(self, token: str, email: str) -> InviteTokenValidationResponse:
+        """Validate an invite token for user registration"""
+        try:
+            invite = await self.dal.invite_tokens.find(hash_token(token), email.lower().strip())
+            if not invite:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Invalid token"
+                )
+            return _check_invite(invite)
+
+        except Exception as e:
+            logger.error("Error validating invite token: %s", e)
+            if isinstance(e, HTTPException):
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to validate invite token"
+            )
+
+    async def mark_token_as_used(self, token: str, email: str) -> bool:
+        """Mark an invite token as used after successful registration"""
+        try:
+            return await self.dal.invite_tokens.mark_used(
+                hash_token(token), email.lower().strip(), datetime.utcnow().isoformat()
+            )
+        except Exception as e:
+            logger.error("Error marking token as used: %s", e)
+            return False
+
+    async def list_invite_tokens(
+        self,
+        organization_id: str = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status_filter: Optional[str] = None,
+        email_prefix: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """One page of an organization's invite tokens, newest first, plus the next page's cursor"""
+        try:
+            filters = invite_list_filters(status_filter, email_prefix, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        try:
+            # One extra row tells whether another page exists
+            rows = await self.dal.invite_tokens.list(organization_id, filters, limit=limit + 1)
+            return _invite_page(rows, limit)
+        except Exception as e:
+            logger.error("Error listing invite tokens: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to list invite tokens"
+            )
+
+    async def revoke_invite_token(self, token_id: str) -> bool:
+        """Revoke (delete) an invite token"""
+        try:
+            return await self.dal.invite_tokens.delete(token_id)
+        except Exception as e:
+            logger.error("Error revoking invite token: %s", e)
+            return False
+
+    async def cleanup_expired_tokens(self, batch_size: int = TOKEN_SWEEP_BATCH_SIZE) -> int:
+        """Remove expired invite tokens from the database, batch_size rows per delete"""
+        current_time = datetime.utcnow().isoformat()
+
+        async def delete_batch(limit: int) -> int:
+            return await self.dal.invite_tokens.delete_expired(current_time, limit=limit)
+
+        try:
+            return await purge_in_batches(delete_batch, batch_size)
+        except Exception as e:
+            logger.error("Error cleaning up expired tokens: %s", e)
             return 0
 
-# Global instance
-invite_manager = InviteTokenManager()
\ No newline at end of file
+
+# Global instances
+invite_manager = InviteTokenManager()
+async_invite_manager = AsyncInviteTokenManager()
\ No newline at end of file
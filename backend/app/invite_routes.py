@@ -1,24 +1,75 @@
 from __future__ import annotations
 
+import csv
+import io
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from typing import List
+import os
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import AsyncIterator, List, Optional
 
 from .invite_api import (
-    invite_manager,
+    async_invite_manager as invite_manager,
+    BULK_FIELDS,
+    INVITE_STATUSES,
+    BulkCreateInviteTokensRequest,
     CreateInviteTokenRequest,
     InviteTokenResponse,
     ValidateInviteTokenRequest,
     InviteTokenValidationResponse
 )
 # Legacy admin security removed - using local require_owner_or_admin instead
-from .supabase_client import SupabaseClient
+from . import organizations
+from .maintenance import token_sweeper
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .supabase_async import SupabaseAPIError
+from .supabase_auth_routes import require_async_dal
+from .supabase_jwt import LocalVerificationUnavailable, get_token_verifier
+from .cache import TTLCache
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/invite", tags=["invite-tokens"])
 
+# user_id -> {"role", "organization_id"} from user_roles; a role change takes up to this long to apply
+ROLE_CACHE_TTL_SECS = float(os.getenv("ROLE_CACHE_TTL_SECS", "30"))
+_role_cache = TTLCache(ttl=ROLE_CACHE_TTL_SECS)
+
+
+async def _verify_token(token: str) -> Optional[dict]:
+    """Check the access token locally when possible, else ask Supabase."""
+    verifier = get_token_verifier()
+    if verifier is not None:
+        try:
+            return verifier.verify(token)
+        except LocalVerificationUnavailable as e:
+            logger.debug("Falling back to remote token check: %s", e)
+    user = await require_async_dal().db.get_user(token)
+    if not user:
+        return None
+    return {"sub": user["id"], "email": user.get("email"), "id": user["id"]}
+
+
+async def _load_user_role(user_id: str) -> Optional[dict]:
+    return await require_async_dal().user_roles.get(user_id)
+
+
+def role_cache_stats() -> dict:
+    return _role_cache.stats()
+
+
+async def get_user_role(user_id: str) -> Optional[dict]:
+    """Role and organization for a user, cached for ROLE_CACHE_TTL_SECS."""
+    role_row = _role_cache.get(user_id)
+    if role_row is None:
+        role_row = await _load_user_role(user_id)
+        if role_row is not None:
+            _role_cache.set(user_id, role_row)
+    return role_row
+
 # Helper function to get current user from Supabase session
-def get_current_user_id(request: Request) -> str:
+async def get_current_user_id(request: Request) -> str:
     """Extract user ID from Supabase JWT token"""
     try:
         auth_header = request.headers.get("Authorization")
@@ -29,8 +80,7 @@ def get_current_user_id(request: Request) -> str:
             )
         
         token = auth_header.split(" ")[1]
-        supabase = SupabaseClient()
-        user = supabase.verify_jwt_token(token)
+        user = await _verify_token(token)
         
         if not user:
             raise HTTPException(
@@ -40,31 +90,29 @@ def get_current_user_id(request: Request) -> str:
         
         return user["sub"]
         
-    except Exception as e:
-        logger.error(f"Error getting current user: {e}")
+    except (SupabaseAPIError, httpx.HTTPError) as e:
+        # Supabase failed to check the token; a 503 for missing settings passes through as is
+        logger.error("Error getting current user: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication failed"
         )
 
-def require_owner_or_admin(request: Request) -> str:
+async def require_owner_or_admin(request: Request) -> str:
     """Require user to be owner or admin role"""
     try:
-        user_id = get_current_user_id(request)
-        supabase = SupabaseClient()
+        user_id = await get_current_user_id(request)
         
-        # Get user role from user_roles table
-        result = supabase.client.table("user_roles").select(
-            "role"
-        ).eq("user_id", user_id).execute()
+        # Get user role from user_roles table (cached)
+        role_row = await get_user_role(user_id)
         
-        if not result.data:
+        if not role_row:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="User role not found"
             )
         
-        user_role = result.data[0]["role"]
+        user_role = role_row["role"]
         
         if user_role not in ["owner", "admin"]:
             raise HTTPException(
@@ -77,28 +125,28 @@ def require_owner_or_admin(request: Request) -> str:
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error checking user permissions: {e}")
+        logger.error("Error checking user permissions: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Permission check failed"
         )
 
 @router.post("/create", response_model=InviteTokenResponse)
-def create_invite_token(
+async def create_invite_token(
     payload: CreateInviteTokenRequest,
     request: Request,
     current_user_id: str = Depends(require_owner_or_admin)
 ):
     """Create a new invite token (Owner/Admin only)"""
     try:
-        return invite_manager.create_invite_token(
+        return await invite_manager.create_invite_token(
             email=payload.email,
             role=payload.role,
             expires_in_hours=payload.expires_in_hours,
             created_by_user_id=current_user_id
         )
     except Exception as e:
-        logger.error(f"Error creating invite token: {e}")
+        logger.error("Error creating invite token: %s", e)
         if isinstance(e, HTTPException):
             raise
         raise HTTPException(
@@ -106,16 +154,75 @@ def create_invite_token(
             detail="Failed to create invite token"
         )
 
+async def _ndjson_lines(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    async for records in chunks:
+        yield "".join(json.dumps(record) + "\n" for record in records)
+
+
+async def _csv_lines(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=BULK_FIELDS)
+    writer.writeheader()
+    async for records in chunks:
+        writer.writerows(records)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def _logged(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[List[dict]]:
+    # Headers are already sent once streaming starts, so a failed chunk can only
+    # abort the response; the rows streamed so far were inserted.
+    try:
+        async for records in chunks:
+            yield records
+    except Exception as e:
+        logger.error("Bulk invite creation failed mid-stream: %s", e)
+        raise
+
+@router.post("/bulk")
+async def create_invite_tokens_bulk(
+    payload: BulkCreateInviteTokensRequest,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user_id: str = Depends(require_owner_or_admin)
+):
+    """Create many invite tokens at once, streamed back as NDJSON or CSV (Owner/Admin only)"""
+    try:
+        chunks = await invite_manager.create_invite_tokens_bulk(
+            [(invite.email, invite.role) for invite in payload.invites],
+            expires_in_hours=payload.expires_in_hours,
+            created_by_user_id=current_user_id
+        )
+    except Exception as e:
+        logger.error("Error creating invite tokens in bulk: %s", e)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create invite tokens"
+        )
+
+    if format == "csv":
+        return StreamingResponse(
+            _csv_lines(_logged(chunks)),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=invites.csv"}
+        )
+    return StreamingResponse(_ndjson_lines(_logged(chunks)), media_type="application/x-ndjson")
+
 @router.post("/validate", response_model=InviteTokenValidationResponse)
-def validate_invite_token(payload: ValidateInviteTokenRequest):
+async def validate_invite_token(payload: ValidateInviteTokenRequest):
     """Validate an invite token (Public endpoint for registration)"""
     try:
-        return invite_manager.validate_invite_token(
+        return await invite_manager.validate_invite_token(
             token=payload.token,
             email=payload.email
         )
     except Exception as e:
-        logger.error(f"Error validating invite token: {e}")
+        logger.error("Error validating invite token: %s", e)
         if isinstance(e, HTTPException):
             raise
         raise HTTPException(
@@ -123,31 +230,52 @@ def validate_invite_token(payload: ValidateInviteTokenRequest):
             detail="Failed to validate invite token"
         )
 
-@router.get("/list", response_model=List[InviteTokenResponse])
-def list_invite_tokens(
+def _page_ndjson(items: List[dict], next_cursor: Optional[str]):
+    for item in items:
+        yield json.dumps(item) + "\n"
+    yield json.dumps({"next_cursor": next_cursor}) + "\n"
+
+@router.get("/list")
+async def list_invite_tokens(
     request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status", pattern=f"^({'|'.join(INVITE_STATUSES)})$"),
+    email_prefix: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     current_user_id: str = Depends(require_owner_or_admin)
 ):
-    """List all invite tokens (Owner/Admin only)"""
+    """List invite tokens newest first, one page at a time (Owner/Admin only)
+
+    Pass the returned next_cursor back as ?cursor= for the following page; it is
+    null on the last page. With ?format=ndjson each token is one line and the
+    last line is {"next_cursor": ...}.
+    """
     try:
-        # Get user's organization
-        supabase = SupabaseClient()
-        result = supabase.client.table("user_roles").select(
-            "organization_id"
-        ).eq("user_id", current_user_id).execute()
+        # Get user's organization (cached alongside the role)
+        role_row = await get_user_role(current_user_id)
         
-        if not result.data:
+        if not role_row or not role_row.get("organization_id"):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User organization not found"
             )
         
-        organization_id = result.data[0]["organization_id"]
+        organization_id = role_row["organization_id"]
         
-        return invite_manager.list_invite_tokens(organization_id=organization_id)
+        items, next_cursor = await invite_manager.list_invite_tokens(
+            organization_id=organization_id,
+            limit=limit,
+            cursor=cursor,
+            status_filter=status_filter,
+            email_prefix=email_prefix
+        )
+        if format == "ndjson":
+            return StreamingResponse(_page_ndjson(items, next_cursor), media_type="application/x-ndjson")
+        return JSONResponse({"items": items, "next_cursor": next_cursor})
         
     except Exception as e:
-        logger.error(f"Error listing invite tokens: {e}")
+        logger.error("Error listing invite tokens: %s", e)
         if isinstance(e, HTTPException):
             raise
         raise HTTPException(
@@ -156,14 +284,14 @@ def list_invite_tokens(
         )
 
 @router.delete("/revoke/{token_id}")
-def revoke_invite_token(
+async def revoke_invite_token(
     token_id: str,
     request: Request,
     current_user_id: str = Depends(require_owner_or_admin)
 ):
     """Revoke an invite token (Owner/Admin only)"""
     try:
-        success = invite_manager.revoke_invite_token(token_id)
+        success = await invite_manager.revoke_invite_token(token_id)
         
         if not success:
             raise HTTPException(
@@ -174,7 +302,7 @@ def revoke_invite_token(
         return {"status": "success", "message": "Invite token revoked"}
         
     except Exception as e:
-        logger.error(f"Error revoking invite token: {e}")
+        logger.error("Error revoking invite token: %s", e)
         if isinstance(e, HTTPException):
             raise
         raise HTTPException(
@@ -183,23 +311,36 @@ def revoke_invite_token(
         )
 
 @router.post("/cleanup")
-def cleanup_expired_tokens(
+async def cleanup_expired_tokens(
     request: Request,
     current_user_id: str = Depends(require_owner_or_admin)
 ):
     """Clean up expired invite tokens (Owner/Admin only)"""
     try:
-        count = invite_manager.cleanup_expired_tokens()
+        count = await invite_manager.cleanup_expired_tokens()
         return {
             "status": "success",
             "message": f"Cleaned up {count} expired tokens"
         }
         
     except Exception as e:
-        logger.error(f"Error cleaning up expired tokens: {e}")
+        logger.error("Error cleaning up expired tokens: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to cleanup expired tokens"
         )
 
+@router.get("/stats/cache")
+async def invite_cache_stats(current_user_id: str = Depends(require_owner_or_admin)):
+    """Hit/miss counters for the role and organization caches (Owner/Admin only)"""
+    return {
+        "roles": role_cache_stats(),
+        "organizations": organizations.cache_stats(),
+    }
+
+@router.get("/stats/sweeper")
+async def invite_sweeper_stats(current_user_id: str = Depends(require_owner_or_admin)):
+    """Runs, errors and deleted-row totals of the background token sweeper (Owner/Admin only)"""
+    return token_sweeper.stats()
+
 # Legacy master admin endpoints removed - use /create and /list with proper authentication instead
\ No newline at end of file
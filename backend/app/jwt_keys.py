@@ -0,0 +1,394 @@
+"""
+Signing keys for the auth_token JWTs issued by security.py.
+
+Every token carries a "kid" header naming the key that signed it. The keyring
+has one signing key (the newest) and keeps the keys it replaced for
+verification until every token they signed has expired, so rotating the key
+doesn't log anybody out. Tokens without a kid (issued before kid headers)
+are checked against JWT_SECRET under the kid "default".
+
+Two backends, selected by JWT_KEYRING:
+- memory (default): JWT_SECRET is the HS256 signing key, as before. Rotation
+  and asymmetric keys work, but only within one process.
+- sqlite: keys live in a table of a SQLite file (JWT_KEYRING_DB_PATH, default
+  APP_DB_PATH) shared by every worker and replica. A worker that sees an
+  unknown kid, or whose copy is older than JWT_KEYRING_RELOAD_SECS, re-reads
+  the table. JWT_SECRET is then only trusted for verification, and only if it
+  is set explicitly.
+
+JWT_SIGNING_ALG picks the algorithm of generated keys: HS256, ES256 or EdDSA
+(the last two need `cryptography`). Public keys of asymmetric algorithms are
+served at /.well-known/jwks.json, so other services can verify tokens without
+holding any secret. Keys are parsed once when loaded, never per request.
+
+JWT_KEY_ROTATION_SECS > 0 makes run_key_rotation() replace the signing key
+once it gets that old; with the sqlite backend only one worker rotates.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import jwt
+
+from . import db
+
+try:
+    from cryptography.hazmat.primitives import serialization  # type: ignore
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519  # type: ignore
+except Exception:  # pragma: no cover - cryptography is optional
+    serialization = ec = ed25519 = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
+JWT_TTL_SECS = int(os.getenv("JWT_TTL_SECS", str(60 * 60 * 12)))  # 12h
+JWT_KEYRING = os.getenv("JWT_KEYRING", "memory").lower()
+JWT_KEYRING_DB_PATH = os.getenv("JWT_KEYRING_DB_PATH")  # defaults to APP_DB_PATH
+JWT_KEYRING_RELOAD_SECS = float(os.getenv("JWT_KEYRING_RELOAD_SECS", "30"))
+JWT_SIGNING_ALG = os.getenv("JWT_SIGNING_ALG", "HS256")
+JWT_KEY_ROTATION_SECS = float(os.getenv("JWT_KEY_ROTATION_SECS", "0"))
+
+LEGACY_KID = "default"
+ALGORITHMS = ("HS256", "ES256", "EdDSA")
+# Extra life for replaced keys past the token TTL: replicas may sign with a
+# replaced key until their next reload, and verifiers allow some clock skew
+_RETIRE_MARGIN_SECS = 60.0
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def ec_public_jwk(public_key: Any) -> Dict[str, Any]:
+    """JWK of a P-256 public key with x/y padded to 32 bytes.
+
+    PyJWT's ECAlgorithm.to_jwk drops leading zero bytes, and PyJWK then
+    rejects about one key in 128.
+    """
+    numbers = public_key.public_numbers()
+    return {
+        "kty": "EC",
+        "crv": "P-256",
+        "x": _b64url(numbers.x.to_bytes(32, "big")),
+        "y": _b64url(numbers.y.to_bytes(32, "big")),
+    }
+
+
+def generate_key_material(alg: str) -> str:
+    """A new key as stored: base64url secret for HS256, PKCS#8 PEM otherwise."""
+    if alg == "HS256":
+        return _b64url(secrets.token_bytes(32))
+    if alg not in ALGORITHMS:
+        raise ValueError(f"Unsupported JWT signing algorithm: {alg}")
+    if serialization is None:
+        raise ValueError(f"{alg} keys need the cryptography package")
+    private_key = ec.generate_private_key(ec.SECP256R1()) if alg == "ES256" else ed25519.Ed25519PrivateKey.generate()
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode("ascii")
+
+
+class SigningKey:
+    """A parsed key: `signing` signs tokens, `verifying` checks them (the same bytes for HS256)."""
+
+    __slots__ = ("kid", "alg", "signing", "verifying", "created_at", "retire_at")
+
+    def __init__(self, kid: str, alg: str, material: str, created_at: float, retire_at: Optional[float] = None) -> None:
+        self.kid = kid
+        self.alg = alg
+        self.created_at = created_at
+        self.retire_at = retire_at
+        if alg == "HS256":
+            self.signing = self.verifying = _b64url_decode(material)
+        elif alg in ALGORITHMS and serialization is not None:
+            self.signing = serialization.load_pem_private_key(material.encode("ascii"), password=None)
+            self.verifying = self.signing.public_key()
+        else:
+            raise ValueError(f"Can't load {alg} key {kid}")
+
+    @classmethod
+    def from_secret(cls, secret: str, kid: str = LEGACY_KID) -> "SigningKey":
+        return cls(kid, "HS256", _b64url(secret.encode()), created_at=0.0)
+
+    def public_jwk(self) -> Optional[Dict[str, Any]]:
+        """The JWK of the public key, or None for HS256 (nothing here may be published)."""
+        if self.alg == "ES256":
+            jwk = ec_public_jwk(self.verifying)
+        elif self.alg == "EdDSA":
+            jwk = json.loads(jwt.algorithms.OKPAlgorithm.to_jwk(self.verifying))
+        else:
+            return None
+        jwk.update({"kid": self.kid, "alg": self.alg, "use": "sig"})
+        return jwk
+
+
+class Keyring:
+    """Signing key plus verification keys by kid, in memory or in a shared SQLite table."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        algorithm: str = JWT_SIGNING_ALG,
+        legacy_secret: Optional[str] = None,
+        token_ttl: float = JWT_TTL_SECS,
+        reload_secs: float = JWT_KEYRING_RELOAD_SECS,
+    ) -> None:
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported JWT signing algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.token_ttl = token_ttl
+        self.reload_secs = reload_secs
+        self._legacy = SigningKey.from_secret(legacy_secret) if legacy_secret else None
+        self._pool = db.ConnectionPool(path, pooled=db.DB_POOL_ENABLED) if path else None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._keys: Dict[str, SigningKey] = {}
+        self._signing: Optional[SigningKey] = None
+        self._loaded_at = 0.0
+        self._missed_at = 0.0
+        if self._pool is not None:
+            self.reload()
+            if self._signing is None:
+                self.rotate_if_due(0)
+        elif self._legacy is not None and algorithm == "HS256":
+            # Plain JWT_SECRET setup: same key as always, now with a kid header
+            self._install([self._legacy], time.time())
+        else:
+            logger.warning("JWT keys are generated in memory: sessions end on restart and aren't shared by workers")
+            self._install([self._new_key(time.time())[0]], time.time())
+
+    # ===== Storage =====
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = self._pool.acquire()
+        if not self._ready:
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS chaves_jwt (
+                        kid TEXT PRIMARY KEY,
+                        alg TEXT NOT NULL,
+                        chave TEXT NOT NULL,
+                        criada_em REAL NOT NULL,
+                        aposentar_em REAL
+                    ) WITHOUT ROWID
+                    """
+                )
+            self._ready = True
+        return conn
+
+    def _read(self, conn: sqlite3.Connection, now: float) -> List[SigningKey]:
+        rows = conn.execute(
+            "SELECT kid, alg, chave, criada_em, aposentar_em FROM chaves_jwt "
+            "WHERE aposentar_em IS NULL OR aposentar_em > ? ORDER BY criada_em",
+            (now,),
+        ).fetchall()
+        keys = []
+        for row in rows:
+            try:
+                keys.append(SigningKey(row["kid"], row["alg"], row["chave"], row["criada_em"], row["aposentar_em"]))
+            except Exception as e:
+                # e.g. an EdDSA key on a worker without cryptography; skip that key only
+                logger.error("Skipping JWT key %s: %s", row["kid"], e)
+        return keys
+
+    def _install(self, keys: List[SigningKey], now: float) -> None:
+        by_kid = {key.kid: key for key in keys}
+        if self._legacy is not None:
+            by_kid.setdefault(LEGACY_KID, self._legacy)
+        signing = [key for key in keys if key.retire_at is None]
+        with self._lock:
+            self._keys = by_kid
+            self._signing = signing[-1] if signing else (keys[-1] if keys else None)
+            self._loaded_at = now
+
+    def _new_key(self, now: float) -> Tuple[SigningKey, str]:
+        material = generate_key_material(self.algorithm)
+        return SigningKey(uuid.uuid4().hex[:16], self.algorithm, material, now), material
+
+    def reload(self) -> None:
+        """Re-read the shared table (no-op in memory)."""
+        if self._pool is None:
+            return
+        now = time.time()
+        conn = self._connection()
+        try:
+            keys = self._read(conn, now)
+        finally:
+            self._pool.release(conn)
+        self._install(keys, now)
+
+    def _maybe_reload(self) -> None:
+        if self._pool is not None and time.time() - self._loaded_at >= self.reload_secs:
+            try:
+                self.reload()
+            except sqlite3.Error as e:
+                # Keep using the keys we have
+                logger.error("JWT keyring reload failed: %s", e)
+
+    # ===== Rotation =====
+
+    def rotate_if_due(self, max_age: float) -> Optional[str]:
+        """Start signing with a new key if the current one is older than max_age. Returns the new kid."""
+        now = time.time()
+        retire_at = now + self.token_ttl + self.reload_secs + _RETIRE_MARGIN_SECS
+        if self._pool is None:
+            with self._lock:
+                current = self._signing
+                if current is not None and now - current.created_at < max_age:
+                    return None
+                new, _ = self._new_key(now)
+                for key in self._keys.values():
+                    if key.retire_at is None:
+                        key.retire_at = retire_at
+                keys = [key for key in self._keys.values() if key.retire_at > now and key is not self._legacy]
+            self._install(keys + [new], now)
+            return new.kid
+        conn = self._connection()
+        try:
+            # IMMEDIATE takes the write lock first, so when several workers find the
+            # key due together only the first rotates; the rest see its new key
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT MAX(criada_em) AS newest FROM chaves_jwt WHERE aposentar_em IS NULL").fetchone()
+                if row["newest"] is not None and now - row["newest"] < max_age:
+                    conn.execute("COMMIT")
+                    new = None
+                else:
+                    new, material = self._new_key(now)
+                    conn.execute("DELETE FROM chaves_jwt WHERE aposentar_em <= ?", (now,))
+                    conn.execute("UPDATE chaves_jwt SET aposentar_em = ? WHERE aposentar_em IS NULL", (retire_at,))
+                    conn.execute(
+                        "INSERT INTO chaves_jwt (kid, alg, chave, criada_em) VALUES (?, ?, ?, ?)",
+                        (new.kid, new.alg, material, now),
+                    )
+                    conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            keys = self._read(conn, now)
+        finally:
+            self._pool.release(conn)
+        self._install(keys, now)
+        if new is not None:
+            logger.info("Rotated JWT signing key to %s", new.kid)
+        return new.kid if new is not None else None
+
+    def rotate(self) -> str:
+        """Start signing with a new key now."""
+        return self.rotate_if_due(0) or self.signing_key().kid
+
+    def next_rotation_in(self, max_age: float) -> float:
+        current = self.signing_key()
+        return max(0.0, current.created_at + max_age - time.time())
+
+    # ===== Signing and verification =====
+
+    def signing_key(self) -> SigningKey:
+        self._maybe_reload()
+        return self._signing
+
+    def key(self, kid: Optional[str]) -> Optional[SigningKey]:
+        """Verification key for kid (tokens without one are legacy JWT_SECRET tokens)."""
+        kid = kid or LEGACY_KID
+        key = self._keys.get(kid)
+        if key is None and self._pool is not None and time.time() - self._missed_at >= 1.0:
+            # Probably rotated by another worker; the 1s floor bounds reloads driven by junk kids
+            self._missed_at = time.time()
+            try:
+                self.reload()
+            except sqlite3.Error as e:
+                logger.error("JWT keyring reload failed: %s", e)
+            key = self._keys.get(kid)
+        if key is not None and key.retire_at is not None and key.retire_at <= time.time():
+            return None
+        return key
+
+    def sign(self, payload: Dict[str, Any]) -> str:
+        key = self.signing_key()
+        return jwt.encode(payload, key.signing, algorithm=key.alg, headers={"kid": key.kid})
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a token signed by a known key, else None."""
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.PyJWTError:
+            return None
+        key = self.key(kid)
+        if key is None:
+            return None
+        try:
+            # The key's own algorithm wins over the (attacker-controlled) header
+            return jwt.decode(token, key.verifying, algorithms=[key.alg])
+        except jwt.PyJWTError:
+            return None
+
+    def jwks(self) -> Dict[str, Any]:
+        """Public keys that verify current tokens, as a JWKS document."""
+        self._maybe_reload()
+        jwks = [key.public_jwk() for key in list(self._keys.values())]
+        return {"keys": [jwk for jwk in jwks if jwk is not None]}
+
+    def kids(self) -> Tuple[str, ...]:
+        return tuple(self._keys)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+
+
+_keyring: Optional[Keyring] = None
+_keyring_lock = threading.Lock()
+
+
+def get_keyring() -> Keyring:
+    """Process-wide keyring configured from the environment."""
+    global _keyring
+    if _keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                if JWT_KEYRING == "sqlite":
+                    # The dev default secret must never verify anything in a real deployment
+                    legacy = os.getenv("JWT_SECRET")
+                    _keyring = Keyring(JWT_KEYRING_DB_PATH or db.DB_PATH, legacy_secret=legacy)
+                elif JWT_KEYRING == "memory":
+                    _keyring = Keyring(legacy_secret=JWT_SECRET)
+                else:
+                    raise ValueError(f"Unknown JWT_KEYRING: {JWT_KEYRING}")
+    return _keyring
+
+
+def set_keyring(keyring: Optional[Keyring]) -> None:
+    """Override the process-wide keyring (tests); None rebuilds it from the environment."""
+    global _keyring
+    with _keyring_lock:
+        _keyring = keyring
+
+
+async def run_key_rotation(keyring: Optional[Keyring] = None, every: float = JWT_KEY_ROTATION_SECS) -> None:
+    """Rotate the signing key whenever it turns `every` seconds old, until cancelled."""
+    if every <= 0:
+        return
+    keyring = keyring or get_keyring()
+    while True:
+        # A little jitter so workers don't all reach for the write lock at once
+        await asyncio.sleep(max(1.0, keyring.next_rotation_in(every)) * random.uniform(1.0, 1.05))
+        try:
+            await asyncio.to_thread(keyring.rotate_if_due, every)
+        except Exception as e:
+            logger.error("JWT key rotation failed: %s", e)
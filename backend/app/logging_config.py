@@ -0,0 +1,135 @@
+"""
+Non-blocking, structured logging for the backend.
+
+configure_logging() puts a single QueueHandler on the root logger. Request
+threads and the event loop only append the LogRecord to an in-memory queue;
+a QueueListener thread does the formatting and the stderr write. Records are
+queued unformatted, so %-style arguments (logger.info("user %s", uid)) are
+only rendered by the listener, and not at all for records that are filtered
+out.
+
+Configuration:
+- LOG_LEVEL: root level (default INFO)
+- LOG_LEVELS: per-logger overrides, e.g. "app.invite_routes=DEBUG,httpx=WARNING"
+- LOG_FORMAT: "json" (default, one object per line) or "text"
+- LOG_DEBUG_SAMPLE_RATE: fraction of DEBUG records kept (default 1.0); the
+  rest are dropped before they are queued
+
+Fields passed with extra={...} appear as top-level JSON keys.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from typing import IO, Any, Dict, Optional
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """Keep only `rate` of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() renders the message in the calling thread; here the
+    record is queued as-is and the listener's formatter renders it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    levels: Optional[str] = None,
+    fmt: Optional[str] = None,
+    debug_sample_rate: Optional[float] = None,
+    stream: Optional[IO[str]] = None,
+) -> None:
+    """Install the queue pipeline on the root logger (writing to stderr by default). Safe to call more than once."""
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    levels = levels if levels is not None else os.getenv("LOG_LEVELS", "")
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    if debug_sample_rate is None:
+        debug_sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        output = logging.StreamHandler(stream)
+        if fmt == "text":
+            output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        else:
+            output.setFormatter(JSONFormatter())
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler = _DeferredQueueHandler(log_queue)
+        handler.addFilter(DebugSampler(debug_sample_rate))
+
+        root = logging.getLogger()
+        for old in list(root.handlers):
+            root.removeHandler(old)
+        root.addHandler(handler)
+        root.setLevel(level)
+        for name, logger_level in _parse_levels(levels).items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -2,37 +2,40 @@ from __future__ import annotations
 
 # Load environment from .env FIRST before any other imports
 import os
+import logging
+
+from .logging_config import configure_logging
+
+_env_file = None
+_env_error = None
 try:  # optional dependency
     from dotenv import load_dotenv, find_dotenv  # type: ignore
 
-    env_file = find_dotenv()
-    print(f"DEBUG: Loading .env from: {env_file}")
-    load_dotenv(env_file, override=False)
-    print(f"DEBUG: INVITE_TOKEN_SECRET loaded: {'INVITE_TOKEN_SECRET' in os.environ}")
+    _env_file = find_dotenv()
+    load_dotenv(_env_file, override=False)
 except Exception as e:
-    print(f"DEBUG: Error loading .env: {e}")
-    pass
+    _env_error = e
 
-import logging
-from contextlib import asynccontextmanager
+# LOG_LEVEL / LOG_LEVELS / LOG_FORMAT may come from .env, so configure after loading it
+configure_logging()
+logger = logging.getLogger(__name__)
+if _env_error is not None:
+    logger.warning("Error loading .env: %s", _env_error)
+else:
+    logger.debug("Loaded .env from %r (INVITE_TOKEN_SECRET set: %s)", _env_file, "INVITE_TOKEN_SECRET" in os.environ)
+
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi import status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-import os
+import math
 import time
 import secrets
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-import bcrypt
-
-try:
-    import bcrypt
-except ImportError:
-    bcrypt = None  # type: ignore
 
 try:
     from secrets import compare_digest
@@ -44,25 +47,53 @@ except ImportError:
 
 from .models import CreateUserRequest, UpdateUserRequest, ResetPasswordRequest, RegisterWithTokenRequest, PublicUser
 # Legacy admin security removed - use invite tokens instead
-from . import store
+from . import metrics, organizations, store
 from .invite_api import InviteTokenManager
-from .invite_routes import router as invite_router
+from .invite_routes import role_cache_stats, router as invite_router
 from .supabase_auth_routes import router as supabase_auth_router
 from .pt_routes import router as pt_router
 from .pt_routes import setup_startup_seed
-
-
-logger = logging.getLogger(__name__)
+from .food_routes import router as food_router
+from .nutrition_routes import router as nutrition_router
+from . import food_search
+from .db import close_pool, profile_cache_stats
+from .security import jwt_cache_stats
+from .jwt_keys import get_keyring, run_key_rotation
+from .supabase_client import close_supabase_clients
+from .supabase_async import close_async_dal
+from .services import password_hashing
+from .services.password_hashing import PasswordHasherBusy
+from .sessions import SessionStore, create_session_store, run_sweeper
+from .maintenance import run_token_sweeper, token_sweeper
+from .rate_limit import RateLimiter
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Inicializa DB e garante Conta Master caso .env forneça credenciais
+    # Uma migração ou seed com falha interrompe o startup: servir num schema antigo quebra as consultas
     try:
         setup_startup_seed()
-    except Exception as e:
-        logger.error(f"Falha na inicialização/seed: {e}")
+    except Exception:
+        logger.exception("Falha na inicialização/seed")
+        raise
+    background = [
+        asyncio.create_task(run_sweeper(_sessions)),
+        asyncio.create_task(run_token_sweeper()),
+        asyncio.create_task(run_key_rotation()),
+        asyncio.create_task(food_search.run_catalog_refresh()),
+    ]
     yield
+    for task in background:
+        task.cancel()
+    for task in background:
+        with suppress(asyncio.CancelledError):
+            await task
+    _sessions.close()
+    close_pool()
+    close_supabase_clients()
+    await close_async_dal()
+    password_hashing.shutdown()
 
 
 app = FastAPI(title="NUTRIA Backend", version="0.3.0", lifespan=lifespan)
@@ -78,6 +109,9 @@ if origins:
         allow_headers=["*"]
     )
 
+# Per-route latency, status codes and in-flight requests for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Include legacy/invite/supabase routes (mantidos se ainda em uso)
 app.include_router(invite_router)
 app.include_router(supabase_auth_router)
@@ -85,22 +119,79 @@ app.include_router(supabase_auth_router)
 # Include Portuguese API routes
 app.include_router(pt_router)
 
+# Food search over the in-memory catalog (replaces server/index.js)
+app.include_router(food_router)
+
+# Batch macro totals (server-side calcTotals)
+app.include_router(nutrition_router)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, try again shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 
 @app.get("/")
 def health():
     return {"status": "ok"}
 
 
-# Simple in-memory session store (demo)
-_sessions: dict[str, dict] = {}
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint(request: Request):
+    if metrics.METRICS_TOKEN and not compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {metrics.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/.well-known/jwks.json", include_in_schema=False)
+def jwks_endpoint():
+    """Public keys for auth_token JWTs (empty unless JWT_SIGNING_ALG is asymmetric)"""
+    return get_keyring().jwks()
+
+
+# Session store (in-memory by default, SESSION_BACKEND=sqlite to share across workers)
+_sessions: SessionStore = create_session_store()
 SESSION_COOKIE = "sid"
 CSRF_COOKIE = "csrf"
 SESSION_TTL = 60 * 60 * 4  # 4 hours
 
 
+def _cache_stats(key: str) -> Dict[tuple, float]:
+    caches = {
+        "roles": role_cache_stats(),
+        "organizations": organizations.cache_stats(),
+        "jwt": jwt_cache_stats(),
+        "profiles": profile_cache_stats(),
+        "food_search": food_search.cache_stats(),
+    }
+    return {(name,): stats[key] for name, stats in caches.items()}
+
+
+# Scrape-time gauges over state owned by other modules
+metrics.gauge("sessions_active", "Sessions held by the session store", fn=lambda: len(_sessions))
+metrics.gauge("password_hash_pending", "bcrypt calls queued or running", fn=lambda: password_hashing.get_hasher().pending)
+metrics.gauge("cache_entries", "Entries in the in-process caches", ("cache",), fn=lambda: _cache_stats("size"))
+metrics.gauge("cache_hits", "Cache hits since start", ("cache",), fn=lambda: _cache_stats("hits"))
+metrics.gauge("cache_misses", "Cache misses since start", ("cache",), fn=lambda: _cache_stats("misses"))
+metrics.gauge("cache_hit_ratio", "Cache hits / lookups since start", ("cache",), fn=lambda: _cache_stats("hit_ratio"))
+metrics.gauge(
+    "token_sweeper_deleted",
+    "Invite tokens purged by the background sweeper since start",
+    ("target",),
+    fn=lambda: {(target,): n for target, n in token_sweeper.stats()["deleted_total"].items()},
+)
+metrics.gauge("token_sweeper_errors", "Failed sweeper passes since start", fn=lambda: token_sweeper.errors)
+
+
 def _issue_session(resp: Response, user_id: str):
     sid = secrets.token_urlsafe(24)
-    _sessions[sid] = {"uid": user_id, "exp": time.time() + SESSION_TTL}
+    _sessions.create(sid, user_id, SESSION_TTL)
     secure = os.getenv("COOKIE_SECURE", "true").lower() != "false"
     resp.set_cookie(SESSION_COOKIE, sid, httponly=True, secure=secure, samesite="lax", max_age=SESSION_TTL)
     # Double-submit CSRF token (not HttpOnly)
@@ -110,8 +201,8 @@ def _issue_session(resp: Response, user_id: str):
 
 def _clear_session(resp: Response, request: Request):
     sid = request.cookies.get(SESSION_COOKIE)
-    if sid and sid in _sessions:
-        _sessions.pop(sid, None)
+    if sid:
+        _sessions.delete(sid)
     resp.delete_cookie(SESSION_COOKIE)
     resp.delete_cookie(CSRF_COOKIE)
 
@@ -120,10 +211,10 @@ def _require_session(request: Request) -> str:
     sid = request.cookies.get(SESSION_COOKIE)
     if not sid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    sess = _sessions.get(sid)
-    if not sess or sess.get("exp", 0) < time.time():
+    uid = _sessions.get(sid)
+    if not uid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    return sess["uid"]
+    return uid
 
 
 def _require_csrf(request: Request):
@@ -139,7 +230,7 @@ def _require_csrf(request: Request):
 
 # Cookie-based auth endpoints (legacy, kept for backward compatibility)
 @app.post("/api/auth/login")
-def api_login(payload: dict, response: Response):
+async def api_login(payload: dict, response: Response):
     # payload: { usernameOrEmail, password }
     username_or_email = str(payload.get("usernameOrEmail", "")).strip()
     password = str(payload.get("password", ""))
@@ -147,21 +238,17 @@ def api_login(payload: dict, response: Response):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid credentials")
 
     # Find user
-    users = store.list_users()
-    target = None
-    for pu in users:
-        if pu.username.lower() == username_or_email.lower() or (pu.email and pu.email.lower() == username_or_email.lower()):
-            target = store.find_by_username(pu.username)
-            break
+    target = store.find_by_username_or_email(username_or_email)
     if not target:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     try:
-        import bcrypt  # type: ignore
-    except Exception:
+        password_ok = await password_hashing.verify_password(password, target.password_hash)
+    except RuntimeError:
+        # bcrypt unavailable on this backend
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error")
 
-    if not bcrypt.checkpw(password.encode("utf-8"), target.password_hash.encode("utf-8")):
+    if not password_ok:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     _issue_session(response, target.id)
@@ -202,21 +289,19 @@ def secure_data(request: Request):
 
 
 # Legacy token-gated registration removed - use invite tokens instead
-_register_rl: dict[str, list[float]] = {}
 _REGISTER_LIMIT = int(os.getenv("REGISTER_RATE_LIMIT_PER_MIN", "5"))
+_register_limiter = RateLimiter("register", _REGISTER_LIMIT, period=60)
 
 
 def _rate_limit(request: Request):
     ip = request.client.host if request.client else "unknown"
-    now = time.time()
-    window_start = now - 60
-    bucket = _register_rl.setdefault(ip, [])
-    # prune
-    while bucket and bucket[0] < window_start:
-        bucket.pop(0)
-    if len(bucket) >= _REGISTER_LIMIT:
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many attempts")
-    bucket.append(now)
+    retry_after = _register_limiter.hit(ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
 
 
 def _validate_password(pw: str) -> bool:
@@ -257,34 +342,36 @@ def register_with_token(request: RegisterWithTokenRequest, client_request: Reque
     
     # Validate token
     try:
-        logger.info(f"Validating token for email: {request.email}")
+        logger.info("Validating invite token")
         token_data = invite_manager.validate_invite_token(request.token.strip(), request.email)
-        logger.info(f"Token validation successful: {token_data}")
+        logger.info("Token validation successful", extra={"role": token_data.role, "organization_id": token_data.organization_id})
     except Exception as e:
-        logger.error(f"Token validation failed: {e}")
+        logger.error("Token validation failed: %s", e)
         raise
     
     # Create user
     try:
-        logger.info(f"Creating user with email: {request.email}")
+        logger.debug("Creating user for invite")
         user = store.create_user(
             username=request.email,  # Use email as username
             name=request.name,
             email=request.email,
             password=request.password
         )
-        logger.info(f"User created successfully: {user.id}")
+        logger.info("User created successfully", extra={"user_id": user.id})
         
         # Mark token as used
         invite_manager.mark_token_as_used(request.token.strip(), request.email)
-        logger.info("Token marked as used")
+        logger.debug("Token marked as used")
         
         # Create session
         _issue_session(response, user.id)
-        logger.info("Session created")
+        logger.debug("Session created")
         
         return {"message": "User registered successfully", "user": user}
         
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
-        logger.error(f"Failed to create user: {e}")
+        logger.error("Failed to create user: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create user: {str(e)}")
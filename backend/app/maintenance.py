@@ -0,0 +1,143 @@
+"""
+Background maintenance: periodic purge of dead invite tokens.
+
+Expired tokens and tokens used longer ago than USED_TOKEN_RETENTION_HOURS are
+deleted from every place invite tokens live:
+- Supabase invite_tokens (skipped when Supabase isn't configured)
+- the in-memory store (store._invite_tokens)
+- SQLite tokens_convite (these never expire, so only used ones go)
+
+Each target is purged in batches of TOKEN_SWEEP_BATCH_SIZE rows, at most
+TOKEN_SWEEP_MAX_BATCHES per run, yielding to the event loop between batches
+so a large backlog is worked off over several runs instead of one long
+statement. Runs are spaced TOKEN_SWEEP_INTERVAL_SECS apart with +/- jitter
+(TOKEN_SWEEP_JITTER, a fraction) so several workers don't sweep in lockstep.
+TOKEN_SWEEP_INTERVAL_SECS=0 disables the scheduler.
+
+TokenSweeper.stats() reports runs, errors, the last run and deleted-row
+totals per target.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from . import db, store
+from .supabase_async import get_async_dal
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SWEEP_INTERVAL_SECS = float(os.getenv("TOKEN_SWEEP_INTERVAL_SECS", "900"))
+TOKEN_SWEEP_JITTER = float(os.getenv("TOKEN_SWEEP_JITTER", "0.2"))
+TOKEN_SWEEP_BATCH_SIZE = int(os.getenv("TOKEN_SWEEP_BATCH_SIZE", "500"))
+TOKEN_SWEEP_MAX_BATCHES = int(os.getenv("TOKEN_SWEEP_MAX_BATCHES", "20"))
+USED_TOKEN_RETENTION_HOURS = float(os.getenv("USED_TOKEN_RETENTION_HOURS", "168"))
+
+DeleteBatch = Callable[[int], Awaitable[int]]
+
+
+async def purge_in_batches(delete_batch: DeleteBatch, batch_size: int, max_batches: Optional[int] = None) -> int:
+    """Call delete_batch(batch_size) until it comes back short or max_batches is reached."""
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        removed = await delete_batch(batch_size)
+        total += removed
+        batches += 1
+        if removed < batch_size:
+            break
+        # Let queued requests run between batches
+        await asyncio.sleep(0)
+    return total
+
+
+class TokenSweeper:
+    TARGETS = ("supabase", "store", "sqlite")
+
+    def __init__(
+        self,
+        batch_size: int = TOKEN_SWEEP_BATCH_SIZE,
+        max_batches: int = TOKEN_SWEEP_MAX_BATCHES,
+        used_retention_hours: float = USED_TOKEN_RETENTION_HOURS,
+    ) -> None:
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.used_retention = timedelta(hours=used_retention_hours)
+        self.runs = 0
+        self.errors = 0
+        self.last_run_at: Optional[float] = None
+        self.last_duration_secs = 0.0
+        self.last_deleted: Dict[str, int] = {}
+        self.deleted_total: Dict[str, int] = {target: 0 for target in self.TARGETS}
+
+    def _targets(self, now: datetime, used_before: datetime) -> Iterator[Tuple[str, DeleteBatch]]:
+        try:
+            dal = get_async_dal()
+        except ValueError:
+            dal = None  # Supabase not configured
+        if dal is not None:
+            now_iso, used_before_iso = now.isoformat(), used_before.isoformat()
+
+            async def supabase_batch(limit: int) -> int:
+                return await dal.invite_tokens.delete_expired(now_iso, used_before_iso, limit)
+
+            yield "supabase", supabase_batch
+
+        async def store_batch(limit: int) -> int:
+            return store.purge_invite_tokens(now, used_before, limit)
+
+        async def sqlite_batch(limit: int) -> int:
+            return await asyncio.to_thread(db.purge_used_tokens, used_before, limit)
+
+        yield "store", store_batch
+        yield "sqlite", sqlite_batch
+
+    async def sweep_once(self) -> Dict[str, int]:
+        """Run one purge pass over every target. Returns rows deleted per target."""
+        started = time.monotonic()
+        now = datetime.utcnow()
+        deleted: Dict[str, int] = {}
+        for target, delete_batch in self._targets(now, now - self.used_retention):
+            try:
+                deleted[target] = await purge_in_batches(delete_batch, self.batch_size, self.max_batches)
+                self.deleted_total[target] += deleted[target]
+            except Exception as e:
+                self.errors += 1
+                logger.error("Token sweep of %s failed: %s", target, e)
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_duration_secs = time.monotonic() - started
+        self.last_deleted = deleted
+        if any(deleted.values()):
+            logger.info("Token sweep removed %s in %.3fs", deleted, self.last_duration_secs)
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "last_run_at": self.last_run_at,
+            "last_duration_secs": self.last_duration_secs,
+            "last_deleted": dict(self.last_deleted),
+            "deleted_total": dict(self.deleted_total),
+        }
+
+
+token_sweeper = TokenSweeper()
+
+
+async def run_token_sweeper(
+    sweeper: TokenSweeper = token_sweeper,
+    interval: float = TOKEN_SWEEP_INTERVAL_SECS,
+    jitter: float = TOKEN_SWEEP_JITTER,
+) -> None:
+    """Sweep every `interval` seconds (+/- jitter) until cancelled."""
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval * random.uniform(1 - jitter, 1 + jitter))
+        await sweeper.sweep_once()
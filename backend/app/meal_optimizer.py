@@ -0,0 +1,280 @@
+"""
+Gram quantities for a meal plan that hit kcal/protein/carbs/fat targets.
+
+A plan is the meal structure of getPresetForCount in utils/mealStructure.ts
+(3 to 8 meals) with candidate foods in each meal. The quantities x (grams,
+one per food) minimize
+
+    sum over macros     ((A x - target) / target)^2
+  + MEAL_SHARE_WEIGHT * sum over meals ((kcal of the meal - share * target kcal) / target kcal)^2
+  + PREFERENCE_WEIGHT * sum over foods ((x - preferred) / 100 g)^2
+
+subject to a min/max per food: a bounded least-squares problem. The first
+term is the plan's daily totals, the second spreads the calories over the
+meals (MEAL_SHARES, e.g. lunch bigger than a snack), the third keeps the
+answer close to the preset quantities and makes it unique: with four targets
+and dozens of foods there are many exact solutions.
+
+It is solved with a projected Newton method on the normal equations (the
+Hessian is tiny: foods x foods), which takes a handful of iterations. The
+grams are then snapped to practical portions (multiples of a per-food step,
+5 g by default) and a greedy pass moves single foods one step up or down
+while that lowers the objective, so rounding costs as little accuracy as
+possible. 8 meals x 10 foods takes about a millisecond; optimize_batch runs
+many patients in one call.
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+OPTIMIZER_PORTION_STEP_G = float(os.getenv("OPTIMIZER_PORTION_STEP_G", "5"))
+OPTIMIZER_MAX_GRAMS = float(os.getenv("OPTIMIZER_MAX_GRAMS", "500"))
+OPTIMIZER_MEAL_SHARE_WEIGHT = float(os.getenv("OPTIMIZER_MEAL_SHARE_WEIGHT", "0.2"))
+OPTIMIZER_PREFERENCE_WEIGHT = float(os.getenv("OPTIMIZER_PREFERENCE_WEIGHT", "0.0001"))
+# A plan is "ok" when every macro lands within this fraction of its target
+OPTIMIZER_TOLERANCE = float(os.getenv("OPTIMIZER_TOLERANCE", "0.05"))
+
+TARGETS = ("calories", "protein", "carbs", "fat")
+
+# getPresetForCount in utils/mealStructure.ts
+MEAL_PRESETS: Dict[int, List[Tuple[str, str]]] = {
+    3: [("cafe", "Café da manhã"), ("almoco", "Almoço"), ("jantar", "Jantar")],
+    4: [("cafe", "Café da manhã"), ("almoco", "Almoço"), ("lanche", "Lanche"), ("jantar", "Jantar")],
+    5: [
+        ("cafe", "Café da manhã"), ("almoco", "Almoço"), ("lanche_tarde", "Lanche da tarde"),
+        ("pos_treino", "Pós-treino"), ("jantar", "Jantar"),
+    ],
+    6: [
+        ("cafe", "Café da manhã"), ("lanche_manha", "Lanche da manhã"), ("almoco", "Almoço"),
+        ("lanche_tarde", "Lanche da tarde"), ("pos_treino", "Pós-treino"), ("jantar", "Jantar"),
+    ],
+    7: [
+        ("cafe", "Café da manhã"), ("lanche_manha", "Lanche da manhã"), ("almoco", "Almoço"),
+        ("lanche_tarde", "Lanche da tarde"), ("pos_treino", "Pós-treino"), ("jantar", "Jantar"), ("ceia", "Ceia"),
+    ],
+    8: [
+        ("cafe", "Café da manhã"), ("lanche_manha", "Lanche da manhã"), ("almoco", "Almoço"),
+        ("lanche_tarde", "Lanche da tarde"), ("pos_treino", "Pós-treino"), ("jantar", "Jantar"),
+        ("lanche_extra", "Lanche extra"), ("ceia", "Ceia"),
+    ],
+}
+MEAL_NAMES = {meal_id: name for preset in MEAL_PRESETS.values() for meal_id, name in preset}
+
+# Relative weight of each meal in the day's calories; normalized over the meals of a plan
+MEAL_SHARES = {
+    "cafe": 0.20,
+    "lanche_manha": 0.10,
+    "almoco": 0.30,
+    "lanche": 0.12,
+    "lanche_tarde": 0.12,
+    "pos_treino": 0.12,
+    "jantar": 0.25,
+    "lanche_extra": 0.08,
+    "ceia": 0.08,
+}
+DEFAULT_MEAL_SHARE = 0.12
+
+
+def preset_for_count(count: int) -> List[Tuple[str, str]]:
+    """(id, name) of each meal, as getPresetForCount(count) (clamped to 3..8)."""
+    return list(MEAL_PRESETS[max(3, min(8, count))])
+
+
+def meal_shares(meal_ids: Sequence[str]) -> np.ndarray:
+    """Default calorie share of each meal, summing to 1."""
+    shares = np.array([MEAL_SHARES.get(meal_id, DEFAULT_MEAL_SHARE) for meal_id in meal_ids], dtype=np.float64)
+    return shares / shares.sum() if shares.size else shares
+
+
+class MealProblem:
+    """One patient's plan: candidate foods with their meal, gram bounds and portion step, and the targets."""
+
+    __slots__ = ("per100g", "meal", "lower", "upper", "preferred", "step", "targets", "shares")
+
+    def __init__(
+        self,
+        per100g: np.ndarray,
+        meal: Sequence[int],
+        targets: Sequence[float],
+        lower: Optional[Sequence[float]] = None,
+        upper: Optional[Sequence[float]] = None,
+        preferred: Optional[Sequence[float]] = None,
+        step: Optional[Sequence[float]] = None,
+        shares: Optional[Sequence[float]] = None,
+    ) -> None:
+        """
+        per100g: (foods x 4) calories, protein, carbs and fat per 100 g.
+        meal: meal index of each food. shares: calorie share of each meal,
+        or None to leave the split between meals free. Bounds, preferred
+        quantities and portion steps are in grams, one per food.
+        """
+        n = len(per100g)
+        self.per100g = np.asarray(per100g, dtype=np.float64)[:, :len(TARGETS)].reshape(n, len(TARGETS))
+        self.meal = np.asarray(meal, dtype=np.intp)
+        self.targets = np.asarray(targets, dtype=np.float64)
+        self.lower = np.zeros(n) if lower is None else np.asarray(lower, dtype=np.float64)
+        self.upper = np.full(n, OPTIMIZER_MAX_GRAMS) if upper is None else np.asarray(upper, dtype=np.float64)
+        if np.any(self.lower > self.upper):
+            raise ValueError("Food minimum above its maximum")
+        # Foods without a preferred quantity (None, or NaN entries) lean towards 100 g
+        default = np.clip(100.0, self.lower, self.upper)
+        self.preferred = default if preferred is None else np.asarray(preferred, dtype=np.float64)
+        self.preferred = np.where(np.isnan(self.preferred), default, self.preferred)
+        self.step = np.full(n, OPTIMIZER_PORTION_STEP_G) if step is None else np.asarray(step, dtype=np.float64)
+        self.shares = None if shares is None else np.asarray(shares, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.per100g)
+
+
+class MealSolution:
+    __slots__ = ("grams", "achieved", "deviation", "iterations", "ok")
+
+    def __init__(self, grams: np.ndarray, achieved: np.ndarray, targets: np.ndarray, iterations: int) -> None:
+        self.grams = grams
+        self.achieved = achieved  # raw calories, protein, carbs, fat of the rounded grams
+        # Relative miss per macro (a zero target is measured against 1 g/kcal)
+        self.deviation = (achieved - targets) / np.maximum(targets, 1.0)
+        self.iterations = iterations
+        self.ok = bool(np.all(np.abs(self.deviation) <= OPTIMIZER_TOLERANCE))
+
+
+def least_squares_system(problem: MealProblem) -> Tuple[np.ndarray, np.ndarray]:
+    """(M, d) such that the objective is ||M x - d||^2."""
+    n = len(problem)
+    scale = np.maximum(problem.targets, 1.0)
+    blocks = [problem.per100g.T / 100 / scale[:, None]]
+    rhs = [problem.targets / scale]
+
+    if problem.shares is not None and OPTIMIZER_MEAL_SHARE_WEIGHT > 0:
+        meals = len(problem.shares)
+        present = np.bincount(problem.meal, minlength=meals) > 0
+        # A meal without candidates can't take its share; the others split it
+        shares = np.where(present, problem.shares, 0.0)
+        if shares.sum() > 0:
+            shares = shares / shares.sum()
+            weight = math.sqrt(OPTIMIZER_MEAL_SHARE_WEIGHT) / scale[0]
+            by_meal = np.zeros((meals, n))
+            by_meal[problem.meal, np.arange(n)] = problem.per100g[:, 0] / 100 * weight
+            blocks.append(by_meal[present])
+            rhs.append((shares * problem.targets[0] * weight)[present])
+
+    if OPTIMIZER_PREFERENCE_WEIGHT > 0:
+        weight = math.sqrt(OPTIMIZER_PREFERENCE_WEIGHT) / 100
+        blocks.append(np.eye(n) * weight)
+        rhs.append(problem.preferred * weight)
+    return np.vstack(blocks), np.concatenate(rhs)
+
+
+def bounded_lstsq(
+    M: np.ndarray,
+    d: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    x0: Optional[np.ndarray] = None,
+    max_iter: int = 50,
+    tol: float = 1e-10,
+) -> Tuple[np.ndarray, int]:
+    """
+    argmin ||M x - d||^2 with lower <= x <= upper, by projected Newton.
+
+    Each iteration fixes the variables sitting on a bound whose gradient points
+    outward, takes the Newton step on the rest and projects it back into the
+    box (halving it while that doesn't decrease the objective). Returns the
+    solution and the number of iterations.
+    """
+    H = M.T @ M
+    g = M.T @ d
+    x = np.clip(lower if x0 is None else x0, lower, upper)
+
+    def objective(v: np.ndarray) -> float:
+        return 0.5 * v @ H @ v - g @ v
+
+    f = objective(x)
+    for iteration in range(1, max_iter + 1):
+        grad = H @ x - g
+        bound = ((x <= lower) & (grad > 0)) | ((x >= upper) & (grad < 0))
+        free = ~bound
+        if not free.any() or np.max(np.abs(grad[free])) <= tol:
+            return x, iteration - 1
+        step = np.zeros_like(x)
+        try:
+            step[free] = -np.linalg.solve(H[np.ix_(free, free)], grad[free])
+        except np.linalg.LinAlgError:
+            # Singular without the preference term (OPTIMIZER_PREFERENCE_WEIGHT=0) when two
+            # foods are interchangeable: take the minimum-norm step instead
+            step[free] = -np.linalg.lstsq(H[np.ix_(free, free)], grad[free], rcond=None)[0]
+        alpha = 1.0
+        while True:
+            candidate = np.clip(x + alpha * step, lower, upper)
+            f_candidate = objective(candidate)
+            if f_candidate <= f + 1e-4 * grad @ (candidate - x) or alpha < 1e-6:
+                break
+            alpha *= 0.5
+        if f - f_candidate <= 1e-15 * max(1.0, abs(f)):
+            return candidate, iteration
+        x, f = candidate, f_candidate
+    return x, max_iter
+
+
+def snap_to_portions(
+    M: np.ndarray,
+    d: np.ndarray,
+    x: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    step: np.ndarray,
+    max_moves: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Round x to multiples of `step` within the bounds, then repeatedly move the
+    single food whose +-1 step lowers ||M x - d||^2 the most.
+    """
+    # Portion grid inside [lower, upper]; a range narrower than one step keeps the exact value
+    grid_lo = np.ceil(lower / step - 1e-9) * step
+    grid_hi = np.floor(upper / step + 1e-9) * step
+    on_grid = grid_lo <= grid_hi
+    # + 0.0 turns the -0.0 that rounding small negatives gives into 0.0
+    snapped = np.where(on_grid, np.clip(np.round(x / step) * step, grid_lo, grid_hi), x) + 0.0
+    movable = on_grid & (grid_lo < grid_hi)
+    if not movable.any():
+        return snapped
+
+    residual = M @ snapped - d
+    norms = np.einsum("ij,ij->j", M, M)
+    # Changing x_j by delta changes the objective by 2 delta (M_j . r) + delta^2 |M_j|^2
+    quadratic = step * step * norms
+    for _ in range(max_moves if max_moves is not None else 4 * len(x)):
+        linear = 2 * step * (M.T @ residual)
+        up = np.where(movable & (snapped + step <= grid_hi + 1e-9), linear + quadratic, np.inf)
+        down = np.where(movable & (snapped - step >= grid_lo - 1e-9), -linear + quadratic, np.inf)
+        j_up, j_down = int(np.argmin(up)), int(np.argmin(down))
+        if up[j_up] <= down[j_down]:
+            j, delta, gain = j_up, step[j_up], up[j_up]
+        else:
+            j, delta, gain = j_down, -step[j_down], down[j_down]
+        if not gain < -1e-15:
+            break
+        snapped[j] += delta
+        residual += delta * M[:, j]
+    return snapped
+
+
+def optimize(problem: MealProblem) -> MealSolution:
+    """Rounded gram quantities for one plan."""
+    if not len(problem):
+        return MealSolution(np.zeros(0), np.zeros(len(TARGETS)), problem.targets, 0)
+    M, d = least_squares_system(problem)
+    x, iterations = bounded_lstsq(M, d, problem.lower, problem.upper, problem.preferred)
+    grams = snap_to_portions(M, d, x, problem.lower, problem.upper, problem.step)
+    achieved = grams @ problem.per100g / 100
+    return MealSolution(grams, achieved, problem.targets, iterations)
+
+
+def optimize_batch(problems: Sequence[MealProblem]) -> List[MealSolution]:
+    """optimize() for many patients. Each plan is independent; one failing raises for the batch."""
+    return [optimize(problem) for problem in problems]
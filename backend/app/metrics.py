@@ -0,0 +1,328 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+Pure Python with a cheap hot path: every counter, summary and histogram keeps
+one shard (a plain dict) per thread, and only the owning thread writes to it,
+so recording a sample takes no lock. A scrape sums the shards. Gauges read
+their value from a callback at scrape time (session-store size, cache sizes)
+or are adjusted with inc/dec from the event loop (requests in flight).
+
+MetricsMiddleware records per-route latency, status codes and in-flight
+requests; routes are labelled by their path template (/api/invite/revoke/{token_id})
+so label cardinality stays bounded. Everything else is instrumented where the
+time is spent: bcrypt (services.password_hashing), SQLite (db, sessions,
+rate_limit), Supabase HTTP calls (supabase_async) and rate-limit rejections.
+
+Setting METRICS_TOKEN requires "Authorization: Bearer <token>" on /metrics.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yield (suffix, label string, value) triples."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class _Sharded(_Metric):
+    """Per-thread shards: label values -> state. Writers only touch their own thread's dict."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[LabelValues, Any]] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict[LabelValues, Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[LabelValues, Any] = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _snapshot(self) -> List[Dict[LabelValues, Any]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict() copies under the GIL, so a concurrent writer can't tear the copy
+        return [dict(shard) for shard in shards]
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return sum(shard.get(labels, 0) for shard in self._snapshot())
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        for labels in sorted(totals):
+            yield "", _format_labels(self.labelnames, labels), totals[labels]
+
+
+class Summary(_Sharded):
+    """Sum and count of observations (e.g. seconds spent), without quantiles."""
+
+    kind = "summary"
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            state = shard[labels] = [0.0, 0]
+        state[0] += value
+        state[1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _totals(self) -> Dict[LabelValues, List[float]]:
+        totals: Dict[LabelValues, List[float]] = {}
+        for shard in self._snapshot():
+            for labels, (total, count) in shard.items():
+                acc = totals.setdefault(labels, [0.0, 0])
+                acc[0] += total
+                acc[1] += count
+        return totals
+
+    def count(self, *labels: str) -> int:
+        return int(self._totals().get(labels, [0.0, 0])[1])
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        totals = self._totals()
+        for labels in sorted(totals):
+            label_str = _format_labels(self.labelnames, labels)
+            yield "_sum", label_str, totals[labels][0]
+            yield "_count", label_str, totals[labels][1]
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [count per bucket..., +Inf bucket, sum]
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        width = len(self.buckets) + 2
+        totals: Dict[LabelValues, List[float]] = {}
+        for shard in self._snapshot():
+            for labels, state in shard.items():
+                acc = totals.setdefault(labels, [0] * width)
+                for i in range(width):
+                    acc[i] += state[i]
+        for labels in sorted(totals):
+            state = totals[labels]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"'), cumulative
+            label_str = _format_labels(self.labelnames, labels)
+            yield "_sum", label_str, state[-1]
+            yield "_count", label_str, cumulative
+
+
+class Gauge(_Metric):
+    """A value read at scrape time from `fn`, or moved with inc/dec from a single thread."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        fn: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self._values: Dict[LabelValues, float] = {}
+
+    def set_function(self, fn: Callable[[], Any]) -> None:
+        """fn returns a number, or a {label values tuple: number} dict for labelled gauges."""
+        self.fn = fn
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        values = dict(self._values)
+        if self.fn is not None:
+            result = self.fn()
+            if isinstance(result, dict):
+                values.update(result)
+            else:
+                values[()] = result
+        for labels in sorted(values):
+            yield "", _format_labels(self.labelnames, labels), values[labels]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # one broken callback shouldn't hide the rest
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def summary(name: str, help: str, labelnames: Sequence[str] = ()) -> Summary:
+    return REGISTRY.register(Summary(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], Any]] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames, fn))
+
+
+# ===== Shared instruments =====
+
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+HTTP_LATENCY = histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests being served")
+
+PASSWORD_HASH_SECONDS = summary(
+    "password_hash_seconds", "Time spent in bcrypt, queueing included", ("op",)
+)
+PASSWORD_HASH_REJECTIONS = counter("password_hash_rejections_total", "bcrypt calls refused because the pool was full")
+SQLITE_SECONDS = summary("sqlite_seconds", "Time connections were held for SQLite work", ("db",))
+SUPABASE_SECONDS = summary("supabase_request_seconds", "Supabase HTTP call time", ("api", "method", "status"))
+RATE_LIMIT_REJECTIONS = counter("rate_limit_rejections_total", "Requests refused by a rate limiter", ("limiter",))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware task overhead)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners can't blow up cardinality
+            template = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            HTTP_LATENCY.observe(time.perf_counter() - started, method, template)
+            HTTP_REQUESTS.inc(method, template, str(status_code))
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,167 @@
+"""
+Vectorized macro totals for meals, substitutions and whole plans.
+
+The server-side twin of calcTotals in utils/meals.ts. The catalog is held
+column-wise as a (foods x 5) float64 array of calories, protein, carbs, fat
+and fiber per 100 g, built from the same snapshot as food search. A batch of
+plans is flattened into one row per food entry (catalog row or inline
+per-100 g macros, grams, and the meal/substitution/plan it belongs to), and
+every total in the batch comes out of one np.bincount per column.
+
+Totals follow calcTotals exactly: each food contributes macros * (grams / 100),
+sums run in food order, and only the sum is rounded, with Math.round
+semantics (halves up): calories and quantity to integers, the rest to one
+decimal. A plan's total is calcTotals over the main foods of all its meals;
+substitutions are alternatives and only get their own totals.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .food_search import FoodIndex, get_index
+
+MACROS = ("calories", "protein", "carbs", "fat", "fiber")
+# Catalog column behind each macro
+CATALOG_COLUMNS = ("energy_kcal", "protein_g", "carbs_g", "fat_g", "fiber_g")
+
+
+def js_round(values: np.ndarray, decimals: int = 0) -> np.ndarray:
+    """Math.round(x * 10**decimals) / 10**decimals, elementwise (halves round up, also below zero)."""
+    scale = 10.0 ** decimals
+    scaled = values * scale if decimals else values
+    floor = np.floor(scaled)
+    rounded = floor + (scaled - floor >= 0.5)
+    return rounded / scale if decimals else rounded
+
+
+def round_totals(raw: np.ndarray) -> np.ndarray:
+    """calcTotals' rounding of (n x 6) raw sums: the five MACROS, then quantity."""
+    rounded = np.empty_like(raw)
+    rounded[:, 0] = js_round(raw[:, 0])
+    rounded[:, 1:5] = js_round(raw[:, 1:5], 1)
+    rounded[:, 5] = js_round(raw[:, 5])
+    return rounded
+
+
+class MacroTable:
+    """Per-100 g macros of the catalog as one float64 array, rows looked up by food id."""
+
+    def __init__(self, foods: Iterable[Dict[str, Any]]) -> None:
+        foods = list(foods)
+        self.rows: Dict[str, int] = {str(food["id"]): row for row, food in enumerate(foods)}
+        per100g = np.array(
+            [[_number(food.get(column)) for column in CATALOG_COLUMNS] for food in foods], dtype=np.float64
+        )
+        self.per100g = per100g.reshape(len(foods), len(MACROS))
+
+    @classmethod
+    def from_index(cls, index: FoodIndex) -> "MacroTable":
+        return cls(index.items)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def lookup(self, food_ids: Sequence[str]) -> np.ndarray:
+        """Row of each id. Raises KeyError listing the unknown ids."""
+        rows = self.rows
+        try:
+            return np.fromiter((rows[food_id] for food_id in food_ids), dtype=np.intp, count=len(food_ids))
+        except KeyError:
+            missing = sorted({food_id for food_id in food_ids if food_id not in rows})
+            raise KeyError(missing) from None
+
+
+def _number(value: Any) -> float:
+    # Catalog gaps (NULL, "", "NA", "Tr" for traces) count as zero, as `|| 0` does in the SPA
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if np.isfinite(number) else 0.0
+
+
+class FoodRows:
+    """One batch flattened into parallel columns; `group` numbers each meal and substitution."""
+
+    def __init__(self) -> None:
+        self.quantity: List[float] = []
+        self.group: List[int] = []
+        self.plan: List[int] = []  # plan of a main-meal food, -1 for substitution foods
+        self.food_ids: List[str] = []
+        self.catalog_positions: List[int] = []
+        self.inline: List[Tuple[int, Sequence[float]]] = []
+        self.groups = 0
+
+    def new_group(self) -> int:
+        self.groups += 1
+        return self.groups - 1
+
+    def add(self, group: int, plan: int, quantity: float, food_id: Optional[str], macros: Optional[Sequence[float]]) -> None:
+        position = len(self.quantity)
+        self.quantity.append(quantity)
+        self.group.append(group)
+        self.plan.append(plan)
+        if macros is not None:
+            self.inline.append((position, macros))
+        else:
+            self.food_ids.append(food_id)
+            self.catalog_positions.append(position)
+
+    def per100g(self, table: Optional[MacroTable]) -> np.ndarray:
+        per100g = np.zeros((len(self.quantity), len(MACROS)), dtype=np.float64)
+        if self.food_ids:
+            if table is None:
+                raise LookupError("Food catalog not loaded")
+            per100g[self.catalog_positions] = table.per100g[table.lookup(self.food_ids)]
+        if self.inline:
+            positions, macros = zip(*self.inline)
+            per100g[list(positions)] = np.array(macros, dtype=np.float64)
+        return per100g
+
+
+def compute_totals(rows: FoodRows, plans: int, table: Optional[MacroTable]) -> Tuple[np.ndarray, np.ndarray]:
+    """Rounded (groups x 6) and (plans x 6) totals: MACROS then quantity, as calcTotals returns them."""
+    quantity = np.asarray(rows.quantity, dtype=np.float64)
+    # Same operation order as calcTotals: macro * (grams / 100), summed in food order
+    contributions = rows.per100g(table) * (quantity / 100)[:, None]
+    group = np.asarray(rows.group, dtype=np.intp)
+    plan = np.asarray(rows.plan, dtype=np.intp)
+    main = plan >= 0
+
+    group_raw = np.empty((rows.groups, len(MACROS) + 1))
+    plan_raw = np.empty((plans, len(MACROS) + 1))
+    for column in range(len(MACROS)):
+        group_raw[:, column] = np.bincount(group, weights=contributions[:, column], minlength=rows.groups)
+        plan_raw[:, column] = np.bincount(plan[main], weights=contributions[main, column], minlength=plans)
+    group_raw[:, -1] = np.bincount(group, weights=quantity, minlength=rows.groups)
+    plan_raw[:, -1] = np.bincount(plan[main], weights=quantity[main], minlength=plans)
+    return round_totals(group_raw), round_totals(plan_raw)
+
+
+def totals_dict(values: Sequence[float]) -> Dict[str, float]:
+    calories, protein, carbs, fat, fiber, quantity = values
+    return {
+        "calories": int(calories),
+        "protein": protein,
+        "carbs": carbs,
+        "fat": fat,
+        "fiber": fiber,
+        "quantity": int(quantity),
+    }
+
+
+_table: Optional[MacroTable] = None
+_table_index: Optional[FoodIndex] = None
+
+
+def get_table() -> Optional[MacroTable]:
+    """Table over the current food-search snapshot (rebuilt when the catalog reloads), or None."""
+    global _table, _table_index
+    index = get_index()
+    if index is None:
+        return None
+    if index is not _table_index:
+        _table, _table_index = MacroTable.from_index(index), index
+    return _table
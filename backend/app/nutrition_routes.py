@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import math
+import os
+from typing import List, Optional, Union
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, Field, model_validator
+
+from .meal_optimizer import (
+    DEFAULT_MEAL_SHARE,
+    MEAL_NAMES,
+    MEAL_SHARES,
+    OPTIMIZER_MAX_GRAMS,
+    OPTIMIZER_PORTION_STEP_G,
+    TARGETS,
+    MealProblem,
+    optimize_batch,
+    preset_for_count,
+)
+from .nutrition import FoodRows, compute_totals, get_table, totals_dict
+from .pt_routes import require_auth
+
+router = APIRouter()
+
+MACROS_MAX_FOODS = int(os.getenv("MACROS_MAX_FOODS", "200000"))
+OPTIMIZER_MAX_BATCH = int(os.getenv("OPTIMIZER_MAX_BATCH", "1000"))
+
+
+# ===== Models =====
+
+class MacroValues(BaseModel):
+    """Per 100 g, like Food.macros in types.ts"""
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    fiber: float = 0
+
+
+class FoodSource(BaseModel):
+    food_id: Optional[Union[int, str]] = None  # catalog food
+    macros: Optional[MacroValues] = None  # or inline values, as the SPA holds them
+
+    @model_validator(mode="after")
+    def _one_source(self) -> "FoodSource":
+        if (self.food_id is None) == (self.macros is None):
+            raise ValueError("Informe food_id ou macros (apenas um).")
+        return self
+
+    def per100g(self) -> Optional[tuple]:
+        m = self.macros
+        return None if m is None else (m.calories, m.protein, m.carbs, m.fat, m.fiber)
+
+
+class FoodEntry(FoodSource):
+    quantity: float = Field(ge=0)  # grams
+
+
+class SubstitutionIn(BaseModel):
+    id: str
+    foods: List[FoodEntry] = []
+
+
+class MealIn(BaseModel):
+    id: str
+    foods: List[FoodEntry] = []
+    substitutions: List[SubstitutionIn] = []
+
+
+class PlanIn(BaseModel):
+    id: str
+    meals: List[MealIn] = []
+
+
+class MacrosComputeRequest(BaseModel):
+    plans: List[PlanIn]
+
+
+class MacroTargets(BaseModel):
+    calories: float = Field(gt=0)
+    protein: float = Field(ge=0)
+    carbs: float = Field(ge=0)
+    fat: float = Field(ge=0)
+
+
+class CandidateFood(FoodSource):
+    min_quantity: float = Field(0, ge=0)  # grams
+    max_quantity: Optional[float] = Field(None, ge=0)  # defaults to OPTIMIZER_MAX_GRAMS
+    quantity: Optional[float] = Field(None, ge=0)  # preferred grams, e.g. the preset's
+    step: Optional[float] = Field(None, gt=0)  # portion size; defaults to OPTIMIZER_PORTION_STEP_G
+
+    @model_validator(mode="after")
+    def _bounds(self) -> "CandidateFood":
+        upper = self.max_quantity if self.max_quantity is not None else OPTIMIZER_MAX_GRAMS
+        if self.min_quantity > upper:
+            raise ValueError("min_quantity maior que max_quantity.")
+        return self
+
+
+class OptimizeMealIn(BaseModel):
+    id: str
+    name: Optional[str] = None
+    share: Optional[float] = Field(None, ge=0)  # of the day's calories; defaults by meal id
+    foods: List[CandidateFood] = []
+
+
+class OptimizeRequest(BaseModel):
+    id: Optional[str] = None
+    targets: MacroTargets
+    # Lay the meals out as getPresetForCount(meal_count); `meals` then fills in the candidates
+    meal_count: Optional[int] = Field(None, ge=3, le=8)
+    meals: List[OptimizeMealIn] = []
+    distribute: bool = True  # split the calories between meals by share
+
+
+class OptimizeBatchRequest(BaseModel):
+    patients: List[OptimizeRequest]
+
+
+# ===== Endpoints =====
+
+def _add_foods(rows: FoodRows, foods: List[FoodEntry], group: int, plan: int) -> None:
+    for food in foods:
+        rows.add(group, plan, food.quantity, None if food.food_id is None else str(food.food_id), food.per100g())
+
+
+def _check_size(rows: FoodRows) -> None:
+    if len(rows.quantity) > MACROS_MAX_FOODS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo de {MACROS_MAX_FOODS} alimentos por requisição.",
+        )
+
+
+def _catalog_error(e: LookupError) -> HTTPException:
+    if isinstance(e, KeyError):
+        missing = e.args[0]
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Alimentos não encontrados no catálogo.", "food_ids": missing[:50]},
+        )
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Catálogo de alimentos ainda carregando.",
+        headers={"Retry-After": "1"},
+    )
+
+
+@router.post("/api/macros/compute")
+def api_macros_compute(payload: MacrosComputeRequest, _: dict = Depends(require_auth)):
+    rows = FoodRows()
+    layout = []  # (meal group, [substitution groups]) per meal, per plan
+    for plan_index, plan in enumerate(payload.plans):
+        meals = []
+        for meal in plan.meals:
+            meal_group = rows.new_group()
+            _add_foods(rows, meal.foods, meal_group, plan_index)
+            sub_groups = []
+            for sub in meal.substitutions:
+                sub_groups.append(rows.new_group())
+                _add_foods(rows, sub.foods, sub_groups[-1], -1)
+            meals.append((meal_group, sub_groups))
+        layout.append(meals)
+        _check_size(rows)
+
+    try:
+        group_totals, plan_totals = compute_totals(rows, len(payload.plans), get_table())
+    except LookupError as e:
+        raise _catalog_error(e)
+
+    group_rows = group_totals.tolist()
+    plan_rows = plan_totals.tolist()
+    return {
+        "plans": [
+            {
+                "id": plan.id,
+                "total": totals_dict(plan_rows[plan_index]),
+                "meals": [
+                    {
+                        "id": meal.id,
+                        "total": totals_dict(group_rows[meal_group]),
+                        "substitutions": [
+                            {"id": sub.id, "total": totals_dict(group_rows[sub_group])}
+                            for sub, sub_group in zip(meal.substitutions, sub_groups)
+                        ],
+                    }
+                    for meal, (meal_group, sub_groups) in zip(plan.meals, layout[plan_index])
+                ],
+            }
+            for plan_index, plan in enumerate(payload.plans)
+        ]
+    }
+
+
+def _meal_layout(patient: OptimizeRequest) -> List[OptimizeMealIn]:
+    """The patient's meals in plan order: the preset's when meal_count is set, else as sent."""
+    if patient.meal_count is None:
+        return patient.meals
+    given = {meal.id: meal for meal in patient.meals}
+    preset = preset_for_count(patient.meal_count)
+    unknown = sorted(set(given) - {meal_id for meal_id, _ in preset})
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": f"Refeições fora do padrão de {patient.meal_count} refeições.", "meal_ids": unknown},
+        )
+    return [given.get(meal_id) or OptimizeMealIn(id=meal_id, name=name) for meal_id, name in preset]
+
+
+def _optimize(patients: List[OptimizeRequest]) -> List[dict]:
+    rows = FoodRows()
+    layouts = []
+    for patient_index, patient in enumerate(patients):
+        meals = _meal_layout(patient)
+        for meal in meals:
+            group = rows.new_group()
+            for food in meal.foods:
+                # quantity is filled in with the optimized grams below
+                rows.add(group, patient_index, 0.0, None if food.food_id is None else str(food.food_id), food.per100g())
+        layouts.append(meals)
+        _check_size(rows)
+
+    table = get_table()
+    try:
+        per100g = rows.per100g(table)
+    except LookupError as e:
+        raise _catalog_error(e)
+
+    problems, start = [], 0
+    for patient, meals in zip(patients, layouts):
+        foods = [(meal_index, food) for meal_index, meal in enumerate(meals) for food in meal.foods]
+        end = start + len(foods)
+        shares = None
+        if patient.distribute:
+            shares = [meal.share if meal.share is not None else MEAL_SHARES.get(meal.id, DEFAULT_MEAL_SHARE) for meal in meals]
+        problems.append(MealProblem(
+            per100g[start:end, :len(TARGETS)],
+            [meal_index for meal_index, _ in foods],
+            [getattr(patient.targets, target) for target in TARGETS],
+            lower=[food.min_quantity for _, food in foods],
+            upper=[food.max_quantity if food.max_quantity is not None else OPTIMIZER_MAX_GRAMS for _, food in foods],
+            preferred=[math.nan if food.quantity is None else food.quantity for _, food in foods],
+            step=[food.step or OPTIMIZER_PORTION_STEP_G for _, food in foods],
+            shares=shares,
+        ))
+        start = end
+
+    solutions = optimize_batch(problems)
+    rows.quantity = np.concatenate([solution.grams for solution in solutions]).tolist() if solutions else []
+    group_totals, plan_totals = compute_totals(rows, len(patients), table)
+    group_rows, plan_rows = group_totals.tolist(), plan_totals.tolist()
+
+    results, group = [], 0
+    for patient_index, (patient, meals, solution) in enumerate(zip(patients, layouts, solutions)):
+        grams = iter(solution.grams.tolist())
+        meal_results = []
+        for meal in meals:
+            meal_results.append({
+                "id": meal.id,
+                "name": meal.name or MEAL_NAMES.get(meal.id, meal.id),
+                "foods": [{"food_id": food.food_id, "quantity": next(grams)} for food in meal.foods],
+                "total": totals_dict(group_rows[group]),
+            })
+            group += 1
+        results.append({
+            "id": patient.id,
+            "ok": solution.ok,
+            "iterations": solution.iterations,
+            "targets": patient.targets.model_dump(),
+            "deviation": {target: round(value, 4) for target, value in zip(TARGETS, solution.deviation.tolist())},
+            "total": totals_dict(plan_rows[patient_index]),
+            "meals": meal_results,
+        })
+    return results
+
+
+@router.post("/api/plans/optimize")
+def api_plans_optimize(payload: OptimizeRequest, _: dict = Depends(require_auth)):
+    return _optimize([payload])[0]
+
+
+@router.post("/api/plans/optimize/batch")
+def api_plans_optimize_batch(payload: OptimizeBatchRequest, _: dict = Depends(require_auth)):
+    if len(payload.patients) > OPTIMIZER_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo de {OPTIMIZER_MAX_BATCH} pacientes por requisição.",
+        )
+    return {"patients": _optimize(payload.patients)}
@@ -0,0 +1,86 @@
+"""
+Cached organization lookups.
+
+Invite-token creation needs an organization id, and organizations practically
+never change, so lookups go through a TTL cache instead of querying Supabase
+on every token. A user's organization comes from user_roles; the default
+(single-organization setups) is the first row of organizations.
+
+Entries expire after ORG_CACHE_TTL_SECS; call invalidate() after changing a
+user's organization or the organizations table. cache_stats() exposes the
+hit/miss counters.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+from .cache import TTLCache
+from .supabase_async import AsyncSupabaseDAL
+from .supabase_client import SupabaseClient
+
+ORG_CACHE_TTL_SECS = float(os.getenv("ORG_CACHE_TTL_SECS", "300"))
+
+_DEFAULT_KEY = ("default",)
+_org_cache = TTLCache(ttl=ORG_CACHE_TTL_SECS)
+
+
+def _user_key(user_id: str) -> tuple:
+    return ("user", user_id)
+
+
+def get_default_organization_id(supabase: SupabaseClient) -> Optional[str]:
+    def load() -> Optional[str]:
+        result = supabase.client.table("organizations").select("id").limit(1).execute()
+        return result.data[0]["id"] if result.data else None
+
+    return _org_cache.get_or_load(_DEFAULT_KEY, load)
+
+
+def get_organization_id_for_user(supabase: SupabaseClient, user_id: Optional[str]) -> Optional[str]:
+    """The user's organization from user_roles, falling back to the default organization."""
+    if user_id:
+        def load() -> Optional[str]:
+            result = supabase.client.table("user_roles").select(
+                "organization_id"
+            ).eq("user_id", user_id).limit(1).execute()
+            return result.data[0]["organization_id"] if result.data else None
+
+        organization_id = _org_cache.get_or_load(_user_key(user_id), load)
+        if organization_id:
+            return organization_id
+    return get_default_organization_id(supabase)
+
+
+async def get_default_organization_id_async(dal: AsyncSupabaseDAL) -> Optional[str]:
+    organization_id = _org_cache.get(_DEFAULT_KEY)
+    if organization_id is None:
+        organization_id = await dal.organizations.first_id()
+        if organization_id:
+            _org_cache.set(_DEFAULT_KEY, organization_id)
+    return organization_id
+
+
+async def get_organization_id_for_user_async(dal: AsyncSupabaseDAL, user_id: Optional[str]) -> Optional[str]:
+    if user_id:
+        organization_id = _org_cache.get(_user_key(user_id))
+        if organization_id is None:
+            role_row = await dal.user_roles.get(user_id)
+            organization_id = role_row.get("organization_id") if role_row else None
+            if organization_id:
+                _org_cache.set(_user_key(user_id), organization_id)
+        if organization_id:
+            return organization_id
+    return await get_default_organization_id_async(dal)
+
+
+def invalidate(user_id: Optional[str] = None) -> None:
+    """Drop one user's cached organization, or everything when user_id is None."""
+    if user_id is None:
+        _org_cache.clear()
+    else:
+        _org_cache.invalidate(_user_key(user_id))
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _org_cache.stats()
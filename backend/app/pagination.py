@@ -0,0 +1,35 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Listings are ordered newest first by (created_at, id). A page ends with the
+last row's pair, encoded as an opaque cursor; the next page asks for rows
+strictly before it. Unlike OFFSET, each page is one index range scan no
+matter how deep it is, and rows inserted meanwhile don't shift the pages.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: str, row_id: str) -> str:
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Return (created_at, id), or None for the first page. Raises ValueError if malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
@@ -1,24 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import os
-import bcrypt
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+import sqlite3
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import time
+import math
 
 from .db import (
     init_db,
     ensure_master,
     get_usuario_by_email,
-    get_usuario_by_id,
-    create_usuario,
+    get_usuario_profile,
+    profile_cache_stats,
+    create_usuario_with_token,
     insert_token,
-    mark_token_used,
     get_token_record_by_token,
-    list_tokens,
+    list_tokens_page,
 )
-from .security import issue_jwt, verify_jwt
+from .pagination import MAX_PAGE_SIZE
+from .rate_limit import RateLimiter
+from .security import issue_jwt, jwt_cache_stats, verify_jwt
+from .services.password_hashing import hash_password, hash_password_sync, verify_password
 
 
 router = APIRouter()
@@ -68,35 +72,34 @@ def setup_startup_seed() -> None:
     master_email = os.getenv("MASTER_EMAIL")
     master_senha = os.getenv("MASTER_SENHA")
     if master_email and master_senha:
-        senha_hash = bcrypt.hashpw(master_senha.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        senha_hash = hash_password_sync(master_senha)
         ensure_master(master_email.lower(), senha_hash)
 
 
 # ===== Endpoints =====
 
-# Simple in-memory rate limit for login: 5 per minute por IP
-_login_buckets: dict[str, list[float]] = {}
-_LOGIN_LIMIT = 5
+# Rate limit for login: 5 per minute por IP
+_LOGIN_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT_PER_MIN", "5"))
+_login_limiter = RateLimiter("login", _LOGIN_LIMIT, period=60)
 
 def _rate_limit_login(request: Request) -> None:
     ip = request.client.host if request.client else "unknown"
-    now = time.time()
-    bucket = _login_buckets.setdefault(ip, [])
-    window_start = now - 60
-    # prune
-    while bucket and bucket[0] < window_start:
-        bucket.pop(0)
-    if len(bucket) >= _LOGIN_LIMIT:
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Muitas tentativas. Tente novamente em instantes.")
-    bucket.append(now)
+    retry_after = _login_limiter.hit(ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Muitas tentativas. Tente novamente em instantes.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
 
 @router.post("/api/entrar")
-def api_entrar(payload: EntrarRequest, response: Response, request: Request):
-    _rate_limit_login(request)
-    user = get_usuario_by_email(payload.email.lower())
+async def api_entrar(payload: EntrarRequest, response: Response, request: Request):
+    # SQLite work runs in threads: a lock wait (busy_timeout) must not stall the event loop
+    await asyncio.to_thread(_rate_limit_login, request)
+    user = await asyncio.to_thread(get_usuario_by_email, payload.email.lower())
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="E-mail ou senha incorretos.")
-    if not bcrypt.checkpw(payload.senha.encode("utf-8"), user["senha_hash"].encode("utf-8")):
+    if not await verify_password(payload.senha, user["senha_hash"]):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="E-mail ou senha incorretos.")
 
     jwt_token = issue_jwt(user_id=user["id"], role=user["papel"])  # type: ignore
@@ -111,21 +114,30 @@ def api_sair(response: Response):
 
 
 @router.post("/api/cadastro", status_code=201)
-def api_cadastro(payload: CadastroRequest):
+async def api_cadastro(payload: CadastroRequest):
     # valida token
-    token_row = get_token_record_by_token(payload.token)
+    token_row = await asyncio.to_thread(get_token_record_by_token, payload.token)
     if not token_row or token_row["usado"]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token inválido ou já utilizado.")
 
     # valida email único e senha mínima
     if len(payload.senha) < 6:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Senha deve ter no mínimo 6 caracteres.")
-    if get_usuario_by_email(payload.email.lower()):
+    if await asyncio.to_thread(get_usuario_by_email, payload.email.lower()):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="E-mail já cadastrado.")
 
-    senha_hash = bcrypt.hashpw(payload.senha.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-    create_usuario(nome=payload.nome, email=payload.email.lower(), senha_hash=senha_hash, papel="colaborador")
-    mark_token_used(token_row["id"])  # single-use
+    senha_hash = await hash_password(payload.senha)
+    # single-use: token claimed and user created in one transaction, so of two sign-ups racing on one
+    # token only one gets through, and a failed insert leaves the token unused
+    try:
+        user_id = await asyncio.to_thread(
+            create_usuario_with_token, token_row["id"],
+            nome=payload.nome, email=payload.email.lower(), senha_hash=senha_hash, papel="colaborador",
+        )
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="E-mail já cadastrado.")
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token inválido ou já utilizado.")
     return {"ok": True}
 
 
@@ -137,20 +149,29 @@ def api_gerar_token(_: dict = Depends(require_master)):
 
 
 @router.get("/api/tokens")
-def api_tokens(_: dict = Depends(require_master)):
-    return {"items": list_tokens(limit=20)}
+def api_tokens(
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status", pattern="^(used|active)$"),
+    _: dict = Depends(require_master),
+):
+    try:
+        items, next_cursor = list_tokens_page(limit=limit, cursor=cursor, status=status_filter)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido.")
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.get("/api/me")
 def api_me(payload: dict = Depends(require_auth)):
-    user = get_usuario_by_id(payload.get("sub"))
+    user = get_usuario_profile(payload.get("sub"))
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="É necessário entrar para acessar esta página.")
-    return {
-        "id": user["id"],
-        "nome": user["nome"],
-        "email": user["email"],
-        "papel": user["papel"],
-    }
+    return user
+
+
+@router.get("/api/stats/cache")
+def api_cache_stats(_: dict = Depends(require_master)):
+    return {"jwt": jwt_cache_stats(), "profiles": profile_cache_stats()}
 
 
@@ -0,0 +1,161 @@
+"""
+Per-key rate limiting with GCRA (generic cell rate algorithm).
+
+Each key stores a single "theoretical arrival time" (TAT), so a check is O(1)
+in time and memory no matter how many requests fall inside the window. A
+limiter allowing `limit` hits per `period` seconds admits bursts of up to
+`limit` and then one hit every period/limit seconds, which matches the old
+"N timestamps in the last minute" lists.
+
+Backends:
+- MemoryRateLimitBackend: per-process OrderedDict with LRU eviction, so
+  rotating client IPs cannot grow the table past max_keys.
+- SQLiteRateLimitBackend: a shared SQLite table so limits hold across uvicorn
+  worker processes. Idle rows are pruned as it goes.
+
+RATE_LIMIT_BACKEND selects the default backend (memory by default).
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from . import db
+from .metrics import RATE_LIMIT_REJECTIONS, SQLITE_SECONDS
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH")  # defaults to APP_DB_PATH
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))
+
+
+def _gcra(tat: Optional[float], now: float, interval: float, period: float) -> tuple[float, float]:
+    """Return (new_tat, retry_after). retry_after > 0 means the hit is rejected."""
+    new_tat = max(tat or now, now) + interval
+    over = new_tat - now - period
+    if over > 0:
+        return (tat or now), over
+    return new_tat, 0.0
+
+
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    def hit(self, key: str, now: float, interval: float, period: float) -> float:
+        with self._lock:
+            new_tat, retry_after = _gcra(self._tats.get(key), now, interval, period)
+            if retry_after == 0:
+                self._tats[key] = new_tat
+            if key in self._tats:
+                self._tats.move_to_end(key)
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+            return retry_after
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+class SQLiteRateLimitBackend:
+    """GCRA state in a SQLite file shared by every worker process."""
+
+    # Prune idle keys every N hits
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str) -> None:
+        self._pool = db.ConnectionPool(path, pooled=db.DB_POOL_ENABLED)
+        self._ready = False
+        self._hits = 0
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        if not self._ready:
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS limites_requisicao (
+                        chave TEXT PRIMARY KEY,
+                        tat REAL NOT NULL
+                    ) WITHOUT ROWID
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_limites_requisicao_tat ON limites_requisicao(tat)")
+            self._ready = True
+
+    def hit(self, key: str, now: float, interval: float, period: float) -> float:
+        started = time.perf_counter()
+        conn = self._pool.acquire()
+        try:
+            self._ensure_schema(conn)
+            # IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tat FROM limites_requisicao WHERE chave = ?", (key,)).fetchone()
+            new_tat, retry_after = _gcra(row["tat"] if row else None, now, interval, period)
+            if retry_after == 0:
+                conn.execute(
+                    "INSERT INTO limites_requisicao (chave, tat) VALUES (?, ?) "
+                    "ON CONFLICT(chave) DO UPDATE SET tat = excluded.tat",
+                    (key, new_tat),
+                )
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                # A TAT in the past carries no state: the key is back to a full burst
+                conn.execute("DELETE FROM limites_requisicao WHERE tat < ?", (now,))
+            conn.execute("COMMIT")
+            return retry_after
+        finally:
+            self._pool.release(conn)
+            SQLITE_SECONDS.observe(time.perf_counter() - started, "rate_limit")
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+_shared_backend = None
+_shared_lock = threading.Lock()
+
+
+def default_backend():
+    """Backend shared by every limiter in this process, chosen by RATE_LIMIT_BACKEND."""
+    global _shared_backend
+    if _shared_backend is None:
+        with _shared_lock:
+            if _shared_backend is None:
+                if RATE_LIMIT_BACKEND == "sqlite":
+                    _shared_backend = SQLiteRateLimitBackend(RATE_LIMIT_DB_PATH or db.DB_PATH)
+                elif RATE_LIMIT_BACKEND == "memory":
+                    _shared_backend = MemoryRateLimitBackend()
+                else:
+                    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+    return _shared_backend
+
+
+class RateLimiter:
+    """Allow `limit` hits per `period` seconds for each key."""
+
+    def __init__(self, name: str, limit: int, period: float = 60.0, backend=None) -> None:
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self._backend = backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = default_backend()
+        return self._backend
+
+    def hit(self, key: str) -> float:
+        """Record a hit. Returns 0 if allowed, else seconds until the next allowed hit."""
+        if self.limit <= 0:
+            retry_after = float(self.period)
+        else:
+            retry_after = self.backend.hit(f"{self.name}:{key}", time.time(), self.period / self.limit, self.period)
+        if retry_after:
+            RATE_LIMIT_REJECTIONS.inc(self.name)
+        return retry_after
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
+import hashlib
 import os
 import time
-from typing import Optional, Tuple
-import jwt
+from typing import Any, Dict, Optional, Tuple
 
-JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
+from .cache import TTLCache
+from .jwt_keys import JWT_SECRET, JWT_TTL_SECS, get_keyring
+
+# Algorithm of JWT_SECRET tokens; signing keys and their algorithms come from jwt_keys
 JWT_ALG = "HS256"
-JWT_TTL_SECS = int(os.getenv("JWT_TTL_SECS", str(60 * 60 * 12)))  # 12h
+# Verified tokens kept in memory (keyed by SHA-256 of the token); 0 disables the cache
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+
+# Entries expire with the token's own exp, so a cached token is never accepted past it
+_verified = TTLCache(ttl=JWT_TTL_SECS, max_size=max(JWT_CACHE_SIZE, 1))
 
 
 def issue_jwt(user_id: str, role: str) -> str:
@@ -18,13 +25,29 @@ def issue_jwt(user_id: str, role: str) -> str:
         "iat": now,
         "exp": now + JWT_TTL_SECS,
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
+    return get_keyring().sign(payload)
 
 
-def verify_jwt(token: str) -> Optional[dict]:
-    try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-    except Exception:
-        return None
+def _decode(token: str) -> Optional[dict]:
+    return get_keyring().verify(token)
 
 
+def verify_jwt(token: str) -> Optional[dict]:
+    """Claims of a valid token, else None. Repeat checks of the same token are served from memory."""
+    if JWT_CACHE_SIZE <= 0:
+        return _decode(token)
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _verified.get(key)
+    if payload is None:
+        payload = _decode(token)
+        if payload is None:
+            # Bad tokens are not cached: anyone can mint unlimited distinct ones
+            return None
+        ttl = payload.get("exp", 0) - time.time()
+        if ttl > 0:
+            _verified.set(key, payload, ttl=ttl)
+    return dict(payload)
+
+
+def jwt_cache_stats() -> Dict[str, Any]:
+    return _verified.stats()
@@ -3,7 +3,7 @@ import hashlib
 import secrets
 import base64
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterator, Optional
 import os
 
 from ..models import InviteToken
@@ -18,6 +18,24 @@ def get_invite_token_secret() -> str:
     return secret
 
 
+_token_key: Optional["hmac.HMAC"] = None
+
+
+def _keyed_hmac() -> "hmac.HMAC":
+    """HMAC-SHA256 state keyed with INVITE_TOKEN_SECRET, built once per process and copied per token."""
+    global _token_key
+    key = _token_key
+    if key is None:
+        key = _token_key = hmac.new(get_invite_token_secret().encode('utf-8'), digestmod=hashlib.sha256)
+    return key
+
+
+def reset_token_key() -> None:
+    """Forget the cached key (after changing INVITE_TOKEN_SECRET, e.g. in tests)."""
+    global _token_key
+    _token_key = None
+
+
 def generate_token() -> str:
     """Generate a secure random token."""
     # Generate 32 random bytes and encode as base64url
@@ -27,12 +45,19 @@ def generate_token() -> str:
 
 def hash_token(token: str) -> str:
     """Hash a token using HMAC-SHA256."""
-    secret = get_invite_token_secret()
-    return hmac.new(
-        secret.encode('utf-8'),
-        token.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
+    mac = _keyed_hmac().copy()
+    mac.update(token.encode('utf-8'))
+    return mac.hexdigest()
+
+
+def generate_tokens(count: int) -> Iterator[tuple[str, str]]:
+    """Yield (plain_token, token_hash) pairs."""
+    keyed = _keyed_hmac()
+    for _ in range(count):
+        token = generate_token()
+        mac = keyed.copy()
+        mac.update(token.encode('utf-8'))
+        yield token, mac.hexdigest()
 
 
 def create_invite_token(
@@ -0,0 +1,176 @@
+"""
+bcrypt hashing and verification off the request path.
+
+bcrypt costs ~250 ms of CPU per call, so doing it inline lets a handful of
+logins saturate a uvicorn worker. Calls are shipped to a bounded process pool
+instead; the async entry points await the result without blocking the event
+loop, and the *_sync variants are for code that already runs in a worker
+thread (store.py, startup seeding).
+
+When more than PASSWORD_HASH_MAX_PENDING calls are in flight, new calls fail
+fast with PasswordHasherBusy, which main.py turns into 503 + Retry-After.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from ..metrics import PASSWORD_HASH_REJECTIONS, PASSWORD_HASH_SECONDS
+
+try:
+    import bcrypt  # type: ignore
+except Exception:  # pragma: no cover - bcrypt may not be installed in CI
+    bcrypt = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# 0 workers = use threads in this process (bcrypt releases the GIL)
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(HASH_WORKERS, 1) * 8)))
+HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+HASH_RETRY_AFTER_SECS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECS", "1"))
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; callers should retry later."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+# Module-level so they can be pickled into pool workers
+def _hashpw(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Bounded pool for bcrypt work with queue-depth back-pressure."""
+
+    def __init__(
+        self,
+        workers: int = HASH_WORKERS,
+        max_pending: int = HASH_MAX_PENDING,
+        rounds: int = HASH_ROUNDS,
+        retry_after: int = HASH_RETRY_AFTER_SECS,
+    ) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # spawn: forking a process that already runs threads can deadlock
+                ctx = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=os.cpu_count() or 1, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        if bcrypt is None:
+            raise RuntimeError("bcrypt is required on the backend to hash passwords")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                PASSWORD_HASH_REJECTIONS.inc()
+                raise PasswordHasherBusy(self.retry_after)
+            self._pending += 1
+            try:
+                try:
+                    future = self._get_executor().submit(fn, *args)
+                except BrokenProcessPool:
+                    logger.warning("Password hashing pool broke; restarting it")
+                    broken, self._executor = self._executor, None
+                    if broken is not None:
+                        # Reap its dead workers; its futures have already failed
+                        broken.shutdown(wait=False, cancel_futures=True)
+                    future = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._pending -= 1
+                raise
+        future.add_done_callback(self._release)
+        started = time.perf_counter()
+        op = "hash" if fn is _hashpw else "verify"
+        future.add_done_callback(lambda _: PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, op))
+        return future
+
+    async def hash_password(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(_hashpw, password.encode("utf-8"), self.rounds))
+
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(
+            self._submit(_checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+        )
+
+    def hash_password_sync(self, password: str) -> str:
+        return self._submit(_hashpw, password.encode("utf-8"), self.rounds).result()
+
+    def verify_password_sync(self, password: str, hashed: str) -> bool:
+        return self._submit(_checkpw, password.encode("utf-8"), hashed.encode("utf-8")).result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
+
+
+async def hash_password(password: str) -> str:
+    return await get_hasher().hash_password(password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await get_hasher().verify_password(password, hashed)
+
+
+def hash_password_sync(password: str) -> str:
+    return get_hasher().hash_password_sync(password)
+
+
+def verify_password_sync(password: str, hashed: str) -> bool:
+    return get_hasher().verify_password_sync(password, hashed)
+
+
+def shutdown() -> None:
+    """Stop the worker pool. Called from the FastAPI lifespan on shutdown."""
+    if _hasher is not None:
+        _hasher.shutdown()
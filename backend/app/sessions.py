@@ -0,0 +1,200 @@
+"""
+Server-side session storage for the cookie-based legacy auth in main.py.
+
+Two backends share the SessionStore interface:
+
+- MemorySessionStore: dict lookup plus a min-heap of expiry times, so sweeping
+  only touches sessions that are actually due. Capped at max_sessions; when
+  full, the session closest to expiry is evicted.
+- SQLiteSessionStore: a table in a shared SQLite file (WAL mode), so several
+  uvicorn worker processes see the same sessions.
+
+SESSION_BACKEND selects the backend (memory by default).
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import db
+from .metrics import SQLITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH")  # defaults to APP_DB_PATH
+SESSION_MAX = int(os.getenv("SESSION_MAX", "100000"))
+SESSION_SWEEP_INTERVAL_SECS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECS", "60"))
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def create(self, sid: str, uid: str, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, sid: str) -> Optional[str]:
+        """Return the user id for a live session, else None."""
+
+    @abstractmethod
+    def delete(self, sid: str) -> None:
+        ...
+
+    @abstractmethod
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Remove expired sessions; return how many were removed."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_sessions: int = SESSION_MAX) -> None:
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Tuple[str, float]] = {}
+        # (exp, sid); entries for deleted or replaced sessions are skipped lazily
+        self._expiry: List[Tuple[float, str]] = []
+
+    def create(self, sid: str, uid: str, ttl: float) -> None:
+        exp = time.time() + ttl
+        with self._lock:
+            if sid not in self._sessions and len(self._sessions) >= self.max_sessions:
+                self._sweep_locked(time.time())
+                while len(self._sessions) >= self.max_sessions and self._expiry:
+                    self._pop_earliest_locked()
+            self._sessions[sid] = (uid, exp)
+            heapq.heappush(self._expiry, (exp, sid))
+
+    def get(self, sid: str) -> Optional[str]:
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            uid, exp = entry
+            if exp < time.time():
+                del self._sessions[sid]
+                return None
+            return uid
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(sid, None)
+            # Stale heap entries are only a problem if they pile up
+            if len(self._expiry) > 2 * len(self._sessions) + 1024:
+                self._expiry = [(exp, s) for s, (_, exp) in self._sessions.items()]
+                heapq.heapify(self._expiry)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        with self._lock:
+            return self._sweep_locked(time.time() if now is None else now)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _pop_earliest_locked(self) -> bool:
+        exp, sid = heapq.heappop(self._expiry)
+        entry = self._sessions.get(sid)
+        if entry is not None and entry[1] == exp:
+            del self._sessions[sid]
+            return True
+        return False
+
+    def _sweep_locked(self, now: float) -> int:
+        removed = 0
+        while self._expiry and self._expiry[0][0] < now:
+            if self._pop_earliest_locked():
+                removed += 1
+        return removed
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file that every worker process can open."""
+
+    def __init__(self, path: str) -> None:
+        self._pool = db.ConnectionPool(path, pooled=db.DB_POOL_ENABLED)
+        self._ready = False
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.acquire()
+        try:
+            if not self._ready:
+                with conn:
+                    conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS sessoes (
+                            sid TEXT PRIMARY KEY,
+                            uid TEXT NOT NULL,
+                            exp REAL NOT NULL
+                        ) WITHOUT ROWID
+                        """
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_exp ON sessoes(exp)")
+                self._ready = True
+            with SQLITE_SECONDS.time("sessions"):
+                yield conn
+        finally:
+            self._pool.release(conn)
+
+    def create(self, sid: str, uid: str, ttl: float) -> None:
+        with self._connection() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessoes (sid, uid, exp) VALUES (?, ?, ?)",
+                (sid, uid, time.time() + ttl),
+            )
+
+    def get(self, sid: str) -> Optional[str]:
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT uid FROM sessoes WHERE sid = ? AND exp >= ?", (sid, time.time())
+            ).fetchone()
+        return row["uid"] if row else None
+
+    def delete(self, sid: str) -> None:
+        with self._connection() as conn, conn:
+            conn.execute("DELETE FROM sessoes WHERE sid = ?", (sid,))
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        with self._connection() as conn, conn:
+            cur = conn.execute("DELETE FROM sessoes WHERE exp < ?", (time.time() if now is None else now,))
+            return cur.rowcount
+
+    def __len__(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(SESSION_DB_PATH or db.DB_PATH)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+async def run_sweeper(store: SessionStore, interval: float = SESSION_SWEEP_INTERVAL_SECS) -> None:
+    """Periodically drop expired sessions until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await asyncio.to_thread(store.sweep)
+            if removed:
+                logger.debug("Swept %d expired sessions", removed)
+        except Exception as e:
+            logger.error("Session sweep failed: %s", e)
@@ -3,21 +3,23 @@ from __future__ import annotations
 import os
 import time
 import threading
+from datetime import datetime
 from typing import Dict, List, Optional
 
-try:
-    import bcrypt  # type: ignore
-except Exception:  # pragma: no cover - bcrypt may not be installed in CI
-    bcrypt = None  # type: ignore
-
 from .models import StoredUser, PublicUser, InviteToken
+from .services.password_hashing import hash_password_sync
 
 
 _users_lock = threading.RLock()
 _users: Dict[str, StoredUser] = {}
+# Secondary indexes (guarded by _users_lock): lowercased username/email -> user id
+_users_by_username: Dict[str, str] = {}
+_users_by_email: Dict[str, str] = {}
 
 _tokens_lock = threading.RLock()
 _invite_tokens: Dict[str, InviteToken] = {}
+# Secondary index (guarded by _tokens_lock): token_hash -> token id
+_tokens_by_hash: Dict[str, str] = {}
 
 
 def _now_iso() -> str:
@@ -31,10 +33,8 @@ def list_users() -> List[PublicUser]:
 
 def find_by_username(username: str) -> Optional[StoredUser]:
     with _users_lock:
-        for u in _users.values():
-            if u.username.lower() == username.lower():
-                return u
-    return None
+        user_id = _users_by_username.get(username.lower())
+        return _users.get(user_id) if user_id else None
 
 
 def find_by_id(user_id: str) -> Optional[StoredUser]:
@@ -44,10 +44,22 @@ def find_by_id(user_id: str) -> Optional[StoredUser]:
 
 def find_by_email(email: str) -> Optional[StoredUser]:
     with _users_lock:
-        for u in _users.values():
-            if u.email and u.email.lower() == email.lower():
-                return u
-    return None
+        user_id = _users_by_email.get(email.lower())
+        return _users.get(user_id) if user_id else None
+
+
+def find_by_username_or_email(username_or_email: str) -> Optional[StoredUser]:
+    key = username_or_email.lower()
+    with _users_lock:
+        user_id = _users_by_username.get(key) or _users_by_email.get(key)
+        return _users.get(user_id) if user_id else None
+
+
+def _index_user(u: StoredUser) -> None:
+    # Caller must hold _users_lock
+    _users_by_username[u.username.lower()] = u.id
+    if u.email:
+        _users_by_email[u.email.lower()] = u.id
 
 
 def _random_id() -> str:
@@ -77,8 +89,6 @@ def create_user_with_hash(
     email: Optional[str] = None,
     is_admin: bool = False,
 ) -> PublicUser:
-    if find_by_username(username):
-        raise ValueError("User already exists")
     now = _now_iso()
     user = StoredUser(
         id=_random_id(),
@@ -93,14 +103,16 @@ def create_user_with_hash(
         updated_at=now,
     )
     with _users_lock:
+        # Check and insert under one lock so concurrent signups can't both pass
+        if username.lower() in _users_by_username:
+            raise ValueError("User already exists")
         _users[user.id] = user
+        _index_user(user)
     return to_public_user(user)
 
 
 def create_user(*, username: str, name: str, password: str, email: Optional[str] = None) -> PublicUser:
-    if bcrypt is None:
-        raise RuntimeError("bcrypt is required on the backend to create users")
-    pw_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    pw_hash = hash_password_sync(password)
     return create_user_with_hash(username=username, name=name, password_hash=pw_hash, email=email, is_admin=False)
 
 
@@ -127,37 +139,49 @@ def update_user(
 
 
 def reset_password(*, user_id: str, new_password: str) -> None:
-    if bcrypt is None:
-        raise RuntimeError("bcrypt is required on the backend to reset passwords")
+    # Hash before taking the lock so a slow hash never blocks other lookups
+    pw_hash = hash_password_sync(new_password)
     with _users_lock:
         u = _users.get(user_id)
         if not u:
             raise KeyError("User not found")
-        u.password_hash = bcrypt.hashpw(new_password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        u.password_hash = pw_hash
         u.updated_at = _now_iso()
         _users[user_id] = u
 
 
+def clear() -> None:
+    """Drop every user, invite token and index entry (tests and benchmarks)."""
+    with _users_lock:
+        _users.clear()
+        _users_by_username.clear()
+        _users_by_email.clear()
+    with _tokens_lock:
+        _invite_tokens.clear()
+        _tokens_by_hash.clear()
+
+
 # Legacy admin seeding removed - use invite tokens to create admin users
 
 
 # Invite token management
 def create_invite_token(token: InviteToken) -> InviteToken:
     with _tokens_lock:
+        previous = _invite_tokens.get(token.id)
+        if previous is not None and _tokens_by_hash.get(previous.token_hash) == token.id:
+            del _tokens_by_hash[previous.token_hash]
         _invite_tokens[token.id] = token
+        _tokens_by_hash[token.token_hash] = token.id
     return token
 
 
 def find_invite_token_by_hash(token_hash: str) -> Optional[InviteToken]:
     with _tokens_lock:
-        for token in _invite_tokens.values():
-            if token.token_hash == token_hash:
-                return token
-    return None
+        token_id = _tokens_by_hash.get(token_hash)
+        return _invite_tokens.get(token_id) if token_id else None
 
 
 def mark_token_as_used(token_id: str) -> None:
-    from datetime import datetime
     with _tokens_lock:
         token = _invite_tokens.get(token_id)
         if token:
@@ -165,6 +189,22 @@ def mark_token_as_used(token_id: str) -> None:
             _invite_tokens[token_id] = token
 
 
+def purge_invite_tokens(expired_before: datetime, used_before: datetime, limit: int) -> int:
+    """Delete up to `limit` tokens that expired before expired_before or were used before used_before."""
+    with _tokens_lock:
+        doomed = []
+        for token in _invite_tokens.values():
+            if token.expires_at < expired_before or (token.used_at is not None and token.used_at < used_before):
+                doomed.append(token)
+                if len(doomed) >= limit:
+                    break
+        for token in doomed:
+            del _invite_tokens[token.id]
+            if _tokens_by_hash.get(token.token_hash) == token.id:
+                del _tokens_by_hash[token.token_hash]
+    return len(doomed)
+
+
 def list_invite_tokens() -> List[InviteToken]:
     with _tokens_lock:
         return list(_invite_tokens.values())
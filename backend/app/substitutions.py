@@ -0,0 +1,240 @@
+"""
+Macro-equivalent food substitutions.
+
+Every food is placed by its macro profile: the share of its calories that
+comes from protein, carbs and fat (4/4/9 kcal per gram), a point on a
+triangle that doesn't depend on how dense the food is. Rice and pasta land
+close together, chicken breast next to tilapia. The closest foods to a given
+one are its substitutes, each in the quantity that keeps the calories equal
+(150 g of rice -> about 140 g of pasta), as a nutritionist swaps foods in the
+Substitution lists of a meal (types.ts).
+
+The catalog is a few thousand 3-d points, so a query is one vectorized
+distance pass over all of them (about 0.2 ms for 6000 foods), with no tree
+to rebuild: foods are appended to capacity-doubling arrays, and custom foods
+(utils/customFoods.ts, stored in alimentos_custom) join the index as they
+are created. Custom foods are visible to their owner only. Foods without
+calories (water, diet drinks) have no profile and are left out.
+
+The index follows the food-search snapshot: when the catalog reloads it is
+rebuilt from the new snapshot plus the stored custom foods.
+
+Categories come from file catalogs (FOOD_CATALOG_PATH) and custom foods; the
+Supabase foods table has no category column, so with it same_category only
+groups the catalog's foods together, all without a category.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .food_search import FoodIndex, get_index
+from .nutrition import _number, js_round
+
+# kcal per gram of protein, carbs and fat
+ATWATER = np.array([4.0, 4.0, 9.0])
+
+
+def custom_food_to_food(custom: Dict[str, Any]) -> Dict[str, Any]:
+    """customFoodToFood in utils/customFoods.ts: base-portion values rescaled to per 100 g."""
+    grams = _number(custom.get("grams")) or 100
+    multiplier = 100 / max(1.0, grams)
+    food = {
+        "id": str(custom["id"]),
+        "food_name": custom["food_name"],
+        "source": "CUSTOM",
+        "portion_grams": grams,
+        "category": custom.get("category"),
+    }
+    columns = ("energy_kcal", "carbs_g", "protein_g", "fat_g", "fiber_g")
+    values = js_round(np.array([_number(custom.get(column)) for column in columns]) * multiplier, 1)
+    food.update(zip(columns, values.tolist()))
+    return food
+
+
+def _union(mask: Optional[np.ndarray], other: np.ndarray) -> np.ndarray:
+    return other if mask is None else mask | other
+
+
+class SubstitutionIndex:
+    """Macro profiles by food, appendable while queries run. Safe to share between threads."""
+
+    def __init__(self, foods: Iterable[Dict[str, Any]] = ()) -> None:
+        self._lock = threading.Lock()
+        self._items: List[Dict[str, Any]] = []
+        self._owners: List[Optional[str]] = []
+        self._macros: List[Tuple[float, float, float, float]] = []  # protein, carbs, fat, fiber per 100 g
+        self._rows: Dict[str, int] = {}
+        # Sources, categories and owners as small ints; code 0 of owners is the shared catalog
+        self._codes: Dict[str, Dict[Optional[str], int]] = {"source": {}, "category": {}, "owner": {None: 0}}
+        # (size, profiles, kcal, source, category, owner), swapped whole so readers never see a half-grown array
+        # Profiles are stored column-wise (3 x capacity): each distance term is one contiguous pass
+        self._state = (0, np.empty((3, 0)), np.empty(0), *(np.empty(0, dtype=np.int32) for _ in range(3)))
+        self.add(foods)
+
+    def __len__(self) -> int:
+        return self._state[0]
+
+    def _code(self, field: str, value: Optional[str]) -> int:
+        codes = self._codes[field]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def add(self, foods: Iterable[Dict[str, Any]], owner: Optional[str] = None) -> int:
+        """Index foods (per 100 g, as served by food search); `owner` makes them private. Returns how many."""
+        with self._lock:
+            size, profiles, kcal, source, category, owner_codes = self._state
+            added, next_row = [], size
+            for food in foods:
+                macros = tuple(_number(food.get(c)) for c in ("protein_g", "carbs_g", "fat_g", "fiber_g"))
+                energy = np.array(macros[:3]) * ATWATER
+                total = energy.sum()
+                if total <= 0:
+                    continue
+                food_id = str(food["id"])
+                row = self._rows.get(food_id)
+                if row is None or self._owners[row] != owner:
+                    row, next_row = next_row, next_row + 1
+                item = dict(food, id=food_id)
+                added.append((row, item, macros, energy / total, _number(food.get("energy_kcal")) or total))
+            if not added:
+                return 0
+
+            needed = next_row
+            if needed > len(kcal):
+                capacity = max(needed, 2 * len(kcal), 256)
+                grown = np.empty((3, capacity))
+                grown[:, :size] = profiles[:, :size]
+                profiles = grown
+                kcal, source, category, owner_codes = (
+                    np.resize(array, capacity) for array in (kcal, source, category, owner_codes)
+                )
+            for row, item, macros, profile, energy in added:
+                if row >= len(self._items):
+                    self._items.append(item)
+                    self._owners.append(owner)
+                    self._macros.append(macros)
+                else:
+                    self._items[row], self._macros[row] = item, macros
+                self._rows[item["id"]] = row
+                profiles[:, row] = profile
+                kcal[row] = energy
+                source[row] = self._code("source", (item.get("source") or "").upper())
+                category[row] = self._code("category", item.get("category") or None)
+                owner_codes[row] = self._code("owner", owner)
+            self._state = (needed, profiles, kcal, source, category, owner_codes)
+            return len(added)
+
+    def substitutes(
+        self,
+        food_id: str,
+        grams: float,
+        k: int = 10,
+        same_source: bool = False,
+        same_category: bool = False,
+        sources: Optional[Sequence[str]] = None,
+        owner: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        The k foods closest in macro profile to `grams` of food_id, each with
+        the quantity of the same calories, best first. `owner` also searches
+        that user's custom foods. Raises KeyError for an unknown (or
+        another user's) food.
+        """
+        size, profiles, kcal, source, category, owner_codes = self._state
+        row = self._rows.get(str(food_id))
+        if row is None or row >= size or self._owners[row] not in (None, owner):
+            raise KeyError(food_id)
+
+        if k <= 0:
+            return []
+        # Squared distance to every food; the ones filtered out are pushed to infinity
+        p, c, f = profiles[:, row]
+        distances = (profiles[0, :size] - p) ** 2
+        distances += (profiles[1, :size] - c) ** 2
+        distances += (profiles[2, :size] - f) ** 2
+        excluded = None
+        if len(self._codes["owner"]) > 1:
+            owner_code = self._codes["owner"].get(owner, 0) if owner is not None else 0
+            excluded = (owner_codes[:size] != 0) & (owner_codes[:size] != owner_code)
+        if same_source:
+            excluded = _union(excluded, source[:size] != source[row])
+        if same_category:
+            # Foods without a category form one group
+            excluded = _union(excluded, category[:size] != category[row])
+        if sources:
+            wanted = np.zeros(len(self._codes["source"]), dtype=bool)
+            wanted[[self._codes["source"][s.upper()] for s in sources if s.upper() in self._codes["source"]]] = True
+            excluded = _union(excluded, ~wanted[source[:size]])
+        if excluded is not None:
+            distances[excluded] = np.inf
+        distances[row] = np.inf
+
+        candidates = np.argpartition(distances, k - 1)[:k] if size > k else np.arange(size)
+        candidates = candidates[np.isfinite(distances[candidates])]
+        distances = np.sqrt(distances[candidates])
+        order = np.lexsort((candidates, distances))
+
+        # Same calories as `grams` of the original; rounded as the SPA rounds (Math.round)
+        matches = candidates[order]
+        quantity = grams * kcal[row] / kcal[matches]
+        factor = quantity / 100
+        macros = np.array([self._macros[match] for match in matches.tolist()]).reshape(-1, 4) * factor[:, None]
+        rounded = zip(
+            matches.tolist(),
+            js_round(quantity).tolist(),
+            js_round(distances[order], 4).tolist(),
+            js_round(kcal[matches] * factor).tolist(),
+            js_round(macros, 1).tolist(),
+        )
+        results = []
+        for match, quantity, distance, calories, (protein, carbs, fat, fiber) in rounded:
+            results.append({
+                **self._items[match],
+                "quantity": quantity,
+                "distance": distance,
+                "macros": {"calories": calories, "protein": protein, "carbs": carbs, "fat": fat, "fiber": fiber},
+            })
+        return results
+
+
+_index: Optional[SubstitutionIndex] = None
+_index_catalog: Optional[FoodIndex] = None
+_index_lock = threading.Lock()
+
+
+def _load_custom_foods() -> List[Dict[str, Any]]:
+    from . import db
+
+    return db.list_custom_foods()
+
+
+def get_substitution_index() -> Optional[SubstitutionIndex]:
+    """Index over the current food-search snapshot and every custom food, or None before the catalog loads."""
+    global _index, _index_catalog
+    catalog = get_index()
+    if catalog is None:
+        return None
+    if catalog is not _index_catalog:
+        with _index_lock:
+            if catalog is not _index_catalog:
+                index = SubstitutionIndex(catalog.items)
+                for custom in _load_custom_foods():
+                    index.add([custom_food_to_food(custom)], owner=custom["usuario_id"])
+                _index, _index_catalog = index, catalog
+    return _index
+
+
+def add_custom_food(usuario_id: str, custom: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a custom food and index it for its owner; returns it per 100 g."""
+    from . import db
+
+    food = custom_food_to_food(db.insert_custom_food(usuario_id, custom))
+    # A rebuild (catalog reload) picks it up from the table; until then append it
+    with _index_lock:
+        if _index is not None:
+            _index.add([food], owner=usuario_id)
+    return food
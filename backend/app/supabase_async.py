@@ -0,0 +1,317 @@
+"""
+Async data access for Supabase (PostgREST + GoTrue) over a pooled httpx.AsyncClient.
+
+The sync supabase-py client holds a threadpool slot for a whole network
+round-trip. The async routes in invite_routes and supabase_auth_routes use
+this module instead, so one worker can keep many requests in flight and
+independent lookups can run concurrently with asyncio.gather.
+
+Only the small surface the routes need is implemented: table
+select/insert/update/delete with PostgREST filters, plus the GoTrue calls
+for admin user creation, password sign-in and token introspection.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from .metrics import SUPABASE_SECONDS
+from .supabase_client import async_http_transport, http_limits, http_timeout, supabase_credentials
+
+# (column, operator, value), e.g. ("email", "eq", "a@b.c") -> email=eq.a@b.c
+# A None operator passes the value through as-is: ("or", None, "(a.eq.1,b.eq.2)") -> or=(a.eq.1,b.eq.2)
+Filter = Tuple[str, Optional[str], Any]
+
+
+class SupabaseAPIError(Exception):
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(f"Supabase API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+def pg_quote(value: str) -> str:
+    """Double-quote a value for a PostgREST or=()/and=() expression, where , . : ( ) are reserved."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def filter_params(filters: Iterable[Filter]) -> List[Tuple[str, str]]:
+    params = []
+    for column, op, value in filters:
+        if op is None:
+            params.append((column, value))
+            continue
+        if value is None:
+            value = "null"
+        elif isinstance(value, bool):
+            value = "true" if value else "false"
+        params.append((column, f"{op}.{value}"))
+    return params
+
+
+class AsyncSupabase:
+    def __init__(self, url: str, service_role_key: str, http: Optional[httpx.AsyncClient] = None) -> None:
+        self.url = url.rstrip("/")
+        self.key = service_role_key
+        self._headers = {"apikey": service_role_key, "Authorization": f"Bearer {service_role_key}"}
+        self.http = http or httpx.AsyncClient(
+            timeout=http_timeout(), limits=http_limits(), transport=async_http_transport()
+        )
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Sequence[Tuple[str, str]]] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        api = "auth" if path.startswith("/auth/") else "rest"
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(
+                method,
+                f"{self.url}{path}",
+                params=params,
+                json=json,
+                headers={**self._headers, **(headers or {})},
+            )
+        except httpx.HTTPError:
+            SUPABASE_SECONDS.observe(time.perf_counter() - started, api, method, "error")
+            raise
+        SUPABASE_SECONDS.observe(time.perf_counter() - started, api, method, str(response.status_code))
+        if response.status_code >= 400:
+            try:
+                body = response.json()
+                message = body.get("message") or body.get("msg") or body.get("error_description") or str(body)
+            except ValueError:
+                message = response.text
+            raise SupabaseAPIError(response.status_code, message)
+        if not response.content:
+            return None
+        return response.json()
+
+    # ===== PostgREST =====
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Iterable[Filter] = (),
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        params = [("select", columns)] + filter_params(filters)
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        return await self._request("GET", f"/rest/v1/{table}", params=params)
+
+    async def insert(self, table: str, rows: Any, returning: str = "representation") -> Optional[List[Dict[str, Any]]]:
+        """Insert one row or a list of rows (one multi-row INSERT). returning="minimal" skips the echo."""
+        return await self._request(
+            "POST", f"/rest/v1/{table}", json=rows, headers={"Prefer": f"return={returning}"}
+        )
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Iterable[Filter]) -> List[Dict[str, Any]]:
+        return await self._request(
+            "PATCH",
+            f"/rest/v1/{table}",
+            params=filter_params(filters),
+            json=values,
+            headers={"Prefer": "return=representation"},
+        )
+
+    async def delete(self, table: str, filters: Iterable[Filter]) -> List[Dict[str, Any]]:
+        return await self._request(
+            "DELETE",
+            f"/rest/v1/{table}",
+            params=filter_params(filters),
+            headers={"Prefer": "return=representation"},
+        )
+
+    # ===== GoTrue =====
+
+    async def create_user(self, email: str, password: str) -> Dict[str, Any]:
+        return await self._request(
+            "POST",
+            "/auth/v1/admin/users",
+            json={"email": email, "password": password, "email_confirm": True},
+        )
+
+    async def sign_in_with_password(self, email: str, password: str) -> Dict[str, Any]:
+        """Returns the session payload: access_token, refresh_token and user."""
+        return await self._request(
+            "POST",
+            "/auth/v1/token",
+            params=[("grant_type", "password")],
+            json={"email": email, "password": password},
+        )
+
+    async def get_user(self, access_token: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await self._request(
+                "GET", "/auth/v1/user", headers={"Authorization": f"Bearer {access_token}"}
+            )
+        except SupabaseAPIError as e:
+            if e.status_code in (401, 403, 404):
+                return None
+            raise
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+class InviteTokensRepo:
+    def __init__(self, db: AsyncSupabase) -> None:
+        self.db = db
+
+    async def insert(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        rows = await self.db.insert("invite_tokens", row)
+        return rows[0] if rows else None
+
+    async def insert_many(self, rows: List[Dict[str, Any]]) -> None:
+        await self.db.insert("invite_tokens", rows, returning="minimal")
+
+    async def find(self, token_hash: str, email: str) -> Optional[Dict[str, Any]]:
+        rows = await self.db.select(
+            "invite_tokens",
+            "id, email, role, organization_id, expires_at, used_at",
+            [("token_hash", "eq", token_hash), ("email", "eq", email)],
+            limit=1,
+        )
+        return rows[0] if rows else None
+
+    async def mark_used(self, token_hash: str, email: str, used_at: str) -> bool:
+        rows = await self.db.update(
+            "invite_tokens", {"used_at": used_at}, [("token_hash", "eq", token_hash), ("email", "eq", email)]
+        )
+        return bool(rows)
+
+    async def list(
+        self,
+        organization_id: Optional[str] = None,
+        filters: Iterable[Filter] = (),
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Newest first by (created_at, id), the order keyset pagination relies on."""
+        filters = list(filters)
+        if organization_id:
+            filters.append(("organization_id", "eq", organization_id))
+        return await self.db.select(
+            "invite_tokens",
+            "id, email, role, expires_at, created_at, used_at",
+            filters,
+            order="created_at.desc,id.desc",
+            limit=limit,
+        )
+
+    async def delete(self, token_id: str) -> bool:
+        return bool(await self.db.delete("invite_tokens", [("id", "eq", token_id)]))
+
+    async def delete_expired(self, now_iso: str, used_before: Optional[str] = None, limit: int = 500) -> int:
+        """Delete up to `limit` expired tokens (and ones used before used_before). Returns how many went."""
+        if used_before:
+            filters: List[Filter] = [
+                ("or", None, f"(expires_at.lt.{pg_quote(now_iso)},used_at.lt.{pg_quote(used_before)})")
+            ]
+        else:
+            filters = [("expires_at", "lt", now_iso)]
+        # PostgREST can't bound a DELETE by itself: pick the ids first, then delete exactly those
+        rows = await self.db.select("invite_tokens", "id", filters, limit=limit)
+        if not rows:
+            return 0
+        ids = ",".join(row["id"] for row in rows)
+        return len(await self.db.delete("invite_tokens", [("id", "in", f"({ids})")]))
+
+
+class UserRolesRepo:
+    def __init__(self, db: AsyncSupabase) -> None:
+        self.db = db
+
+    async def get(self, user_id: str, organization_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        filters: List[Filter] = [("user_id", "eq", user_id)]
+        if organization_id:
+            filters.append(("organization_id", "eq", organization_id))
+        rows = await self.db.select("user_roles", "role, organization_id", filters, limit=1)
+        return rows[0] if rows else None
+
+    async def assign(self, user_id: str, organization_id: str, role: str) -> Dict[str, Any]:
+        rows = await self.db.insert(
+            "user_roles", {"user_id": user_id, "organization_id": organization_id, "role": role}
+        )
+        return rows[0] if rows else {}
+
+
+class OrganizationsRepo:
+    def __init__(self, db: AsyncSupabase) -> None:
+        self.db = db
+
+    async def first_id(self) -> Optional[str]:
+        rows = await self.db.select("organizations", "id", limit=1)
+        return rows[0]["id"] if rows else None
+
+
+class FoodsRepo:
+    COLUMNS = "id, food_name, unit, portion_grams, carbs_g, protein_g, fat_g, fiber_g, energy_kcal, source"
+
+    def __init__(self, db: AsyncSupabase) -> None:
+        self.db = db
+
+    async def all(self, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """Every food, fetched in id order one keyset page at a time."""
+        foods: List[Dict[str, Any]] = []
+        while True:
+            filters: List[Filter] = [("id", "gt", foods[-1]["id"])] if foods else []
+            rows = await self.db.select("foods", self.COLUMNS, filters, order="id.asc", limit=page_size)
+            foods.extend(rows)
+            if len(rows) < page_size:
+                return foods
+
+
+class AsyncSupabaseDAL:
+    """Bundle of the async repositories over one AsyncSupabase connection pool."""
+
+    def __init__(self, db: AsyncSupabase) -> None:
+        self.db = db
+        self.invite_tokens = InviteTokensRepo(db)
+        self.user_roles = UserRolesRepo(db)
+        self.organizations = OrganizationsRepo(db)
+        self.foods = FoodsRepo(db)
+        self.organization_id = os.environ.get("ORGANIZATION_ID", "00000000-0000-0000-0000-000000000001")
+
+
+_dal: Optional[AsyncSupabaseDAL] = None
+_dal_lock = threading.Lock()
+
+
+def get_async_dal() -> AsyncSupabaseDAL:
+    """Process-wide async DAL, built on first use. Usable as a FastAPI dependency."""
+    global _dal
+    if _dal is None:
+        with _dal_lock:
+            if _dal is None:
+                url, service_role_key = supabase_credentials()
+                _dal = AsyncSupabaseDAL(AsyncSupabase(url, service_role_key))
+    return _dal
+
+
+def set_async_dal(dal: Optional[AsyncSupabaseDAL]) -> None:
+    """Override the DAL (tests and local stand-ins)."""
+    global _dal
+    with _dal_lock:
+        _dal = dal
+
+
+async def close_async_dal() -> None:
+    """Close the async HTTP pool. Called from the FastAPI lifespan on shutdown."""
+    global _dal
+    dal, _dal = _dal, None
+    if dal is not None:
+        await dal.db.aclose()
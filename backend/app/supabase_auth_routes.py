@@ -1,16 +1,30 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 
-from .supabase_client import SupabaseClient
-from .invite_api import invite_manager
+from .supabase_async import AsyncSupabaseDAL, SupabaseAPIError, get_async_dal
+from .invite_api import async_invite_manager as invite_manager
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/auth", tags=["supabase-auth"])
 
+
+def require_async_dal() -> AsyncSupabaseDAL:
+    """get_async_dal as a dependency: missing Supabase settings are a 503, not a bare 500."""
+    try:
+        return get_async_dal()
+    except ValueError:
+        logger.error("Supabase is not configured; /api/auth and /api/invite are unavailable")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service unavailable",
+        )
+
+
 class RegisterRequest(BaseModel):
     email: EmailStr
     password: str
@@ -34,11 +48,11 @@ class LoginResponse(BaseModel):
     user: Optional[dict] = None
 
 @router.post("/register", response_model=RegisterResponse)
-def register_with_invite(payload: RegisterRequest):
+async def register_with_invite(payload: RegisterRequest, dal: AsyncSupabaseDAL = Depends(require_async_dal)):
     """Register a new user with invite token"""
     try:
         # Validate invite token
-        validation_result = invite_manager.validate_invite_token(
+        validation_result = await invite_manager.validate_invite_token(
             token=payload.invite_token,
             email=payload.email
         )
@@ -51,35 +65,29 @@ def register_with_invite(payload: RegisterRequest):
             )
         
         # Create user in Supabase Auth
-        supabase = SupabaseClient()
-        user_result = supabase.create_user(
-            email=payload.email,
-            password=payload.password
-        )
-        
-        if not user_result["success"]:
+        try:
+            user = await dal.db.create_user(email=payload.email, password=payload.password)
+        except SupabaseAPIError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Failed to create user: {user_result['error']}"
+                detail=f"Failed to create user: {e.message}"
             )
         
-        user_id = user_result["user"].id
+        user_id = user["id"]
         
-        # Assign role to user
-        role_result = supabase.assign_user_role(
-            user_id=user_id,
-            role=validation_result.role
+        # Assign role and mark the invite used (by plain token + email); independent, so run together
+        role_result, used_result = await asyncio.gather(
+            dal.user_roles.assign(user_id, dal.organization_id, validation_result.role),
+            invite_manager.mark_token_as_used(payload.invite_token, payload.email),
+            return_exceptions=True,
         )
         
-        if not role_result["success"]:
-            logger.error(f"Failed to assign role: {role_result['error']}")
+        if isinstance(role_result, Exception):
+            logger.error("Failed to assign role: %s", role_result)
             # Note: User is created but role assignment failed
             # In production, you might want to implement cleanup
         
-        # Mark invite token as used (by plain token + email)
-        try:
-            invite_manager.mark_token_as_used(payload.invite_token, payload.email)
-        except Exception:
+        if isinstance(used_result, Exception) or not used_result:
             # Don’t fail registration if marking used fails; just log
             logger.warning("Failed to mark invite token as used")
         
@@ -92,54 +100,50 @@ def register_with_invite(payload: RegisterRequest):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Registration failed"
         )
 
 @router.post("/login", response_model=LoginResponse)
-def login_user(payload: LoginRequest):
+async def login_user(payload: LoginRequest, dal: AsyncSupabaseDAL = Depends(require_async_dal)):
     """Login user with Supabase Auth"""
     try:
-        supabase = SupabaseClient()
-        
         # Authenticate with Supabase
-        response = supabase.client.auth.sign_in_with_password({
-            "email": payload.email,
-            "password": payload.password
-        })
+        session = await dal.db.sign_in_with_password(payload.email, payload.password)
+        user = session.get("user") if session else None
         
-        if not response.user:
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
         # Get user role
-        user_role = supabase.get_user_role(response.user.id)
+        role_row = await dal.user_roles.get(user["id"], dal.organization_id)
         
         # Prepare user data
         user_data = {
-            "id": response.user.id,
-            "email": response.user.email,
-            "role": user_role,
-            "organizationId": supabase.organization_id,
+            "id": user["id"],
+            "email": user.get("email"),
+            "role": role_row["role"] if role_row else None,
+            "organizationId": dal.organization_id,
             "organizationName": "BM-TEAM"
         }
         
         return LoginResponse(
             success=True,
             message="Login successful",
-            access_token=response.session.access_token,
-            refresh_token=response.session.refresh_token,
+            access_token=session["access_token"],
+            refresh_token=session.get("refresh_token"),
             user=user_data
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Login failed"
@@ -1,36 +1,170 @@
+import logging
 import os
+import threading
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from typing import Optional, Dict, Any
+import httpx
+from supabase import Client
+from supabase.lib.auth_client import SupabaseAuthClient
+from supabase.lib.client_options import ClientOptions
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient as PostgrestHTTPClient
+from gotrue.http_clients import SyncClient as GoTrueHTTPClient
+from typing import Optional, Dict, Any, Tuple
 import hashlib
 import secrets
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables, preferring backend/.env, then falling back to project .env
 try:
     backend_env = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
     project_env = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env')
     if os.path.exists(backend_env):
         load_dotenv(backend_env, override=False)
-        print(f"DEBUG: Using env file: {backend_env}")
+        logger.debug("Using env file: %s", backend_env)
     elif os.path.exists(project_env):
         load_dotenv(project_env, override=False)
-        print(f"DEBUG: Using env file: {project_env}")
+        logger.debug("Using env file: %s", project_env)
     else:
         load_dotenv()
-        print("DEBUG: No .env file found explicitly; loaded default environment")
+        logger.debug("No .env file found explicitly; loaded default environment")
 except Exception as e:
-    print(f"DEBUG: Error loading env files: {e}")
+    logger.warning("Error loading env files: %s", e)
+
+# HTTP pool shared by every request through the process-wide client
+HTTP_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("SUPABASE_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.environ.get("SUPABASE_HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("SUPABASE_HTTP_CONNECT_TIMEOUT", "5"))
+
+# Route every client to the in-process fake project (app/testing/supabase_fake.py)
+SUPABASE_FAKE = os.environ.get("SUPABASE_FAKE", "").lower() in ("1", "true", "yes")
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _fake():
+    from .testing.supabase_fake import get_fake
+
+    return get_fake()
+
+
+def http_transport() -> Optional[httpx.BaseTransport]:
+    """Transport for sync clients: the fake's when SUPABASE_FAKE is set, else httpx's default."""
+    return _fake().transport() if SUPABASE_FAKE else None
+
+
+def async_http_transport() -> Optional[httpx.AsyncBaseTransport]:
+    return _fake().async_transport() if SUPABASE_FAKE else None
+
+
+def supabase_credentials() -> Tuple[str, str]:
+    """(project URL, service role key). Raises ValueError if they aren't configured."""
+    if SUPABASE_FAKE:
+        from .testing.supabase_fake import FAKE_URL
+
+        return FAKE_URL, _fake().service_role_key
+    url = os.environ.get("VITE_SUPABASE_URL")
+    service_role_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_role_key:
+        raise ValueError("Missing Supabase environment variables")
+    return url, service_role_key
+
+
+class _PooledPostgrestClient(SyncPostgrestClient):
+    def create_session(self, base_url, headers, timeout):
+        return PostgrestHTTPClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=http_timeout(),
+            limits=http_limits(),
+            transport=http_transport(),
+        )
+
+
+class _PooledClient(Client):
+    """supabase Client whose PostgREST and GoTrue calls share keep-alive pools."""
+
+    @staticmethod
+    def _init_supabase_auth_client(auth_url, client_options):
+        return SupabaseAuthClient(
+            url=auth_url,
+            auto_refresh_token=client_options.auto_refresh_token,
+            persist_session=client_options.persist_session,
+            storage=client_options.storage,
+            headers=client_options.headers,
+            http_client=GoTrueHTTPClient(timeout=http_timeout(), limits=http_limits(), transport=http_transport()),
+        )
+
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=None):
+        return _PooledPostgrestClient(rest_url, headers=headers, schema=schema, timeout=timeout)
+
+    def close(self) -> None:
+        self.auth._http_client.close()
+        if self._postgrest is not None:
+            self._postgrest.aclose()
+
+
+class SupabaseClientRegistry:
+    """Lazily-built, process-wide supabase clients.
+
+    - service: service-role client for table queries and auth.admin calls
+    - auth: used only for sign_in_with_password. Signing in stores the user's
+      session on the client (and switches its PostgREST auth to that user),
+      so it must never be the client that runs service-role queries.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._clients: Dict[str, _PooledClient] = {}
+
+    def _build(self) -> _PooledClient:
+        url, service_role_key = supabase_credentials()
+        # Fresh options each time: ClientOptions() defaults share one headers dict
+        options = ClientOptions(headers={}, auto_refresh_token=False, persist_session=False)
+        return _PooledClient(url, service_role_key, options)
+
+    def get(self, name: str = "service") -> _PooledClient:
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._build()
+                    self._clients[name] = client
+        return client
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+registry = SupabaseClientRegistry()
+
 
 class SupabaseClient:
-    def __init__(self):
-        url: str = os.environ.get("VITE_SUPABASE_URL")
-        service_role_key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-        
-        if not url or not service_role_key:
-            raise ValueError("Missing Supabase environment variables")
-        
-        self.client: Client = create_client(url, service_role_key)
+    """Helpers over the shared service-role client. Cheap to construct."""
+
+    def __init__(self, client: Optional[Client] = None):
+        self.client: Client = client or registry.get("service")
         self.organization_id = os.environ.get("ORGANIZATION_ID", "00000000-0000-0000-0000-000000000001")
         self.invite_secret = os.environ.get("INVITE_TOKEN_SECRET", "default-secret")
         self.token_expiry_hours = int(os.environ.get("INVITE_TOKEN_EXPIRY_HOURS", "24"))
@@ -166,5 +300,38 @@ class SupabaseClient:
         except Exception as e:
             return None
 
-# Global instance
-supabase_client = SupabaseClient()
+    def sign_in_with_password(self, email: str, password: str):
+        """Sign in on the dedicated auth client, never on the service client."""
+        return registry.get("auth").auth.sign_in_with_password({
+            "email": email,
+            "password": password
+        })
+
+
+_shared: Optional[SupabaseClient] = None
+
+
+def get_supabase_client() -> SupabaseClient:
+    """Process-wide SupabaseClient, built on first use.
+
+    Also usable as a FastAPI dependency: ``supabase: SupabaseClient = Depends(get_supabase_client)``.
+    """
+    global _shared
+    if _shared is None:
+        _shared = SupabaseClient()
+    return _shared
+
+
+def close_supabase_clients() -> None:
+    """Close pooled HTTP connections. Called from the FastAPI lifespan on shutdown."""
+    global _shared
+    _shared = None
+    registry.close()
+
+
+def __getattr__(name: str):
+    # Backwards compatibility: `from app.supabase_client import supabase_client`
+    # used to build a client at import time; now it is built on first access.
+    if name == "supabase_client":
+        return get_supabase_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,194 @@
+"""
+Local verification of Supabase access tokens.
+
+Supabase signs access tokens either with the project's JWT secret (HS256) or
+with an asymmetric key published at /auth/v1/.well-known/jwks.json. Checking
+the signature here avoids an auth.get_user() round-trip per request.
+
+Configuration:
+- SUPABASE_JWT_SECRET: verify HS256 tokens with this secret
+- SUPABASE_JWKS_URL: JWKS endpoint (defaults to the project's well-known URL)
+- SUPABASE_JWKS_TTL_SECS: how long fetched keys are trusted before a refresh
+- SUPABASE_JWT_AUDIENCE: expected "aud" claim ("authenticated")
+- SUPABASE_FAKE: trust the in-process fake project's keys (app/testing/supabase_fake.py)
+
+If neither a secret nor a Supabase URL is configured, get_token_verifier()
+returns None. When no local key matches a token (HS256 without a secret, or a
+kid missing from the JWKS), verify() raises LocalVerificationUnavailable and
+callers fall back to the remote check; a bad signature is never retried.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+JWKS_TTL_SECS = float(os.getenv("SUPABASE_JWKS_TTL_SECS", "600"))
+# Unknown kids trigger a refresh, but not more often than this
+JWKS_MIN_REFRESH_SECS = float(os.getenv("SUPABASE_JWKS_MIN_REFRESH_SECS", "30"))
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWT_LEEWAY_SECS = int(os.getenv("SUPABASE_JWT_LEEWAY_SECS", "10"))
+
+
+class LocalVerificationUnavailable(Exception):
+    """No local key can check this token; the caller should ask Supabase."""
+
+
+_EC_ALGS = {"P-256": "ES256", "P-384": "ES384", "P-521": "ES512"}
+
+
+def _jwk_algorithm(data: Dict[str, Any]) -> Optional[str]:
+    if data.get("alg"):
+        return data["alg"]
+    kty = data.get("kty")
+    if kty == "EC":
+        return _EC_ALGS.get(data.get("crv", "P-256"))
+    if kty == "OKP":
+        return "EdDSA"
+    return {"RSA": "RS256", "oct": "HS256"}.get(kty)
+
+
+def _http_fetch_jwks(url: str) -> Dict[str, Any]:
+    import httpx
+
+    response = httpx.get(url, timeout=5.0)
+    response.raise_for_status()
+    return response.json()
+
+
+class JWKSCache:
+    """Parsed signing keys by kid, refreshed on expiry or on an unknown kid."""
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float = JWKS_TTL_SECS,
+        fetch: Optional[Callable[[str], Dict[str, Any]]] = None,
+    ) -> None:
+        self.url = url
+        self.ttl = ttl
+        self._fetch = fetch or _http_fetch_jwks
+        self._lock = threading.Lock()
+        # kid -> (algorithm, parsed key)
+        self._keys: Dict[str, Tuple[str, Any]] = {}
+        self._fetched_at = 0.0
+
+    def _refresh_locked(self) -> None:
+        jwks = self._fetch(self.url)
+        keys: Dict[str, Tuple[str, Any]] = {}
+        for data in jwks.get("keys", []):
+            alg = _jwk_algorithm(data)
+            try:
+                key = jwt.PyJWK(data, alg)
+            except jwt.PyJWTError as e:
+                # e.g. an algorithm this install can't handle; skip that key only
+                logger.warning("Skipping JWKS key %s: %s", data.get('kid'), e)
+                continue
+            keys[data.get("kid") or ""] = (alg, key.key)
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def get_key(self, kid: Optional[str]) -> Optional[Tuple[str, Any]]:
+        """Return (algorithm, key) for kid, or None if the JWKS doesn't have it."""
+        kid = kid or ""
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if key is not None and now - self._fetched_at < self.ttl:
+            return key
+        with self._lock:
+            key = self._keys.get(kid)
+            age = now - self._fetched_at
+            stale = age >= self.ttl
+            if stale or (key is None and age >= JWKS_MIN_REFRESH_SECS):
+                try:
+                    self._refresh_locked()
+                except Exception as e:
+                    # Keep serving the previous keys if the endpoint is down
+                    logger.error("JWKS refresh failed: %s", e)
+                key = self._keys.get(kid)
+            return key
+
+
+class SupabaseTokenVerifier:
+    def __init__(
+        self,
+        secret: Optional[str] = None,
+        jwks: Optional[JWKSCache] = None,
+        audience: Optional[str] = JWT_AUDIENCE,
+    ) -> None:
+        self.secret = secret
+        self.jwks = jwks
+        self.audience = audience
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the token's claims if the signature and expiry check out, else None."""
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError:
+            return None
+        alg = header.get("alg")
+        if alg == "HS256" and self.secret:
+            key: Any = self.secret
+        else:
+            found = self.jwks.get_key(header.get("kid")) if self.jwks is not None else None
+            if found is None:
+                raise LocalVerificationUnavailable(f"No local key for alg={alg} kid={header.get('kid')}")
+            # The key's own algorithm wins over the (attacker-controlled) header
+            alg, key = found
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=self.audience,
+                options={"require": ["exp", "sub"], "verify_aud": self.audience is not None},
+                leeway=JWT_LEEWAY_SECS,
+            )
+        except jwt.PyJWTError:
+            return None
+
+
+_verifier: Optional[SupabaseTokenVerifier] = None
+_verifier_loaded = False
+_verifier_lock = threading.Lock()
+
+
+def get_token_verifier() -> Optional[SupabaseTokenVerifier]:
+    """Verifier configured from the environment, or None if nothing is configured."""
+    global _verifier, _verifier_loaded
+    if not _verifier_loaded:
+        with _verifier_lock:
+            if not _verifier_loaded:
+                # Imported here: supabase_client pulls in supabase-py
+                from .supabase_client import SUPABASE_FAKE
+
+                secret = os.getenv("SUPABASE_JWT_SECRET")
+                jwks_url = os.getenv("SUPABASE_JWKS_URL")
+                base_url = os.getenv("VITE_SUPABASE_URL")
+                if not jwks_url and base_url:
+                    jwks_url = base_url.rstrip("/") + "/auth/v1/.well-known/jwks.json"
+                if SUPABASE_FAKE:
+                    from .testing.supabase_fake import get_fake
+
+                    _verifier = get_fake().token_verifier()
+                elif secret or jwks_url:
+                    _verifier = SupabaseTokenVerifier(
+                        secret=secret,
+                        jwks=JWKSCache(jwks_url) if jwks_url else None,
+                    )
+                _verifier_loaded = True
+    return _verifier
+
+
+def set_token_verifier(verifier: Optional[SupabaseTokenVerifier]) -> None:
+    """Override the verifier (tests, or wiring a LocalJWKS stand-in)."""
+    global _verifier, _verifier_loaded
+    with _verifier_lock:
+        _verifier = verifier
+        _verifier_loaded = True
@@ -0,0 +1 @@
+# In-process stand-ins for external services (tests, benchmarks, offline runs)
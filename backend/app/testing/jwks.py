@@ -0,0 +1,82 @@
+"""
+Local stand-in for Supabase's JWKS endpoint.
+
+LocalJWKS mints access tokens shaped like Supabase's and serves the matching
+JWKS document, so the local verification path in supabase_jwt can be tested
+without a project. Keys are EC P-256 (ES256) when `cryptography` is installed,
+otherwise symmetric "oct" keys (HS256).
+
+    jwks = LocalJWKS()
+    verifier = SupabaseTokenVerifier(jwks=JWKSCache("local", fetch=jwks.fetch))
+    token = jwks.issue("user-id")
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import secrets
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import jwt
+
+from ..jwt_keys import ec_public_jwk
+
+try:
+    from cryptography.hazmat.primitives.asymmetric import ec  # type: ignore
+except Exception:  # pragma: no cover - cryptography is optional
+    ec = None  # type: ignore
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+
+class LocalJWKS:
+    def __init__(self, algorithm: Optional[str] = None, secret: Optional[bytes] = None) -> None:
+        """A fixed `secret` (HS256 only) gives the same key and kid in every process."""
+        self.algorithm = algorithm or ("HS256" if secret else "ES256" if ec is not None else "HS256")
+        # (kid, private signing key, public JWK)
+        self._keys: List[Tuple[str, Any, Dict[str, Any]]] = []
+        self.fetch_count = 0
+        self.rotate(secret=secret)
+
+    def rotate(self, keep_previous: bool = True, secret: Optional[bytes] = None) -> str:
+        """Add a new signing key (the previous ones stay published unless told otherwise)."""
+        kid = hashlib.sha256(secret).hexdigest()[:16] if secret else uuid.uuid4().hex[:16]
+        if self.algorithm == "ES256":
+            private_key = ec.generate_private_key(ec.SECP256R1())
+            public_jwk = ec_public_jwk(private_key.public_key())
+        else:
+            secret = secret or secrets.token_bytes(32)
+            private_key = secret
+            public_jwk = {"kty": "oct", "k": _b64url(secret)}
+        public_jwk.update({"kid": kid, "alg": self.algorithm, "use": "sig"})
+        if not keep_previous:
+            self._keys.clear()
+        self._keys.append((kid, private_key, public_jwk))
+        return kid
+
+    def jwks(self) -> Dict[str, Any]:
+        return {"keys": [jwk for _, _, jwk in self._keys]}
+
+    def fetch(self, url: str = "") -> Dict[str, Any]:
+        """Drop-in for the HTTP fetcher used by JWKSCache."""
+        self.fetch_count += 1
+        return self.jwks()
+
+    def issue(self, user_id: str, ttl: int = 3600, email: Optional[str] = None, **claims: Any) -> str:
+        kid, private_key, _ = self._keys[-1]
+        now = int(time.time())
+        payload = {
+            "sub": user_id,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "iat": now,
+            "exp": now + ttl,
+            "email": email or f"{user_id}@example.com",
+        }
+        payload.update(claims)
+        return jwt.encode(payload, private_key, algorithm=self.algorithm, headers={"kid": kid})
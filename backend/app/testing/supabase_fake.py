@@ -0,0 +1,725 @@
+"""
+Local stand-in for a Supabase project (PostgREST + GoTrue), backed by SQLite.
+
+FakeSupabase implements the slice of the HTTP API this backend uses:
+- /rest/v1/<table>: GET/POST/PATCH/DELETE with eq/neq/lt/lte/gt/gte/like/
+  ilike/in/is filters (and not.), or=()/and() groups, order, limit, offset,
+  Prefer: return=minimal|representation and single-object responses, and
+  upserts (POST with Prefer: resolution=merge-duplicates|ignore-duplicates,
+  matched on the on_conflict columns)
+- /auth/v1/admin/users (create, list), /auth/v1/token?grant_type=password,
+  /auth/v1/user
+- /auth/v1/.well-known/jwks.json: access tokens are signed by a LocalJWKS, so
+  supabase_jwt verifies them locally exactly as it would Supabase's
+
+Filters, ordering and the unique constraints run as SQL. Tables and columns
+are created as rows arrive (invite_tokens, user_roles and organizations
+start with their real columns). With a file database several processes can
+share one fake project, e.g. a seeding script and a uvicorn server.
+
+Requests reach it without sockets through transport() (sync httpx, used by
+supabase-py) or async_transport() (httpx.AsyncClient), or over HTTP by
+serving `fake.app` with uvicorn. `latency` (seconds, or a callable returning
+seconds) is added to every request to mimic the network.
+
+SUPABASE_FAKE=true switches supabase_client, supabase_async and
+supabase_jwt over to the process-wide get_fake(), configured by:
+- SUPABASE_FAKE_DB: SQLite path (default: in memory, per process)
+- SUPABASE_FAKE_LATENCY_MS: added latency per request (default 0)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import httpx
+
+from .jwks import LocalJWKS
+
+FAKE_URL = "http://supabase.fake"
+SUPABASE_FAKE_DB = os.getenv("SUPABASE_FAKE_DB", ":memory:")
+SUPABASE_FAKE_LATENCY_MS = float(os.getenv("SUPABASE_FAKE_LATENCY_MS", "0"))
+
+# Tables created up front with their real columns and unique constraints
+SCHEMA: Dict[str, Dict[str, str]] = {
+    "invite_tokens": {
+        "id": "text", "token_hash": "text", "email": "text", "role": "text", "organization_id": "text",
+        "created_by": "text", "expires_at": "text", "used_at": "text", "created_at": "text",
+    },
+    "user_roles": {"id": "text", "user_id": "text", "organization_id": "text", "role": "text", "created_at": "text"},
+    "organizations": {"id": "text", "name": "text", "created_at": "text"},
+}
+UNIQUE_COLUMNS: Dict[str, Tuple[Tuple[str, ...], ...]] = {
+    "invite_tokens": (("id",), ("token_hash",)),
+    "user_roles": (("id",), ("user_id", "organization_id")),
+    "organizations": (("id",),),
+}
+
+_SQL_TYPES = {"text": "TEXT", "integer": "INTEGER", "real": "REAL", "bool": "INTEGER", "json": "TEXT"}
+_COMPARISONS = {"eq": "=", "neq": "<>", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+Latency = Union[float, Callable[[], float]]
+# (status, headers, body)
+FakeResponse = Tuple[int, Dict[str, str], bytes]
+
+
+class FakeError(Exception):
+    def __init__(self, status_code: int, message: str, code: Optional[str] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.code = code
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _ident(name: str) -> str:
+    if not _IDENTIFIER.match(name) or name.startswith("_fake"):
+        raise FakeError(400, f"Invalid identifier: {name!r}", "PGRST100")
+    return f'"{name}"'
+
+
+def _split_top_level(expr: str) -> List[str]:
+    """Split on commas that aren't inside parentheses or double quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return [part for part in parts if part]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _glob(pattern: str) -> str:
+    """PostgREST LIKE pattern (* or % wildcards) -> case-sensitive SQLite GLOB pattern."""
+    out = []
+    for ch in pattern:
+        if ch in "*%":
+            out.append("*")
+        elif ch in "?[":
+            out.append(f"[{ch}]")
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def _kind_of(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "real"
+    if isinstance(value, (dict, list)):
+        return "json"
+    return "text"
+
+
+def _encode(kind: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if kind == "bool":
+        return int(bool(value))
+    if kind == "json":
+        return json.dumps(value)
+    return value
+
+
+def _decode(kind: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if kind == "bool":
+        return bool(value)
+    if kind == "json":
+        return json.loads(value)
+    return value
+
+
+def _literal(kind: Optional[str], raw: str) -> Any:
+    """A filter literal as the parameter to compare against a column of this kind."""
+    raw = _unquote(raw)
+    if kind == "bool":
+        return 1 if raw.lower() == "true" else 0
+    return raw
+
+
+class _Store:
+    """SQLite tables plus the column kinds needed to turn rows back into JSON."""
+
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.RLock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS _fake_columns (tbl TEXT, col TEXT, kind TEXT, PRIMARY KEY (tbl, col));
+            CREATE TABLE IF NOT EXISTS _fake_auth_users (
+                id TEXT PRIMARY KEY, email TEXT UNIQUE NOT NULL, password TEXT NOT NULL, data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS _fake_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self.columns: Dict[str, Dict[str, str]] = {}
+        self._load_columns()
+        for table, columns in SCHEMA.items():
+            self.ensure_table(table)
+            self.ensure_columns(table, columns)
+            for unique in UNIQUE_COLUMNS.get(table, ()):
+                self.conn.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {_ident('uq_' + table + '_' + '_'.join(unique))} "
+                    f"ON {_ident(table)} ({', '.join(_ident(c) for c in unique)})"
+                )
+
+    def _load_columns(self) -> None:
+        self.columns = {}
+        for table, column, kind in self.conn.execute("SELECT tbl, col, kind FROM _fake_columns"):
+            self.columns.setdefault(table, {})[column] = kind
+
+    def meta(self, key: str, default: Callable[[], str]) -> str:
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO _fake_meta (key, value) VALUES (?, ?)", (key, default()))
+            return self.conn.execute("SELECT value FROM _fake_meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def ensure_table(self, table: str) -> None:
+        if table in self.columns:
+            return
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {_ident(table)} (_fake_rowid INTEGER PRIMARY KEY)")
+        self.columns.setdefault(table, {})
+
+    def ensure_columns(self, table: str, kinds: Mapping[str, str]) -> None:
+        missing = {c: k for c, k in kinds.items() if c not in self.columns[table]}
+        if missing:
+            # Another process sharing the file may have added them already
+            self._load_columns()
+        known = self.columns.setdefault(table, {})
+        for column, kind in missing.items():
+            if column in known:
+                continue
+            try:
+                self.conn.execute(f"ALTER TABLE {_ident(table)} ADD COLUMN {_ident(column)} {_SQL_TYPES[kind]}")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):
+                    raise
+            self.conn.execute("INSERT OR IGNORE INTO _fake_columns (tbl, col, kind) VALUES (?, ?, ?)", (table, column, kind))
+            known[column] = kind
+
+    # ===== Filters =====
+
+    def _column(self, table: str, column: str) -> Tuple[str, Optional[str]]:
+        """SQL for a column and its kind; columns that never got a value read as NULL."""
+        _ident(column)
+        kind = self.columns.get(table, {}).get(column)
+        if kind is None:
+            self._load_columns()
+            kind = self.columns.get(table, {}).get(column)
+        return (_ident(column) if kind else "NULL"), kind
+
+    def condition(self, table: str, column: str, expr: str) -> Tuple[str, List[Any]]:
+        negate = expr.startswith("not.")
+        if negate:
+            expr = expr[4:]
+        op, _, raw = expr.partition(".")
+        col, kind = self._column(table, column)
+        if op == "is":
+            value = raw.lower()
+            if value == "null":
+                sql, params = f"{col} IS NULL", []
+            elif value in ("true", "false"):
+                sql, params = f"{col} = ?", [1 if value == "true" else 0]
+            else:
+                raise FakeError(400, f"Invalid is. value: {raw}", "PGRST100")
+        elif op == "in":
+            values = [_literal(kind, v) for v in _split_top_level(raw.strip("()"))]
+            sql, params = (f"{col} IN ({', '.join('?' * len(values))})" if values else "0"), values
+        elif op == "like":
+            sql, params = f"{col} GLOB ?", [_glob(_unquote(raw))]
+        elif op == "ilike":
+            sql, params = f"LOWER({col}) GLOB LOWER(?)", [_glob(_unquote(raw))]
+        elif op in _COMPARISONS:
+            sql, params = f"{col} {_COMPARISONS[op]} ?", [_literal(kind, raw)]
+        else:
+            raise FakeError(400, f"Unsupported operator: {op}", "PGRST100")
+        return (f"NOT ({sql})" if negate else sql), params
+
+    def logic(self, table: str, kind: str, expr: str) -> Tuple[str, List[Any]]:
+        """or=(a.eq.1,and(b.lt.2,c.is.null)) -> SQL."""
+        inner = expr.strip()
+        if inner.startswith("(") and inner.endswith(")"):
+            inner = inner[1:-1]
+        parts, params = [], []
+        for part in _split_top_level(inner):
+            match = re.match(r"^(not\.)?(and|or)\((.*)\)$", part, re.DOTALL)
+            if match:
+                sql, part_params = self.logic(table, match.group(2), match.group(3))
+                if match.group(1):
+                    sql = f"NOT {sql}"
+            else:
+                column, _, rest = part.partition(".")
+                sql, part_params = self.condition(table, column, rest)
+            parts.append(sql)
+            params.extend(part_params)
+        return "(" + f" {kind.upper()} ".join(parts or ["1"]) + ")", params
+
+    def where(self, table: str, params: Sequence[Tuple[str, str]]) -> Tuple[str, List[Any]]:
+        clauses, values = [], []
+        for key, value in params:
+            if key in _RESERVED_PARAMS:
+                continue
+            if key in ("or", "and"):
+                sql, part = self.logic(table, key, value)
+            else:
+                sql, part = self.condition(table, key, value)
+            clauses.append(sql)
+            values.extend(part)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), values
+
+    def order_by(self, table: str, order: Optional[str]) -> str:
+        terms = []
+        for term in (order or "").split(","):
+            if not term:
+                continue
+            column, *modifiers = term.split(".")
+            col, kind = self._column(table, column)
+            if not kind:
+                continue
+            descending = "desc" in modifiers
+            # PostgreSQL puts NULLs last ascending and first descending unless told otherwise
+            nulls_first = "nullsfirst" in modifiers or (descending and "nullslast" not in modifiers)
+            terms.append(f"{col} {'DESC' if descending else 'ASC'} NULLS {'FIRST' if nulls_first else 'LAST'}")
+        return " ORDER BY " + ", ".join(terms) if terms else ""
+
+    # ===== Rows =====
+
+    def _rows(self, table: str, cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+        kinds = self.columns.get(table, {})
+        names = [d[0] for d in cursor.description]
+        return [
+            {name: _decode(kinds.get(name, "text"), value) for name, value in zip(names, values)}
+            for values in cursor.fetchall()
+        ]
+
+    def select(self, table: str, params: Sequence[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        self.ensure_table(table)
+        where, values = self.where(table, params)
+        query = dict(params)
+        sql = f"SELECT * FROM {_ident(table)}{where}{self.order_by(table, query.get('order'))}"
+        if "limit" in query or "offset" in query:
+            sql += " LIMIT ? OFFSET ?"
+            values += [int(query.get("limit", -1)), int(query.get("offset", 0))]
+        return self._rows(table, self.conn.execute(sql, values))
+
+    def _by_rowids(self, table: str, rowids: List[int]) -> List[Dict[str, Any]]:
+        if not rowids:
+            return []
+        cursor = self.conn.execute(
+            f"SELECT * FROM {_ident(table)} WHERE _fake_rowid IN ({', '.join('?' * len(rowids))}) "
+            "ORDER BY _fake_rowid",
+            rowids,
+        )
+        return self._rows(table, cursor)
+
+    def _value_kinds(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+        kinds: Dict[str, str] = {}
+        for row in rows:
+            for column, value in row.items():
+                if value is not None and column not in kinds:
+                    _ident(column)
+                    kinds[column] = _kind_of(value)
+        return kinds
+
+    def _write(self, fn: Callable[[], Any]) -> Any:
+        """Run fn in one write transaction; unique violations become 409s."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn()
+        except sqlite3.IntegrityError as e:
+            self.conn.execute("ROLLBACK")
+            raise FakeError(409, f"duplicate key value violates unique constraint ({e})", "23505")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        return result
+
+    def insert(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.ensure_table(table)
+        rows = [{"id": str(uuid.uuid4()), "created_at": _now_iso(), **row} for row in rows]
+        self.ensure_columns(table, self._value_kinds(rows))
+
+        def insert_all() -> List[int]:
+            return [self._insert_row(table, row) for row in rows]
+
+        return self._by_rowids(table, self._write(insert_all))
+
+    def _insert_row(self, table: str, row: Dict[str, Any]) -> int:
+        kinds = self.columns[table]
+        # Columns that only ever held NULL don't exist yet, and read back as NULL anyway
+        columns = [c for c in row if c in kinds]
+        cursor = self.conn.execute(
+            f"INSERT INTO {_ident(table)} ({', '.join(_ident(c) for c in columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            [_encode(kinds[c], row[c]) for c in columns],
+        )
+        return cursor.lastrowid
+
+    def upsert(
+        self, table: str, rows: List[Dict[str, Any]], on_conflict: str, ignore_duplicates: bool = False
+    ) -> List[Dict[str, Any]]:
+        """POST with Prefer: resolution=...: rows matching on the on_conflict columns are merged (or left alone)."""
+        self.ensure_table(table)
+        keys = [c.strip() for c in on_conflict.split(",") if c.strip()] or ["id"]
+        for key in keys:
+            _ident(key)
+        self.ensure_columns(table, {"id": "text", "created_at": "text", **self._value_kinds(rows)})
+        kinds = self.columns[table]
+
+        def upsert_all() -> List[int]:
+            rowids = []
+            for row in rows:
+                found = None
+                if all(k in kinds and row.get(k) is not None for k in keys):
+                    found = self.conn.execute(
+                        f"SELECT _fake_rowid FROM {_ident(table)} WHERE {' AND '.join(f'{_ident(k)} = ?' for k in keys)}",
+                        [_encode(kinds[k], row[k]) for k in keys],
+                    ).fetchone()
+                if found is None:
+                    rowids.append(self._insert_row(table, {"id": str(uuid.uuid4()), "created_at": _now_iso(), **row}))
+                    continue
+                if not ignore_duplicates:
+                    values = {c: v for c, v in row.items() if c in kinds}
+                    self.conn.execute(
+                        f"UPDATE {_ident(table)} SET {', '.join(f'{_ident(c)} = ?' for c in values)} "
+                        "WHERE _fake_rowid = ?",
+                        [_encode(kinds[c], v) for c, v in values.items()] + [found[0]],
+                    )
+                    rowids.append(found[0])
+            return rowids
+
+        return self._by_rowids(table, self._write(upsert_all))
+
+    def update(self, table: str, values: Dict[str, Any], params: Sequence[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        self.ensure_table(table)
+        self.ensure_columns(table, self._value_kinds([values]))
+        kinds = self.columns[table]
+        values = {c: v for c, v in values.items() if c in kinds}
+        where, where_values = self.where(table, params)
+
+        def update_matching() -> List[int]:
+            rowids = [r[0] for r in self.conn.execute(f"SELECT _fake_rowid FROM {_ident(table)}{where}", where_values)]
+            if rowids and values:
+                self.conn.execute(
+                    f"UPDATE {_ident(table)} SET {', '.join(f'{_ident(c)} = ?' for c in values)} "
+                    f"WHERE _fake_rowid IN ({', '.join('?' * len(rowids))})",
+                    [_encode(kinds[c], v) for c, v in values.items()] + rowids,
+                )
+            return rowids
+
+        return self._by_rowids(table, self._write(update_matching))
+
+    def delete(self, table: str, params: Sequence[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        self.ensure_table(table)
+        where, values = self.where(table, params)
+
+        def delete_matching() -> List[Dict[str, Any]]:
+            rows = self._rows(table, self.conn.execute(f"SELECT * FROM {_ident(table)}{where}", values))
+            self.conn.execute(f"DELETE FROM {_ident(table)}{where}", values)
+            return rows
+
+        return self._write(delete_matching)
+
+
+def _project(row: Dict[str, Any], columns: Optional[str]) -> Dict[str, Any]:
+    row = {k: v for k, v in row.items() if k != "_fake_rowid"}
+    if not columns or columns.strip() == "*":
+        return row
+    names = [c.strip() for c in columns.split(",") if c.strip()]
+    return {name: row.get(name) for name in names}
+
+
+def _json(status_code: int, data: Any) -> FakeResponse:
+    return status_code, {"content-type": "application/json"}, json.dumps(data).encode("utf-8")
+
+
+class _Transport(httpx.BaseTransport):
+    def __init__(self, fake: "FakeSupabase") -> None:
+        self.fake = fake
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        delay = self.fake.delay()
+        if delay:
+            time.sleep(delay)
+        status_code, headers, content = self.fake.handle(
+            request.method, request.url.path, request.url.params.multi_items(), request.headers, body
+        )
+        return httpx.Response(status_code, headers=headers, content=content, request=request)
+
+
+class _AsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, fake: "FakeSupabase") -> None:
+        self.fake = fake
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        delay = self.fake.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        # SQLite calls are short; running them on the loop keeps the fake simple
+        status_code, headers, content = self.fake.handle(
+            request.method, request.url.path, request.url.params.multi_items(), request.headers, body
+        )
+        return httpx.Response(status_code, headers=headers, content=content, request=request)
+
+
+class FakeSupabase:
+    def __init__(
+        self,
+        db_path: str = ":memory:",
+        latency: Latency = 0.0,
+        # supabase-py rejects keys that aren't shaped like a JWT
+        service_role_key: str = "fake.service-role.key",
+        jwks: Optional[LocalJWKS] = None,
+    ) -> None:
+        self.store = _Store(db_path)
+        self.latency = latency
+        self.service_role_key = service_role_key
+        # The signing secret lives in the database, so tokens work in every process sharing it
+        secret = self.store.meta("jwt_secret", lambda: secrets.token_hex(32))
+        self.jwks = jwks or LocalJWKS("HS256", secret=secret.encode("ascii"))
+        self._token_verifier = None
+
+    def delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def transport(self) -> httpx.BaseTransport:
+        return _Transport(self)
+
+    def async_transport(self) -> httpx.AsyncBaseTransport:
+        return _AsyncTransport(self)
+
+    # ===== Seeding helpers =====
+
+    def add_user(self, email: str, password: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Create an auth user. Raises FakeError(422) if the e-mail is taken."""
+        now = _now_iso()
+        user = {
+            "id": user_id or str(uuid.uuid4()),
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email.lower(),
+            "email_confirmed_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "app_metadata": {"provider": "email", "providers": ["email"]},
+            "user_metadata": {},
+            "identities": [],
+        }
+        try:
+            with self.store.lock:
+                self.store.conn.execute(
+                    "INSERT INTO _fake_auth_users (id, email, password, data) VALUES (?, ?, ?, ?)",
+                    (user["id"], user["email"], password, json.dumps(user)),
+                )
+        except sqlite3.IntegrityError:
+            raise FakeError(422, "A user with this email address has already been registered")
+        return user
+
+    def _user(self, column: str, value: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """(user, password) by "id" or "email"."""
+        with self.store.lock:
+            row = self.store.conn.execute(
+                f"SELECT data, password FROM _fake_auth_users WHERE {column} = ?", (value,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def insert_rows(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert straight into a table (same defaults and constraints as POST)."""
+        with self.store.lock:
+            return [_project(row, None) for row in self.store.insert(table, rows)]
+
+    def rows(self, table: str, params: Sequence[Tuple[str, str]] = ()) -> List[Dict[str, Any]]:
+        """Rows of a table, optionally filtered with PostgREST-style (column, "op.value") params."""
+        with self.store.lock:
+            return [_project(row, None) for row in self.store.select(table, params)]
+
+    def access_token(self, user_id: str, ttl: int = 3600) -> str:
+        found = self._user("id", user_id)
+        return self.jwks.issue(user_id, ttl=ttl, email=found[0]["email"] if found else None)
+
+    # ===== Request handling =====
+
+    def handle(
+        self, method: str, path: str, params: Sequence[Tuple[str, str]], headers: Mapping[str, str], body: bytes
+    ) -> FakeResponse:
+        params = list(params)
+        try:
+            if path.startswith("/rest/v1/"):
+                return self._rest(method, path[len("/rest/v1/"):], params, headers, body)
+            if path == "/auth/v1/admin/users" and method == "POST":
+                return self._admin_create_user(json.loads(body or b"{}"))
+            if path == "/auth/v1/admin/users" and method == "GET":
+                return self._admin_list_users()
+            if path == "/auth/v1/token" and method == "POST":
+                return self._token(dict(params), json.loads(body or b"{}"))
+            if path == "/auth/v1/user" and method == "GET":
+                return self._get_user(headers.get("authorization", ""))
+            if path == "/auth/v1/.well-known/jwks.json" and method == "GET":
+                return _json(200, self.jwks.jwks())
+        except FakeError as e:
+            key = "message" if path.startswith("/rest/") else "msg"
+            return _json(e.status_code, {key: e.message, "code": e.code, "details": None, "hint": None})
+        return _json(404, {"message": f"No route for {method} {path}"})
+
+    async def app(self, scope, receive, send) -> None:
+        """ASGI entry point, for serving the fake with uvicorn."""
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        params = httpx.QueryParams(scope.get("query_string", b"").decode("latin-1")).multi_items()
+        headers = httpx.Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]])
+        status_code, response_headers, content = self.handle(scope["method"], scope["path"], params, headers, body)
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in response_headers.items()],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+    def _rest(
+        self, method: str, table: str, params: List[Tuple[str, str]], headers: Mapping[str, str], body: bytes
+    ) -> FakeResponse:
+        _ident(table)
+        filters = [p for p in params if p[0] not in ("limit", "offset", "order")]
+        with self.store.lock:
+            if method == "GET":
+                rows, status_code = self.store.select(table, params), 200
+            elif method == "POST":
+                data = json.loads(body or b"[]")
+                data = data if isinstance(data, list) else [data]
+                prefer = headers.get("prefer", "")
+                if "resolution=" in prefer:
+                    rows = self.store.upsert(
+                        table, data, dict(params).get("on_conflict", ""),
+                        ignore_duplicates="resolution=ignore-duplicates" in prefer,
+                    )
+                else:
+                    rows = self.store.insert(table, data)
+                status_code = 201
+            elif method == "PATCH":
+                rows, status_code = self.store.update(table, json.loads(body or b"{}"), filters), 200
+            elif method == "DELETE":
+                rows, status_code = self.store.delete(table, filters), 200
+            else:
+                raise FakeError(405, f"Method {method} not allowed")
+        columns = dict(params).get("select")
+        rows = [_project(row, columns) for row in rows]
+
+        if method != "GET" and "return=minimal" in headers.get("prefer", ""):
+            return (201 if method == "POST" else 204), {}, b""
+        if "vnd.pgrst.object" in headers.get("accept", ""):
+            if len(rows) != 1:
+                raise FakeError(406, "JSON object requested, multiple (or no) rows returned", "PGRST116")
+            return _json(status_code, rows[0])
+        return _json(status_code, rows)
+
+    def _admin_create_user(self, data: Dict[str, Any]) -> FakeResponse:
+        email = str(data.get("email", "")).lower()
+        if not email or not data.get("password"):
+            raise FakeError(422, "email and password are required")
+        return _json(200, self.add_user(email, data["password"]))
+
+    def _admin_list_users(self) -> FakeResponse:
+        with self.store.lock:
+            users = [json.loads(r[0]) for r in self.store.conn.execute("SELECT data FROM _fake_auth_users ORDER BY email")]
+        return _json(200, {"users": users, "aud": "authenticated"})
+
+    def _token(self, query: Dict[str, str], data: Dict[str, Any]) -> FakeResponse:
+        if query.get("grant_type") != "password":
+            return _json(400, {"error": "unsupported_grant_type"})
+        found = self._user("email", str(data.get("email", "")).lower())
+        if found is None or found[1] != data.get("password"):
+            return _json(400, {"error": "invalid_grant", "error_description": "Invalid login credentials"})
+        user = found[0]
+        expires_in = 3600
+        return _json(200, {
+            "access_token": self.access_token(user["id"], ttl=expires_in),
+            "token_type": "bearer",
+            "expires_in": expires_in,
+            "expires_at": int(time.time()) + expires_in,
+            "refresh_token": uuid.uuid4().hex,
+            "user": user,
+        })
+
+    def _get_user(self, authorization: str) -> FakeResponse:
+        token = authorization[7:] if authorization.lower().startswith("bearer ") else ""
+        claims = self.token_verifier().verify(token) if token else None
+        if not claims:
+            raise FakeError(401, "invalid JWT")
+        found = self._user("id", claims["sub"])
+        if found is None:
+            raise FakeError(404, "User not found")
+        return _json(200, found[0])
+
+    def token_verifier(self):
+        """A SupabaseTokenVerifier that trusts this fake's signing keys."""
+        if self._token_verifier is None:
+            # Imported here: app.supabase_jwt reads the environment at import time
+            from ..supabase_jwt import JWKSCache, SupabaseTokenVerifier
+
+            self._token_verifier = SupabaseTokenVerifier(jwks=JWKSCache("local", fetch=self.jwks.fetch))
+        return self._token_verifier
+
+
+_fake: Optional[FakeSupabase] = None
+_fake_lock = threading.Lock()
+
+
+def get_fake() -> FakeSupabase:
+    """Process-wide fake from SUPABASE_FAKE_DB / SUPABASE_FAKE_LATENCY_MS, seeded with the default organization."""
+    global _fake
+    if _fake is None:
+        with _fake_lock:
+            if _fake is None:
+                fake = FakeSupabase(SUPABASE_FAKE_DB, latency=SUPABASE_FAKE_LATENCY_MS / 1000)
+                organization_id = os.environ.get("ORGANIZATION_ID", "00000000-0000-0000-0000-000000000001")
+                try:
+                    fake.insert_rows("organizations", [{"id": organization_id, "name": "Local"}])
+                except FakeError:
+                    pass  # already there (shared database)
+                _fake = fake
+    return _fake
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Load test for the auth and invite endpoints.
+
+Drives /api/entrar, /api/me, /api/cadastro, /api/auth/login,
+/api/register/with-token and /api/invite/* with a fixed number of requests at
+each concurrency level and reports p50/p95/p99 latency and throughput per
+endpoint. Two modes:
+- inprocess: requests go straight into the ASGI app (httpx.ASGITransport), so
+  the numbers show the app's own cost without sockets
+- uvicorn: the app runs in a uvicorn subprocess and is driven over HTTP
+
+Everything runs against throw-away state: a temporary SQLite database and the
+in-process Supabase fake (SUPABASE_FAKE, app/testing/supabase_fake.py) on a
+temporary file, shared with the uvicorn workers. --supabase-latency-ms adds a
+simulated round-trip to every Supabase call. Login/register rate limits are
+lifted so they don't cut the runs short.
+
+--save writes the results as JSON; --compare reads such a file and exits 1
+when any endpoint's p95 grew, or its throughput dropped, by more than
+--tolerance (a fraction).
+
+Usage:
+    python bench/auth_load.py --requests 500 --concurrency 1,16
+    python bench/auth_load.py --mode uvicorn --save bench/baseline.json
+    python bench/auth_load.py --compare bench/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+
+SCENARIOS = (
+    "POST /api/entrar",
+    "GET /api/me",
+    "POST /api/cadastro",
+    "POST /api/auth/login",
+    "POST /api/register/with-token",
+    "POST /api/invite/create",
+    "POST /api/invite/validate",
+    "GET /api/invite/list",
+)
+
+# (method, path, httpx request kwargs)
+Request = Tuple[str, str, Dict[str, Any]]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_env(tmp: str, hash_rounds: Optional[int], supabase_latency_ms: float) -> None:
+    """Environment shared by this process and the uvicorn subprocess; set before importing app."""
+    os.environ.update({
+        "APP_DB_PATH": os.path.join(tmp, "bench.db"),
+        "SUPABASE_FAKE": "1",
+        "SUPABASE_FAKE_DB": os.path.join(tmp, "supabase.db"),
+        "SUPABASE_FAKE_LATENCY_MS": str(supabase_latency_ms),
+        "INVITE_TOKEN_SECRET": "bench-invite-secret",
+        "JWT_SECRET": "bench-jwt-secret",
+        "COOKIE_SECURE": "false",
+        "LOGIN_RATE_LIMIT_PER_MIN": "100000000",
+        "REGISTER_RATE_LIMIT_PER_MIN": "100000000",
+        "TOKEN_SWEEP_INTERVAL_SECS": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    os.environ.pop("SUPABASE_JWT_SECRET", None)
+    os.environ.pop("SUPABASE_JWKS_URL", None)
+    if hash_rounds is not None:
+        os.environ["PASSWORD_HASH_ROUNDS"] = str(hash_rounds)
+
+
+class Fixtures:
+    """Seeds users and tokens and hands out per-request payloads.
+
+    Endpoints that consume something (an invite, an e-mail address) get a
+    fresh one per request, so every request takes the success path.
+    """
+
+    PASSWORD = "bench-pass-123"
+
+    def __init__(self, fake) -> None:
+        from app import db
+        from app.security import issue_jwt
+        from app.services.password_hashing import hash_password_sync
+
+        self.fake = fake
+        self.organization_id = os.environ.get("ORGANIZATION_ID", "00000000-0000-0000-0000-000000000001")
+        self._seq = 0
+
+        db.init_db()
+        senha_hash = hash_password_sync(self.PASSWORD)
+        self.master_id = db.ensure_master("master@example.com", senha_hash) or db.get_usuario_by_email("master@example.com")["id"]
+        self.member_email = "membro@example.com"
+        member_id = db.create_usuario(nome="Membro", email=self.member_email, senha_hash=senha_hash, papel="colaborador")
+        self.me_cookie = issue_jwt(user_id=member_id, role="colaborador")
+
+        self.supabase_email = "owner@example.com"
+        owner = fake.add_user(self.supabase_email, self.PASSWORD)
+        fake.insert_rows("user_roles", [{"user_id": owner["id"], "organization_id": self.organization_id, "role": "owner"}])
+        self.owner_id = owner["id"]
+        self.owner_token = fake.access_token(owner["id"], ttl=24 * 3600)
+        self.validate_invite = self._invites(1)[0]
+
+    def _unique(self, prefix: str) -> str:
+        self._seq += 1
+        return f"{prefix}-{self._seq}-{os.getpid()}@example.com"
+
+    def _invites(self, count: int) -> List[Dict[str, str]]:
+        """Insert `count` invite tokens straight into the fake. Returns {"token", "email"} records."""
+        from app.invite_api import iter_invite_chunks
+
+        entries = [(self._unique("convite"), "member") for _ in range(count)]
+        expires_at = datetime.utcnow() + timedelta(days=1)
+        records = []
+        for rows, chunk in iter_invite_chunks(entries, self.organization_id, expires_at, self.owner_id):
+            self.fake.insert_rows("invite_tokens", rows)
+            records.extend(chunk)
+        return [{"token": r["token"], "email": r["email"]} for r in records]
+
+    def requests(self, scenario: str, count: int) -> List[Request]:
+        from app import db
+
+        bearer = {"Authorization": f"Bearer {self.owner_token}"}
+        if scenario == "POST /api/entrar":
+            body = {"email": self.member_email, "senha": self.PASSWORD}
+            return [("POST", "/api/entrar", {"json": body})] * count
+        if scenario == "GET /api/me":
+            return [("GET", "/api/me", {"headers": {"Cookie": f"auth_token={self.me_cookie}"}})] * count
+        if scenario == "POST /api/cadastro":
+            return [
+                ("POST", "/api/cadastro", {"json": {
+                    "nome": "Bench", "email": self._unique("cadastro"), "senha": self.PASSWORD,
+                    "token": db.insert_token(self.master_id)[1],
+                }})
+                for _ in range(count)
+            ]
+        if scenario == "POST /api/auth/login":
+            body = {"email": self.supabase_email, "password": self.PASSWORD}
+            return [("POST", "/api/auth/login", {"json": body})] * count
+        if scenario == "POST /api/register/with-token":
+            return [
+                ("POST", "/api/register/with-token", {"json": {
+                    "name": "Bench", "email": invite["email"], "password": self.PASSWORD, "token": invite["token"],
+                }})
+                for invite in self._invites(count)
+            ]
+        if scenario == "POST /api/invite/create":
+            return [
+                ("POST", "/api/invite/create", {"headers": bearer, "json": {"email": self._unique("novo"), "role": "member"}})
+                for _ in range(count)
+            ]
+        if scenario == "POST /api/invite/validate":
+            return [("POST", "/api/invite/validate", {"json": self.validate_invite})] * count
+        if scenario == "GET /api/invite/list":
+            return [("GET", "/api/invite/list", {"headers": bearer, "params": {"limit": 50}})] * count
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_load(client: httpx.AsyncClient, requests: List[Request], concurrency: int) -> Dict[str, Any]:
+    """Send `requests` with `concurrency` workers; return latency percentiles (ms) and throughput."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    pending = iter(requests)
+
+    async def worker() -> None:
+        for method, path, kwargs in pending:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": dict(statuses),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+    }
+
+
+async def _run_mode(
+    client: httpx.AsyncClient,
+    fixtures: Fixtures,
+    mode: str,
+    scenarios: List[str],
+    concurrency_levels: List[int],
+    count: int,
+    warmup: int,
+) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for scenario in scenarios:
+        if warmup:
+            await run_load(client, fixtures.requests(scenario, warmup), min(warmup, 4))
+        for concurrency in concurrency_levels:
+            key = f"{mode} c={concurrency} {scenario}"
+            results[key] = await run_load(client, fixtures.requests(scenario, count), concurrency)
+            _print_row(key, results[key])
+    return results
+
+
+async def bench_inprocess(fixtures: Fixtures, **options) -> Dict[str, Dict[str, Any]]:
+    from app.main import app
+    from app.supabase_async import close_async_dal
+    from app.supabase_client import close_supabase_clients
+
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        try:
+            return await _run_mode(client, fixtures, "inprocess", **options)
+        finally:
+            await close_async_dal()
+            close_supabase_clients()
+
+
+async def bench_uvicorn(fixtures: Fixtures, workers: int, **options) -> Dict[str, Dict[str, Any]]:
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+        "--log-level", "warning", "--no-access-log",
+    ]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=os.environ.copy())
+    base_url = f"http://127.0.0.1:{port}"
+    max_connections = max(options["concurrency_levels"])
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("uvicorn did not start")
+                    await asyncio.sleep(0.1)
+            return await _run_mode(client, fixtures, f"uvicorn/{workers}w", **options)
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def _print_row(key: str, result: Dict[str, Any]) -> None:
+    print(
+        f"{key:<52}{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.2f}"
+        f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}",
+        flush=True,
+    )
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Entries that regressed past `tolerance`: p95 up or throughput down by more than that fraction."""
+    regressions = []
+    for key, now in current["results"].items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {before['p95_ms']:.2f}ms -> {now['p95_ms']:.2f}ms")
+        if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {before['throughput_rps']:.1f} -> {now['throughput_rps']:.1f} req/s"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark for the auth and invite endpoints")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn", "both"), default="inprocess")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and concurrency level (default: 200)")
+    parser.add_argument("--concurrency", default="1,16", help="Comma-separated concurrency levels (default: 1,16)")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per endpoint first (default: 10)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes in uvicorn mode (default: 1)")
+    parser.add_argument("--hash-rounds", type=int, help="bcrypt cost for this run (default: PASSWORD_HASH_ROUNDS or 12)")
+    parser.add_argument("--supabase-latency-ms", type=float, default=0.0, help="Simulated Supabase round-trip (default: 0)")
+    parser.add_argument("--save", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON from --save; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression as a fraction (default: 0.2)")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    options = dict(
+        scenarios=scenarios,
+        concurrency_levels=[int(c) for c in args.concurrency.split(",")],
+        count=args.requests,
+        warmup=args.warmup,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Importing anything under app reads the environment, so configure it first
+        _configure_env(tmp, args.hash_rounds, args.supabase_latency_ms)
+        from app.testing.supabase_fake import get_fake
+
+        fixtures = Fixtures(get_fake())
+        print(f"{'run':<52}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        results: Dict[str, Dict[str, Any]] = {}
+
+        async def run_all() -> None:
+            if args.mode in ("inprocess", "both"):
+                results.update(await bench_inprocess(fixtures, **options))
+            if args.mode in ("uvicorn", "both"):
+                results.update(await bench_uvicorn(fixtures, args.workers, **options))
+
+        asyncio.run(run_all())
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "password_hash_rounds": int(os.environ.get("PASSWORD_HASH_ROUNDS", "12")),
+            "supabase_latency_ms": args.supabase_latency_ms,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the SQLite connection pool in app/db.py.
+
+Runs the hot read helpers (and /api/me through the ASGI app) twice against a
+throw-away database: once with a fresh connection per call (APP_DB_POOL=false,
+the legacy behaviour) and once with pooled WAL connections.
+
+Usage:
+    python bench/db_pool.py --requests 5000 --threads 8
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import db  # noqa: E402
+
+
+def _run(fn, requests: int, threads: int) -> float:
+    """Call fn() `requests` times over `threads` workers; return calls per second."""
+    start = time.perf_counter()
+    if threads <= 1:
+        for _ in range(requests):
+            fn()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as ex:
+            list(ex.map(lambda _: fn(), range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def _bench_mode(pooled: bool, requests: int, threads: int, email: str, user_id: str, cookie: str) -> dict:
+    db.close_pool()
+    db.DB_POOL_ENABLED = pooled
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    # Request logging would dominate the numbers
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {
+        "get_usuario_by_email": _run(lambda: db.get_usuario_by_email(email), requests, threads),
+        "get_usuario_by_id": _run(lambda: db.get_usuario_by_id(user_id), requests, threads),
+        "list_tokens": _run(lambda: db.list_tokens(limit=20), requests, threads),
+    }
+    # Entering the client keeps one event-loop portal open (and runs the lifespan,
+    # which closes the pool on exit)
+    with TestClient(app) as client:
+        client.cookies.set("auth_token", cookie)
+        results["GET /api/me"] = _run(lambda: client.get("/api/me"), requests, threads)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs. per-call SQLite connections")
+    parser.add_argument("--requests", type=int, default=5000, help="Calls per helper (default: 5000)")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent worker threads (default: 8)")
+    parser.add_argument("--tokens", type=int, default=500, help="Invite tokens to seed (default: 500)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        email = "bench@example.com"
+        user_id = db.create_usuario(nome="Bench", email=email, senha_hash="x", papel="master")
+        for _ in range(args.tokens):
+            db.insert_token(user_id)
+
+        from app.security import issue_jwt
+
+        cookie = issue_jwt(user_id=user_id, role="master")
+
+        before = _bench_mode(False, args.requests, args.threads, email, user_id, cookie)
+        after = _bench_mode(True, args.requests, args.threads, email, user_id, cookie)
+
+    print(f"{'operation':<24}{'per-call req/s':>16}{'pooled req/s':>16}{'speedup':>10}")
+    for name in before:
+        print(f"{name:<24}{before[name]:>16.0f}{after[name]:>16.0f}{after[name] / before[name]:>9.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
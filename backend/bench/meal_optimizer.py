@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Benchmark the meal plan optimizer (app/meal_optimizer.py).
+
+Builds random but reachable plans (--meals meals x --foods candidate foods,
+targets whose calories agree with the macros) from a synthetic catalog and
+times:
+- single: optimize() per plan, p50/p95/p99 latency
+- batch: optimize_batch() over --patients plans, plans per second
+- endpoint: POST /api/plans/optimize/batch through the ASGI app, including
+  validation, catalog lookup and the calcTotals totals
+
+and reports how far the rounded plans land from their targets.
+
+--save writes the results as JSON; --compare reads such a file and exits 1
+when any p95 grew, or throughput dropped, by more than --tolerance.
+
+Usage:
+    python bench/meal_optimizer.py --patients 500
+    python bench/meal_optimizer.py --meals 8 --foods 10 --save bench/optimizer.json
+    python bench/meal_optimizer.py --compare bench/optimizer.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("INVITE_TOKEN_SECRET", "bench-secret")
+
+from app.meal_optimizer import MealProblem, meal_shares, optimize, optimize_batch, preset_for_count  # noqa: E402
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def make_catalog(rng: np.random.Generator, size: int) -> List[Dict[str, Any]]:
+    protein, carbs, fat = rng.uniform(0, 30, size), rng.uniform(0, 70, size), rng.uniform(0, 20, size)
+    return [
+        {"id": i, "food_name": f"Alimento {i}", "source": "TACO", "energy_kcal": 4 * p + 4 * c + 9 * f,
+         "protein_g": p, "carbs_g": c, "fat_g": f, "fiber_g": 0}
+        for i, (p, c, f) in enumerate(zip(protein.tolist(), carbs.tolist(), fat.tolist()))
+    ]
+
+
+def make_patients(rng: np.random.Generator, catalog_size: int, count: int, meals: int, foods: int) -> List[Dict[str, Any]]:
+    """Request bodies for /api/plans/optimize."""
+    patients = []
+    for i in range(count):
+        protein, carbs, fat = rng.uniform(90, 200), rng.uniform(150, 350), rng.uniform(40, 90)
+        patients.append({
+            "id": f"p{i}",
+            "targets": {"calories": 4 * protein + 4 * carbs + 9 * fat, "protein": protein, "carbs": carbs, "fat": fat},
+            "meal_count": meals,
+            "meals": [
+                {"id": meal_id, "foods": [
+                    {"food_id": int(food_id), "quantity": float(rng.choice([50, 100, 150])),
+                     "step": float(rng.choice([5, 5, 10, 50]))}
+                    for food_id in rng.choice(catalog_size, foods, replace=False)
+                ]}
+                for meal_id, _ in preset_for_count(meals)
+            ],
+        })
+    return patients
+
+
+def to_problem(patient: Dict[str, Any], per100g: np.ndarray) -> MealProblem:
+    foods = [(meal_index, food) for meal_index, meal in enumerate(patient["meals"]) for food in meal["foods"]]
+    targets = patient["targets"]
+    return MealProblem(
+        per100g[[food["food_id"] for _, food in foods]],
+        [meal_index for meal_index, _ in foods],
+        [targets["calories"], targets["protein"], targets["carbs"], targets["fat"]],
+        preferred=[food["quantity"] for _, food in foods],
+        step=[food["step"] for _, food in foods],
+        shares=meal_shares([meal["id"] for meal in patient["meals"]]),
+    )
+
+
+def bench_engine(problems: List[MealProblem]) -> Dict[str, Dict[str, Any]]:
+    optimize(problems[0])  # warm-up
+    latencies = []
+    for problem in problems:
+        start = time.perf_counter()
+        optimize(problem)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    start = time.perf_counter()
+    solutions = optimize_batch(problems)
+    elapsed = time.perf_counter() - start
+    worst = sorted(float(np.abs(solution.deviation).max()) for solution in solutions)
+    return {
+        "single": {
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "throughput_rps": len(problems) / (sum(latencies) / 1000),
+        },
+        "batch": {
+            "p50_ms": elapsed * 1000,
+            "p95_ms": elapsed * 1000,
+            "p99_ms": elapsed * 1000,
+            "throughput_rps": len(problems) / elapsed,
+            "ok_ratio": sum(solution.ok for solution in solutions) / len(solutions),
+            "deviation_p50": percentile(worst, 50),
+            "deviation_p95": percentile(worst, 95),
+        },
+    }
+
+
+def bench_endpoint(patients: List[Dict[str, Any]], batch_size: int) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.security import issue_jwt
+
+    # Request logging would dominate the numbers
+    logging.getLogger().setLevel(logging.WARNING)
+    client = TestClient(app)
+    client.cookies.set("auth_token", issue_jwt(user_id="bench", role="colaborador"))
+    batches = [patients[i:i + batch_size] for i in range(0, len(patients), batch_size)]
+    client.post("/api/plans/optimize/batch", json={"patients": batches[0]})  # warm-up
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        response = client.post("/api/plans/optimize/batch", json={"patients": batch})
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    total = sum(latencies) / 1000
+    latencies.sort()
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": len(patients) / total,  # plans per second
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Entries that regressed past `tolerance`: p95 up or throughput down by more than that fraction."""
+    regressions = []
+    for key, now in current["results"].items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {before['p95_ms']:.2f}ms -> {now['p95_ms']:.2f}ms")
+        if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {before['throughput_rps']:.1f} -> {now['throughput_rps']:.1f} plans/s"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark for the meal plan optimizer")
+    parser.add_argument("--patients", type=int, default=200, help="Plans to optimize (default: 200)")
+    parser.add_argument("--meals", type=int, default=8, help="Meals per plan, 3-8 (default: 8)")
+    parser.add_argument("--foods", type=int, default=10, help="Candidate foods per meal (default: 10)")
+    parser.add_argument("--catalog", type=int, default=3000, help="Synthetic catalog size (default: 3000)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Plans per request to the endpoint (default: 50)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON from --save; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression as a fraction (default: 0.2)")
+    args = parser.parse_args()
+    if not 3 <= args.meals <= 8:
+        parser.error("--meals must be between 3 and 8")
+    if args.foods > args.catalog:
+        parser.error("--foods can't exceed --catalog")
+
+    from app import food_search
+
+    rng = np.random.default_rng(args.seed)
+    catalog = make_catalog(rng, args.catalog)
+    food_search.set_index(food_search.FoodIndex(catalog))
+    per100g = np.array([[f["energy_kcal"], f["protein_g"], f["carbs_g"], f["fat_g"]] for f in catalog])
+    patients = make_patients(rng, args.catalog, args.patients, args.meals, args.foods)
+
+    results = bench_engine([to_problem(patient, per100g) for patient in patients])
+    results["endpoint"] = bench_endpoint(patients, args.batch_size)
+
+    print(f"{args.patients} plans of {args.meals} meals x {args.foods} foods")
+    print(f"{'run':<12}{'plans/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<12}{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.2f}"
+            f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+        )
+    batch = results["batch"]
+    print(
+        f"within tolerance: {batch['ok_ratio']:.1%}; worst macro off by "
+        f"{batch['deviation_p50']:.2%} (p50), {batch['deviation_p95']:.2%} (p95)"
+    )
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "patients": args.patients,
+            "meals": args.meals,
+            "foods": args.foods,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
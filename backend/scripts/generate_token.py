@@ -4,9 +4,14 @@ Generate invite tokens for user registration.
 
 Usage:
     python scripts/generate_token.py --expires-hours 24 --role owner --email-hint "user@example.com"
+
+Bulk (writes a CSV of id,token,email,role,expires_at,created_at to stdout or --output):
+    python scripts/generate_token.py --count 200 --role member --email-hint "clinic@example.com"
+    python scripts/generate_token.py --from-csv invites.csv --output tokens.csv   # columns: email[,role]
 """
 
 import argparse
+import csv
 import os
 import sys
 import secrets
@@ -18,7 +23,9 @@ from typing import Optional
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.services.invite_tokens import generate_token, hash_token
-from app.supabase_client import supabase_client
+from app.supabase_client import get_supabase_client
+from app.organizations import get_organization_id_for_user
+from app.invite_api import BULK_FIELDS, invite_manager
 
 # Ensure we load env from backend/.env first, then fall back to project .env
 try:
@@ -28,13 +35,13 @@ try:
     project_env = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env')
     if os.path.exists(backend_env):
         load_dotenv(backend_env, override=False)
-        print(f"Using env file: {backend_env}")
+        print(f"Using env file: {backend_env}", file=sys.stderr)
     elif os.path.exists(project_env):
         load_dotenv(project_env, override=False)
-        print(f"Using env file: {project_env}")
+        print(f"Using env file: {project_env}", file=sys.stderr)
     else:
         # Load from process env only
-        print("No .env file found; using process environment")
+        print("No .env file found; using process environment", file=sys.stderr)
 except Exception:
     pass
 
@@ -45,6 +52,11 @@ def main():
     parser.add_argument('--role', type=str, choices=['owner', 'admin', 'member'], help='User role')
     parser.add_argument('--email-hint', type=str, help='Email hint for the token')
     parser.add_argument('--created-by', type=str, default='cli', help='Who created this token (default: cli)')
+    parser.add_argument('--organization-id', type=str, help='Organization for the token (skips the lookup)')
+    bulk = parser.add_mutually_exclusive_group()
+    bulk.add_argument('--count', type=int, help='Generate this many tokens for --email-hint/--role')
+    bulk.add_argument('--from-csv', type=str, help='CSV with an email column (and optional role column)')
+    parser.add_argument('--output', type=str, help='Bulk mode: write the CSV here instead of stdout')
     
     args = parser.parse_args()
     
@@ -52,6 +64,10 @@ def main():
         # Load environment variables
         from dotenv import load_dotenv
         load_dotenv()
+
+        if args.count is not None or args.from_csv:
+            generate_bulk(args)
+            return
         
         # Generate the token
         token = generate_token()
@@ -60,12 +76,15 @@ def main():
         # Calculate expiry
         expires_at = datetime.utcnow() + timedelta(hours=args.expires_hours)
         
-        # Get organization ID (assuming single organization for now)
-        org_result = supabase_client.client.table("organizations").select("id").limit(1).execute()
-        if not org_result.data:
+        supabase_client = get_supabase_client()
+
+        # Creator's organization, else the first one (single organization for now)
+        organization_id = args.organization_id or get_organization_id_for_user(
+            supabase_client, None if args.created_by == 'cli' else args.created_by
+        )
+        if not organization_id:
             print("Error: No organization found in database")
             sys.exit(1)
-        organization_id = org_result.data[0]["id"]
         
         # Insert into database
         token_data = {
@@ -98,5 +117,45 @@ def main():
         sys.exit(1)
 
 
+def _csv_entries(path: str, default_role: str):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            email = (row.get('email') or '').strip()
+            if email:
+                yield email, (row.get('role') or '').strip() or default_role
+
+
+def generate_bulk(args):
+    """Insert tokens in chunked multi-row writes, writing each chunk out as soon as it lands."""
+    role = args.role or 'member'
+    if args.from_csv:
+        entries = _csv_entries(args.from_csv, role)
+    else:
+        email = args.email_hint or 'unknown@example.com'
+        entries = ((email, role) for _ in range(args.count))
+
+    created_by = None if args.created_by == 'cli' else args.created_by
+    chunks = invite_manager.create_invite_tokens_bulk(
+        entries,
+        expires_in_hours=args.expires_hours,
+        created_by_user_id=created_by,
+        organization_id=args.organization_id,
+    )
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    total = 0
+    try:
+        writer = csv.DictWriter(out, fieldnames=BULK_FIELDS)
+        writer.writeheader()
+        for records in chunks:
+            writer.writerows(records)
+            out.flush()
+            total += len(records)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        print(f"{total} tokens generated. Use within {args.expires_hours}h.", file=sys.stderr)
+
+
 if __name__ == '__main__':
     main()
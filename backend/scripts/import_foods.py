@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Import a TACO/TBCA food table (CSV or XLSX) into the foods catalog.
+
+The file is streamed a row at a time and upserted by slug in chunks, so
+tables of any size import in constant memory (see app/food_import.py).
+Progress goes to stderr; the final totals are printed as JSON.
+
+Usage:
+    python scripts/import_foods.py taco_4ed.xlsx --db foods.db
+    python scripts/import_foods.py tbca.csv --source TBCA --target supabase
+    python scripts/import_foods.py taco.xlsx --sheet "CMVCol taco3" --chunk-size 1000 --db foods.db
+
+Serve an SQLite import with FOOD_CATALOG_PATH=foods.db.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(HERE)
+PROJECT_DIR = os.path.dirname(BACKEND_DIR)
+
+# Add the parent directory to the path so we can import from app
+sys.path.insert(0, BACKEND_DIR)
+
+# Env first: app modules read their settings at import time
+try:
+    from dotenv import load_dotenv
+    backend_env = os.path.join(BACKEND_DIR, '.env')
+    project_env = os.path.join(PROJECT_DIR, '.env')
+    if os.path.exists(backend_env):
+        load_dotenv(backend_env, override=False)
+    elif os.path.exists(project_env):
+        load_dotenv(project_env, override=False)
+except Exception:
+    pass
+
+from app.food_import import (  # noqa: E402
+    FOOD_IMPORT_CHUNK_SIZE,
+    FOOD_IMPORT_DB_PATH,
+    ImportFormatError,
+    ImportStats,
+    SQLiteFoodSink,
+    SupabaseFoodSink,
+    import_foods,
+)
+
+
+def report(stats: ImportStats) -> None:
+    print(
+        f"\r{stats.read:,} rows read, {stats.imported:,} foods written "
+        f"({stats.inserted:,} new, {stats.updated:,} updated), {stats.rows_per_sec:,.0f} rows/s",
+        end="", file=sys.stderr, flush=True,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Import a TACO/TBCA food table into the foods catalog')
+    parser.add_argument('path', help='CSV or XLSX file')
+    parser.add_argument('--source', help='Source of the foods, e.g. TACO or TBCA (default: source column or file name)')
+    parser.add_argument('--sheet', help='XLSX sheet (default: the first)')
+    parser.add_argument('--target', choices=['sqlite', 'supabase'],
+                        help='Where to write (default: sqlite with --db or FOOD_IMPORT_DB_PATH, else supabase)')
+    parser.add_argument('--db', default=FOOD_IMPORT_DB_PATH, help='SQLite file for --target sqlite')
+    parser.add_argument('--chunk-size', type=int, default=FOOD_IMPORT_CHUNK_SIZE,
+                        help=f'Foods per transaction/request (default: {FOOD_IMPORT_CHUNK_SIZE})')
+    parser.add_argument('--quiet', action='store_true', help='No progress on stderr')
+    args = parser.parse_args()
+
+    target = args.target or ('sqlite' if args.db else 'supabase')
+    if target == 'sqlite' and not args.db:
+        parser.error('--target sqlite needs --db (or FOOD_IMPORT_DB_PATH)')
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+
+    try:
+        sink = SQLiteFoodSink(args.db) if target == 'sqlite' else SupabaseFoodSink()
+    except ValueError as e:
+        print(f"Supabase not configured: {e}", file=sys.stderr)
+        return 1
+    try:
+        stats = import_foods(
+            args.path, sink, source=args.source, sheet=args.sheet, chunk_size=args.chunk_size,
+            progress=None if args.quiet else report,
+        )
+    except (ImportFormatError, OSError) as e:
+        print(f"\nImport failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        sink.close()
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(json.dumps(dict(stats.as_dict(), target=args.db if target == 'sqlite' else 'supabase')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+import os
+
+# app modules read their settings at import time, and pytest loads this file before any test module
+os.environ.setdefault("INVITE_TOKEN_SECRET", "test-secret")
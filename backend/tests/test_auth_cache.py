@@ -0,0 +1,54 @@
+import time
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+
+from app import db, security
+from app.main import app
+
+
+@pytest.fixture()
+def user_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "app.db"))
+    db.init_db()
+    db._profile_cache.clear()
+    yield db.create_usuario("Membro", "membro@example.com", "x", "colaborador")
+    db.close_pool()
+
+
+def test_verified_jwts_are_cached_until_exp(monkeypatch):
+    security._verified.clear()
+    decodes = []
+    real_decode = security._decode
+    monkeypatch.setattr(security, "_decode", lambda token: decodes.append(token) or real_decode(token))
+
+    token = security.issue_jwt("u1", "colaborador")
+    first = security.verify_jwt(token)
+    first["role"] = "master"  # callers get a copy
+    assert security.verify_jwt(token)["role"] == "colaborador"
+    assert decodes == [token]
+
+    assert security.verify_jwt(token + "x") is None
+    assert security.verify_jwt(token + "x") is None
+    assert len(decodes) == 3 and len(security._verified) == 1
+
+    short = jwt.encode({"sub": "u2", "exp": int(time.time()) + 1}, security.JWT_SECRET, algorithm=security.JWT_ALG)
+    assert security.verify_jwt(short)["sub"] == "u2"
+    time.sleep(1.1)
+    assert security.verify_jwt(short) is None
+
+
+def test_me_is_served_from_profile_cache_until_a_write(user_db):
+    client = TestClient(app)
+    client.cookies.set("auth_token", security.issue_jwt(user_db, "colaborador"))
+    hits = db.profile_cache_stats()["hits"]
+
+    assert client.get("/api/me").json()["nome"] == "Membro"
+    with db._connection() as conn, conn:
+        conn.execute("UPDATE usuarios SET nome = ? WHERE id = ?", ("Renomeado", user_db))
+    assert client.get("/api/me").json()["nome"] == "Membro"
+    assert db.profile_cache_stats()["hits"] == hits + 1
+
+    db.invalidate_usuario(user_db)
+    assert client.get("/api/me").json()["nome"] == "Renomeado"
@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import db
+from app.main import app
+
+
+@pytest.fixture()
+def fresh_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "app.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_pool()
+
+
+def test_fresh_database_reaches_latest_version_once(fresh_db):
+    db.init_db()
+    with db._connection() as conn:
+        assert db.schema_version(conn) == db.SCHEMA_VERSION
+        assert db.migrate(conn) == []
+        versions = [r["version"] for r in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in db.MIGRATIONS]
+
+
+def test_pre_migration_database_is_adopted_with_its_rows(fresh_db, monkeypatch):
+    # A database created by the old CREATE TABLE IF NOT EXISTS init_db
+    conn = sqlite3.connect(fresh_db)
+    for sql in db.MIGRATIONS[0][2]:
+        conn.execute(sql)
+    conn.execute("INSERT INTO usuarios VALUES ('u1', 'Ana', 'ana@example.com', 'x', 'master', '2024-01-01T00:00:00Z')")
+    conn.execute(
+        "INSERT INTO tokens_convite (id, token, usado, criado_por, criado_em) "
+        "VALUES ('t1', 'plain-token', 0, 'u1', '2024-01-01T00:00:00Z')"
+    )
+    conn.commit()
+    conn.close()
+
+    # Stored plain tokens can't be hashed without the secret: a startup error that says so
+    with monkeypatch.context() as m:
+        m.delenv("INVITE_TOKEN_SECRET")
+        with pytest.raises(RuntimeError, match="INVITE_TOKEN_SECRET"):
+            db.init_db()
+        # ...and the app does not come up on the old schema
+        with pytest.raises(RuntimeError, match="INVITE_TOKEN_SECRET"):
+            with TestClient(app):
+                pass
+
+    db.init_db()
+    assert db.get_usuario_by_id("u1")["email"] == "ana@example.com"
+    # Old tokens keep working, but only their digest is left on disk
+    assert db.get_token_record_by_token("plain-token")["id"] == "t1"
+    assert db.get_token_record_by_token("other-token") is None
+    with db._connection() as conn:
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(tokens_convite)")}
+        indexes = {r["name"] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        unique = {r["name"] for r in conn.execute("PRAGMA index_list(tokens_convite)") if r["unique"]}
+    assert "token" not in columns
+    assert {"idx_tokens_convite_token_hash", "idx_tokens_convite_criado_por", "idx_tokens_convite_usado"} <= indexes
+    assert "idx_tokens_convite_token_hash" in unique
+
+
+def test_hot_queries_use_indexes(fresh_db):
+    db.init_db()
+    master_id = db.create_usuario("Master", "master@example.com", "x", "master")
+    token_id, token = db.insert_token(master_id)
+
+    statements = []
+    with db._connection() as conn:
+        # The helpers below run on this thread's pooled connection
+        conn.set_trace_callback(statements.append)
+        try:
+            db.get_usuario_by_email("master@example.com")
+            db.get_usuario_by_id(master_id)
+            db.get_token_record_by_token(token)
+            db.mark_token_used(token_id)
+            items, cursor = db.list_tokens_page(limit=1)
+            db.list_tokens_page(limit=1, cursor=db.encode_cursor("2999", "x"), status="used")
+            db.list_tokens_page(status="active")
+            db.purge_used_tokens(db.datetime.utcnow(), 10)
+        finally:
+            conn.set_trace_callback(None)
+
+        hot = [sql for sql in statements if sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))]
+        assert len(hot) == 8
+        for sql in hot:
+            plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            for step in plan:
+                if step.startswith("SCAN"):
+                    assert "INDEX" in step, (sql, plan)
+                assert "TEMP B-TREE" not in step, (sql, plan)
@@ -0,0 +1,138 @@
+import io
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import food_import, food_search, security, supabase_client
+from app.food_import import SQLiteFoodSink, SupabaseFoodSink, import_foods, read_foods
+from app.main import app
+from app.testing import supabase_fake
+from app.testing.supabase_fake import FakeSupabase
+
+# TACO as exported from Excel: title row, ";" and decimal commas, cp1252, group headings
+TACO_CSV = """Tabela Brasileira de Composição de Alimentos;;;;;;;
+Número do Alimento;Descrição dos alimentos;Umidade (%);Energia (kcal);Energia (kJ);Proteína (g);Lipídeos (g);Carboidrato (g);Fibra Alimentar (g)
+Cereais e derivados;;;;;;;;
+1;Arroz, integral, cozido;70,1;124;517;2,6;1,0;25,8;2,7
+2;Arroz, tipo 1, cozido;69,1;;;2,5;0,2;28,1;1,6
+3;Pão, trigo, francês;28,5;;1255;8,0;3,1;58,6;2,3
+;;;;;;;;
+Frutas e derivados;;;;;;;;
+4;Açaí, polpa, congelada;88,7;58;244;0,8;3,9;6,2;2,6
+5;Acerola, crua;90,5;33;139;0,9;Tr;8,0;1,5
+6;Arroz, integral, cozido;70,1;124;517;2,6;1,0;25,8;2,7
+7;Sem valores;NA;NA;NA;*;*;*;*
+"""
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return {row["slug"]: dict(row) for row in conn.execute("SELECT * FROM foods")}
+    finally:
+        conn.close()
+
+
+def test_tables_are_normalized_and_upserted_by_slug(tmp_path):
+    path = tmp_path / "taco_4ed.csv"
+    path.write_bytes(TACO_CSV.encode("cp1252"))
+    db_path = str(tmp_path / "foods.db")
+    sink = SQLiteFoodSink(db_path)
+    progress = []
+    stats = import_foods(str(path), sink, chunk_size=2, progress=lambda s: progress.append(s.imported))
+    # The second "Arroz, integral, cozido" lands in another chunk: an update, not a duplicate
+    assert (stats.read, stats.imported, stats.inserted, stats.updated, stats.skipped) == (7, 6, 5, 1, 1)
+    assert progress == [2, 4, 6] and stats.rows_per_sec > 0
+
+    foods = _rows(db_path)
+    assert set(foods) == {"arroz_integral_cozido", "arroz_tipo_1_cozido", "pao_trigo_frances", "acai_polpa_congelada",
+                          "acerola_crua"}
+    rice = foods["arroz_tipo_1_cozido"]
+    assert (rice["source"], rice["category"], rice["unit"], rice["portion_grams"]) == ("TACO", "Cereais e derivados", "g", 100)
+    # kcal from the macros when there is no energy column value, from kJ when there is one
+    assert rice["energy_kcal"] == 4 * 2.5 + 4 * 28.1 + 9 * 0.2
+    assert foods["pao_trigo_frances"]["energy_kcal"] == round(1255 / 4.184, 1)
+    assert foods["acerola_crua"]["fat_g"] == 0 and foods["acerola_crua"]["category"] == "Frutas e derivados"
+    # The catalog serves the import as it is
+    catalog = food_search.read_catalog_file(db_path)
+    assert [food["food_name"] for food in catalog][:2] == ["Arroz, integral, cozido", "Arroz, tipo 1, cozido"]
+
+    # XLSX, foods-table headers, household units; a name repeated in one chunk keeps its last row
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "foods"
+    sheet.append(["food_name", "unit", "portion_grams", "carbs_g", "protein_g", "fat_g", "energy_kcal", "source", "category"])
+    sheet.append(["Arroz, tipo 1, cozido", "g", 100, 28.0, 2.5, 0.2, 128, "tbca", "Cereais"])
+    sheet.append(["Leite, integral", "L", "0,2", 4.7, 3.2, 3.3, None, "TBCA", "Leites"])
+    sheet.append(["Pão de queijo", "unidade", 20, 34.2, 5.1, 24.6, 363, "TBCA", "Panificados"])
+    sheet.append(["Arroz, tipo 1, cozido", "g", 100, 28.1, 2.5, 0.2, 128, "TBCA", "Cereais"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    stats = import_foods(buffer, sink, sheet="foods")
+    assert (stats.read, stats.imported, stats.inserted, stats.updated, stats.duplicates) == (4, 3, 2, 1, 1)
+    sink.close()
+
+    foods = _rows(db_path)
+    assert len(foods) == 7
+    assert (foods["arroz_tipo_1_cozido"]["carbs_g"], foods["arroz_tipo_1_cozido"]["source"]) == (28.1, "TBCA")
+    milk = foods["leite_integral"]
+    assert (milk["unit"], milk["portion_grams"], milk["energy_kcal"]) == ("ml", 200, round(4 * 3.2 + 4 * 4.7 + 9 * 3.3, 1))
+    assert (foods["pao_de_queijo"]["unit"], foods["pao_de_queijo"]["portion_grams"]) == ("unidade", 20)
+
+    with pytest.raises(food_import.ImportFormatError):
+        list(read_foods(io.BytesIO(b"a,b,c\n1,2,3\n")))
+
+
+def test_import_endpoint_and_supabase_upsert(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "foods.db")
+    monkeypatch.setattr(food_import, "FOOD_IMPORT_DB_PATH", db_path)
+    monkeypatch.setattr(food_search, "FOOD_CATALOG_PATH", db_path)
+    client = TestClient(app)
+    upload = {"file": ("taco.csv", TACO_CSV.encode("utf-8"), "text/csv")}
+    try:
+        assert client.post("/api/foods/import", files=upload).status_code == 401
+        client.cookies.set("auth_token", security.issue_jwt("u1", "colaborador"))
+        assert client.post("/api/foods/import", files=upload).status_code == 403
+
+        client.cookies.set("auth_token", security.issue_jwt("admin", "master"))
+        r = client.post("/api/foods/import", files=upload, params={"source": "TACO"})
+        assert r.status_code == 200
+        assert {k: r.json()[k] for k in ("read", "imported", "inserted", "duplicates", "skipped")} == {
+            "read": 7, "imported": 5, "inserted": 5, "duplicates": 1, "skipped": 1,
+        }
+        # The catalog reloads from the import
+        items = client.get("/api/foods/search", params={"q": "acai"}).json()["items"]
+        assert [item["food_name"] for item in items] == ["Açaí, polpa, congelada"]
+
+        r = client.post("/api/foods/import", files={"file": ("x.csv", b"nada\n1\n", "text/csv")})
+        assert r.status_code == 422
+        # Windows-1252 only past the first 64 KB, where the encoding is guessed
+        late = TACO_CSV.encode("utf-8") + b"8;Arroz;1;1;1;1;1;1;1\n" * 4000 + "9;Feijão;1;1;1;1;1;1;1\n".encode("cp1252")
+        r = client.post("/api/foods/import", files={"file": ("late.csv", late, "text/csv")})
+        assert r.status_code == 422 and "UTF-8" in r.json()["detail"]
+    finally:
+        food_search.set_index(None)
+
+    # The same table into the Supabase stand-in, upserted on slug
+    fake = FakeSupabase(str(tmp_path / "supabase.db"))
+    monkeypatch.setattr(supabase_client, "SUPABASE_FAKE", True)
+    monkeypatch.setattr(supabase_fake, "_fake", fake)
+    supabase = supabase_client.SupabaseClientRegistry().get()
+    try:
+        sink = SupabaseFoodSink(supabase)
+        path = tmp_path / "taco.csv"
+        path.write_text(TACO_CSV, encoding="utf-8")
+        stats = import_foods(str(path), sink, chunk_size=4)
+        assert (stats.imported, stats.inserted, stats.updated) == (6, 5, 1)
+        stats = import_foods(str(path), sink)
+        assert (stats.imported, stats.inserted, stats.updated, stats.duplicates) == (5, 0, 5, 1)
+        rows = fake.rows("foods")
+        assert len(rows) == 5 and {row["source"] for row in rows} == {"TACO"}
+        # Only the columns the Supabase foods table has
+        assert not {"slug", "category"} & set(rows[0])
+    finally:
+        supabase.close()
@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app import food_search
+from app.food_search import FoodIndex, decode_search_cursor, fold
+from app.main import app
+from app.supabase_async import AsyncSupabase, AsyncSupabaseDAL, set_async_dal
+from app.testing.supabase_fake import FAKE_URL, FakeSupabase
+
+FOODS = [
+    {"id": 1, "food_name": "Pão, trigo, francês", "source": "TBCA"},
+    {"id": 2, "food_name": "Pão", "source": "TBCA"},
+    {"id": 3, "food_name": "Pão de queijo, assado", "source": "TACO"},
+    {"id": 4, "food_name": "Feijão, carioca, cozido", "source": "TACO"},
+    {"id": 5, "food_name": "Feijão, preto, cozido", "source": "TACO"},
+    {"id": 6, "food_name": "Arroz, integral, cozido", "source": "TACO"},
+    {"id": 7, "food_name": "Queijo, minas, frescal", "source": "IBGE"},
+]
+
+
+def _names(items):
+    return [item["food_name"] for item in items]
+
+
+def test_ranking_sources_fuzzy_and_cursor_pages():
+    index = FoodIndex(FOODS)
+    assert fold("Pão de Queijo, ASSADO!") == "pao de queijo assado"
+
+    items, _ = index.search("pao")
+    # TACO first, then exact name before prefix matches
+    assert _names(items) == ["Pão de queijo, assado", "Pão", "Pão, trigo, francês"]
+    assert _names(index.search("coz fei", sources=["TACO"])[0]) == ["Feijão, carioca, cozido", "Feijão, preto, cozido"]
+    assert _names(index.search("queijo", sources=["ibge"])[0]) == ["Queijo, minas, frescal"]
+    assert _names(index.search("fejao")[0])[:2] == ["Feijão, carioca, cozido", "Feijão, preto, cozido"]
+    assert index.search("xyz") == ([], None)
+
+    seen, cursor = [], None
+    while True:
+        items, cursor = index.search("p", limit=3, cursor=cursor)
+        seen.extend(item["id"] for item in items)
+        if cursor is None:
+            break
+    assert seen == ["3", "5", "2", "1"]
+
+    # A cursor from the old snapshot still lands in the right place after a reload
+    _, cursor = index.search("pao", limit=1)
+    reloaded = FoodIndex(FOODS + [{"id": 8, "food_name": "Pão doce", "source": "TACO"}])
+    assert _names(reloaded.search("pao", cursor=cursor)[0]) == ["Pão doce", "Pão", "Pão, trigo, francês"]
+
+
+def test_search_route_loads_catalog_from_supabase(monkeypatch):
+    fake = FakeSupabase()
+    fake.insert_rows("foods", [dict(food, carbs_g=1.5) for food in FOODS])
+    http = httpx.AsyncClient(transport=fake.async_transport())
+    set_async_dal(AsyncSupabaseDAL(AsyncSupabase(FAKE_URL, fake.service_role_key, http=http)))
+    monkeypatch.setattr(food_search, "FOOD_CATALOG_PATH", None)
+    client = TestClient(app)
+    try:
+        food_search.set_index(None)
+        assert client.get("/api/foods/search", params={"q": "pao"}).status_code == 503
+        index = asyncio.run(food_search.refresh_catalog())
+        assert len(index) == 7
+
+        r = client.get("/api/foods/search", params={"q": "pão", "sources": "TBCA", "limit": 1})
+        assert r.status_code == 200 and "max-age" in r.headers["Cache-Control"]
+        body = r.json()
+        assert body["items"][0]["food_name"] == "Pão" and body["items"][0]["carbs_g"] == 1.5
+        assert decode_search_cursor(body["next_cursor"])[2] == "pao"
+        r = client.get("/api/foods/search", params={"q": "pão", "sources": "TBCA", "cursor": body["next_cursor"]})
+        assert _names(r.json()["items"]) == ["Pão, trigo, francês"] and r.json()["next_cursor"] is None
+        assert client.get("/api/foods/search", params={"q": "pao", "cursor": "junk"}).status_code == 400
+    finally:
+        food_search.set_index(None)
+        set_async_dal(None)
@@ -56,4 +56,20 @@ def test_register_with_token_missing_email_pydantic():
     # FastAPI converts Pydantic ValidationError to 422
     assert r.status_code == 422
     body = r.json()
-    assert body["detail"][0]["loc"][:2] == ["body", "email"]
\ No newline at end of file
+    assert body["detail"][0]["loc"][:2] == ["body", "email"]
+
+
+def test_supabase_auth_without_supabase_settings_is_unavailable(monkeypatch):
+    from app import supabase_async, supabase_client, supabase_jwt
+
+    monkeypatch.setattr(supabase_client, "SUPABASE_FAKE", False)
+    monkeypatch.delenv("VITE_SUPABASE_URL", raising=False)
+    monkeypatch.delenv("SUPABASE_SERVICE_ROLE_KEY", raising=False)
+    monkeypatch.setattr(supabase_async, "_dal", None)
+    r = client.post("/api/auth/login", json={"email": "a@example.com", "password": "Passw0rd1"})
+    assert r.status_code == 503
+    # Invite routes check the bearer token remotely when there is no local verifier
+    monkeypatch.setattr(supabase_jwt, "_verifier", None)
+    monkeypatch.setattr(supabase_jwt, "_verifier_loaded", True)
+    r = client.get("/api/invite/list", headers={"Authorization": "Bearer some-token"})
+    assert r.status_code == 503
@@ -0,0 +1,66 @@
+import time
+
+import jwt
+import pytest
+
+from app.jwt_keys import Keyring, SigningKey
+
+
+def test_rotation_keeps_old_tokens_valid_until_retired():
+    keyring = Keyring(legacy_secret="old-secret", token_ttl=60)
+    legacy = jwt.encode({"sub": "u0"}, "old-secret", algorithm="HS256")  # issued before kid headers
+    first = keyring.sign({"sub": "u1"})
+    assert jwt.get_unverified_header(first)["kid"] == "default"
+
+    new_kid = keyring.rotate()
+    second = keyring.sign({"sub": "u2"})
+    assert jwt.get_unverified_header(second)["kid"] == new_kid
+    assert [keyring.verify(t)["sub"] for t in (legacy, first, second)] == ["u0", "u1", "u2"]
+    assert keyring.rotate_if_due(3600) is None
+
+    keyring.key("default").retire_at = time.time() - 1
+    assert keyring.verify(first) is None and keyring.verify(legacy) is None
+    assert keyring.verify(second)["sub"] == "u2"
+    forged = jwt.encode({"sub": "x"}, "guess", algorithm="HS256", headers={"kid": new_kid})
+    assert keyring.verify(forged) is None
+
+
+@pytest.mark.parametrize("alg", ["ES256", "EdDSA"])
+def test_sqlite_keyring_is_shared_and_publishes_public_keys(tmp_path, alg):
+    path = str(tmp_path / "keys.db")
+    a = Keyring(path, algorithm=alg, reload_secs=3600)
+    b = Keyring(path, algorithm=alg, reload_secs=3600)
+    assert a.kids() == b.kids()  # b found a's key instead of making its own
+    token = a.sign({"sub": "u1"})
+
+    rotated = a.rotate()
+    fresh = a.sign({"sub": "u2"})
+    # b learns about the new kid on first sight, and old tokens still verify
+    assert b.verify(fresh)["sub"] == "u2" and b.verify(token)["sub"] == "u1"
+    assert b.rotate_if_due(3600) is None and b.signing_key().kid == rotated
+
+    # An edge verifier needs only the published JWKS
+    jwks = b.jwks()
+    assert {k["kid"] for k in jwks["keys"]} == set(b.kids())
+    assert all("d" not in k for k in jwks["keys"])
+    public = {k["kid"]: jwt.PyJWK(k) for k in jwks["keys"]}
+    assert jwt.decode(fresh, public[rotated].key, algorithms=[alg])["sub"] == "u2"
+    a.close()
+    b.close()
+
+
+def test_es256_jwk_keeps_short_coordinates_32_bytes():
+    serialization = pytest.importorskip("cryptography.hazmat.primitives.serialization")
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    # About one key in 256 has an x with a leading zero byte
+    while True:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        if private_key.public_key().public_numbers().x < 1 << 248:
+            break
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode("ascii")
+    key = SigningKey("k1", "ES256", pem, created_at=0.0)
+    token = jwt.encode({"sub": "u1"}, key.signing, algorithm="ES256")
+    assert jwt.decode(token, jwt.PyJWK(key.public_jwk()).key, algorithms=["ES256"])["sub"] == "u1"
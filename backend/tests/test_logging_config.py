@@ -0,0 +1,56 @@
+import io
+import json
+import logging
+
+import pytest
+
+from app import logging_config
+
+
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    yield stream
+    logging.getLogger("test.noisy").setLevel(logging.NOTSET)
+    logging.getLogger("test.quiet").setLevel(logging.NOTSET)
+    logging_config.configure_logging()
+
+
+def _lines(stream):
+    logging_config.shutdown_logging()  # drains the queue
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_with_extras_and_lazy_args(log_stream):
+    logging_config.configure_logging(level="INFO", levels="", fmt="json", debug_sample_rate=1.0, stream=log_stream)
+    logging.getLogger("test.app").info("user %s signed in", "u1", extra={"role": "admin"})
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        logging.getLogger("test.app").exception("failed")
+
+    first, second = _lines(log_stream)
+    assert first["msg"] == "user u1 signed in"
+    assert first["level"] == "INFO" and first["logger"] == "test.app" and first["role"] == "admin"
+    assert second["level"] == "ERROR" and "RuntimeError: boom" in second["exc"]
+
+
+def test_per_module_levels_and_debug_sampling(log_stream):
+    logging_config.configure_logging(
+        level="INFO",
+        levels="test.noisy=DEBUG, test.quiet=ERROR",
+        fmt="json",
+        debug_sample_rate=0.0,
+        stream=log_stream,
+    )
+    logging.getLogger("test.noisy").debug("sampled away")
+    logging.getLogger("test.noisy").info("kept")
+    logging.getLogger("test.quiet").warning("below module level")
+    logging.getLogger("test.other").debug("below root level")
+
+    assert [line["msg"] for line in _lines(log_stream)] == ["kept"]
+
+    sampler = logging_config.DebugSampler(0.5)
+    debug = logging.LogRecord("x", logging.DEBUG, "", 0, "m", None, None)
+    kept = sum(sampler.filter(debug) for _ in range(2000))
+    assert 800 < kept < 1200
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, maintenance, store
+from app.models import InviteToken
+
+
+@pytest.fixture()
+def local_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "app.db"))
+    db.init_db()
+
+    def no_supabase():
+        raise ValueError("Missing Supabase environment variables")
+
+    monkeypatch.setattr(maintenance, "get_async_dal", no_supabase)
+    store.clear()
+    yield
+    store.clear()
+    db.close_pool()
+
+
+def test_sweep_purges_in_bounded_batches(local_only, monkeypatch):
+    now = datetime.utcnow()
+    for i in range(5):
+        store.create_invite_token(InviteToken(token_hash=f"expired-{i}", expires_at=now - timedelta(hours=1)))
+    live = store.create_invite_token(InviteToken(token_hash="live", expires_at=now + timedelta(hours=1)))
+    old_use = store.create_invite_token(
+        InviteToken(token_hash="used", expires_at=now + timedelta(hours=1), used_at=now - timedelta(days=30))
+    )
+
+    master_id = db.create_usuario("Master", "master@example.com", "x", "master")
+    used_id, _ = db.insert_token(master_id)
+    unused_id, _ = db.insert_token(master_id)
+    monkeypatch.setattr(db, "_now_iso", lambda: "2020-01-01T00:00:00Z")
+    db.mark_token_used(used_id)
+
+    # Retention 0: anything already used is fair game
+    sweeper = maintenance.TokenSweeper(batch_size=2, max_batches=2, used_retention_hours=0)
+    first = asyncio.run(sweeper.sweep_once())
+    assert first == {"store": 4, "sqlite": 1}
+    second = asyncio.run(sweeper.sweep_once())
+    assert second == {"store": 2, "sqlite": 0}
+
+    assert [t.id for t in store.list_invite_tokens()] == [live.id]
+    assert store.find_invite_token_by_hash(old_use.token_hash) is None
+    assert [t["id"] for t in db.list_tokens()] == [unused_id]
+    stats = sweeper.stats()
+    assert stats["runs"] == 2 and stats["errors"] == 0
+    assert stats["deleted_total"] == {"supabase": 0, "store": 6, "sqlite": 1}
+
+
+def test_failing_target_is_counted_and_others_still_run(local_only, monkeypatch):
+    def broken(*args):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(db, "purge_used_tokens", broken)
+    store.create_invite_token(InviteToken(token_hash="gone", expires_at=datetime.utcnow() - timedelta(hours=1)))
+
+    sweeper = maintenance.TokenSweeper()
+    assert asyncio.run(sweeper.sweep_once()) == {"store": 1}
+    assert sweeper.stats()["errors"] == 1
@@ -0,0 +1,132 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import food_search, security
+from app.food_search import FoodIndex
+from app.main import app
+from app.meal_optimizer import (
+    MealProblem,
+    bounded_lstsq,
+    least_squares_system,
+    meal_shares,
+    optimize_batch,
+    preset_for_count,
+)
+
+
+def _random_plan(rng, meals=8, per_meal=10):
+    n = meals * per_meal
+    protein, carbs, fat = rng.uniform(0, 30, n), rng.uniform(0, 70, n), rng.uniform(0, 20, n)
+    per100g = np.c_[4 * protein + 4 * carbs + 9 * fat, protein, carbs, fat]
+    ids = [meal_id for meal_id, _ in preset_for_count(meals)]
+    # Reachable targets: calories agree with the macros (4/4/9 kcal per gram)
+    target_protein, target_carbs, target_fat = rng.uniform(90, 200), rng.uniform(150, 350), rng.uniform(40, 90)
+    step = rng.choice([5, 5, 10, 50], n)
+    return MealProblem(
+        per100g,
+        np.repeat(np.arange(meals), per_meal),
+        [4 * target_protein + 4 * target_carbs + 9 * target_fat, target_protein, target_carbs, target_fat],
+        lower=step * (rng.random(n) < 0.1),  # a few foods take at least one portion
+        upper=rng.choice([150, 300, 500], n),
+        preferred=rng.uniform(20, 150, n),
+        step=step,
+        shares=meal_shares(ids),
+    )
+
+
+def test_bounded_solution_and_portions():
+    rng = np.random.default_rng(3)
+    problems = [_random_plan(rng) for _ in range(50)]
+
+    # Continuous optimum: KKT holds (zero gradient inside the box, pointing outwards on a bound)
+    M, d = least_squares_system(problems[0])
+    x, _ = bounded_lstsq(M, d, problems[0].lower, problems[0].upper)
+    grad = M.T @ (M @ x - d)
+    inside = (x > problems[0].lower) & (x < problems[0].upper)
+    assert np.all(np.abs(grad[inside]) < 1e-8)
+    assert np.all(grad[x <= problems[0].lower] >= -1e-8) and np.all(grad[x >= problems[0].upper] <= 1e-8)
+
+    # A singular system (the same food twice, no preference term) still solves
+    twin = np.array([[1.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    x, _ = bounded_lstsq(twin, np.array([2.0, 1.0]), np.zeros(3), np.full(3, 5.0))
+    assert np.allclose(twin @ x, [2.0, 1.0])
+
+    worst = []
+    for problem, solution in zip(problems, optimize_batch(problems)):
+        grams = solution.grams
+        assert np.all(grams >= problem.lower) and np.all(grams <= problem.upper)
+        assert np.allclose(grams / problem.step, np.round(grams / problem.step))
+        assert np.allclose(solution.achieved, grams @ problem.per100g / 100)
+        assert solution.ok
+        worst.append(np.abs(solution.deviation).max())
+    assert np.median(worst) < 0.01
+
+    # Unreachable targets come back as the closest plan, flagged
+    problem = _random_plan(rng)
+    problem.lower[:], problem.upper[:], problem.step[:] = 0, 5, 5
+    [solution] = optimize_batch([problem])
+    assert not solution.ok and np.all(solution.grams == 5) and np.all(solution.deviation < -0.3)
+
+
+def test_optimize_endpoint():
+    food_search.set_index(FoodIndex([
+        {"id": 1, "food_name": "Arroz, integral, cozido", "source": "TACO",
+         "energy_kcal": 124, "protein_g": 2.6, "carbs_g": 25.8, "fat_g": 1.0, "fiber_g": 2.7},
+        {"id": 2, "food_name": "Feijão, carioca, cozido", "source": "TACO",
+         "energy_kcal": 76, "protein_g": 4.8, "carbs_g": 13.6, "fat_g": 0.5, "fiber_g": 8.5},
+        {"id": 3, "food_name": "Frango, peito, sem pele, grelhado", "source": "TACO",
+         "energy_kcal": 159, "protein_g": 32.0, "carbs_g": 0.0, "fat_g": 2.5, "fiber_g": 0},
+        {"id": 4, "food_name": "Azeite, de oliva, extra virgem", "source": "TACO",
+         "energy_kcal": 884, "protein_g": 0.0, "carbs_g": 0.0, "fat_g": 100.0, "fiber_g": 0},
+        {"id": 5, "food_name": "Pão, trigo, francês", "source": "TACO",
+         "energy_kcal": 300, "protein_g": 8.0, "carbs_g": 58.6, "fat_g": 3.1, "fiber_g": 2.3},
+    ]))
+    client = TestClient(app)
+    lunch = [{"food_id": 1, "quantity": 150}, {"food_id": 2, "quantity": 100}, {"food_id": 3, "quantity": 120},
+             {"food_id": 4, "quantity": 5, "step": 1, "max_quantity": 15}]
+    payload = {
+        "id": "paciente-1",
+        "targets": {"calories": 2000, "protein": 150, "carbs": 220, "fat": 55},
+        "meal_count": 4,
+        "meals": [
+            {"id": "jantar", "foods": lunch},
+            {"id": "cafe", "foods": [{"food_id": 5, "quantity": 50, "step": 50, "min_quantity": 50},
+                                     {"macros": {"calories": 61, "protein": 3.2, "carbs": 4.7, "fat": 3.3}}]},
+            {"id": "almoco", "foods": lunch},
+        ],
+    }
+    try:
+        assert client.post("/api/plans/optimize", json=payload).status_code == 401
+        client.cookies.set("auth_token", security.issue_jwt("u1", "colaborador"))
+
+        plan = client.post("/api/plans/optimize", json=payload).json()
+        assert plan["id"] == "paciente-1" and plan["ok"]
+        # Preset order and names; "lanche" had no candidates
+        assert [(m["id"], m["name"]) for m in plan["meals"]] == [
+            ("cafe", "Café da manhã"), ("almoco", "Almoço"), ("lanche", "Lanche"), ("jantar", "Jantar"),
+        ]
+        assert plan["meals"][2]["foods"] == [] and plan["meals"][2]["total"]["calories"] == 0
+        bread = plan["meals"][0]["foods"][0]
+        assert bread["food_id"] == 5 and bread["quantity"] >= 50 and bread["quantity"] % 50 == 0
+        for meal in plan["meals"]:
+            assert meal["total"]["quantity"] == round(sum(food["quantity"] for food in meal["foods"]))
+        for target in ("calories", "protein", "carbs", "fat"):
+            assert abs(plan["total"][target] - payload["targets"][target]) <= 0.05 * payload["targets"][target]
+        # Lunch and dinner share candidates but lunch gets the bigger share of calories
+        assert plan["meals"][1]["total"]["calories"] > plan["meals"][3]["total"]["calories"]
+
+        batch = {"patients": [payload, dict(payload, id="paciente-2", meal_count=None, distribute=False)]}
+        results = client.post("/api/plans/optimize/batch", json=batch).json()["patients"]
+        assert [r["id"] for r in results] == ["paciente-1", "paciente-2"] and results[0] == plan
+        assert [m["id"] for m in results[1]["meals"]] == ["jantar", "cafe", "almoco"]
+
+        r = client.post("/api/plans/optimize", json=dict(payload, meals=[{"id": "ceia", "foods": []}]))
+        assert r.status_code == 422 and r.json()["detail"]["meal_ids"] == ["ceia"]
+        r = client.post("/api/plans/optimize", json=dict(payload, meals=[{"id": "cafe", "foods": [{"food_id": 99}]}]))
+        assert r.status_code == 422 and r.json()["detail"]["food_ids"] == ["99"]
+        # A minimum above the default maximum is a bad request, not a solver error
+        heavy = [{"id": "cafe", "foods": [{"food_id": 1, "min_quantity": 600}]}]
+        r = client.post("/api/plans/optimize", json=dict(payload, meals=heavy))
+        assert r.status_code == 422
+    finally:
+        food_search.set_index(None)
@@ -0,0 +1,53 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+from app.rate_limit import MemoryRateLimitBackend, RateLimiter
+
+
+def test_sharded_counter_sums_every_thread():
+    counter = metrics.Counter("test_events_total", "test", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            counter.inc("a")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc("b", amount=2)
+    assert counter.value("a") == 8000
+    assert 'test_events_total{kind="b"} 2' in counter.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = metrics.Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        hist.observe(value, "/x")
+    lines = hist.render()
+    assert 'test_latency_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{route="/x"} 4' in lines
+
+
+def test_metrics_endpoint_reports_routes_and_rejections():
+    limiter = RateLimiter("test-metrics", 1, period=60, backend=MemoryRateLimitBackend())
+    limiter.hit("k")
+    limiter.hit("k")
+
+    client = TestClient(app)
+    client.get("/")
+    client.get("/no/such/path")
+    body = client.get("/metrics").text
+
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in body
+    assert 'http_requests_total{method="GET",route="<unmatched>",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="+Inf"}' in body
+    assert 'rate_limit_rejections_total{limiter="test-metrics"} 1' in body
+    assert "# TYPE sessions_active gauge" in body
+    assert 'cache_entries{cache="roles"}' in body
@@ -0,0 +1,102 @@
+import math
+import random
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import food_search, security
+from app.food_search import FoodIndex
+from app.main import app
+from app.nutrition import FoodRows, MacroTable, compute_totals, js_round
+
+
+def _math_round(x):
+    # JavaScript's Math.round: the nearest integer, halves towards +infinity
+    floor = math.floor(x)
+    return floor + (x - floor >= 0.5)
+
+
+def _calc_totals(foods):
+    """utils/meals.ts calcTotals, line by line."""
+    t = [0.0] * 6
+    for macros, quantity in foods:
+        m = quantity / 100
+        for i in range(5):
+            t[i] = t[i] + macros[i] * m
+        t[5] = t[5] + quantity
+    return [_math_round(t[0])] + [_math_round(v * 10) / 10 for v in t[1:5]] + [_math_round(t[5])]
+
+
+def test_batch_totals_match_calc_totals():
+    assert js_round(np.array([2.5, -2.5, 0.49999999999999994, 1.45]), 1).tolist() == [2.5, -2.5, 0.5, 1.5]
+    assert js_round(np.array([2.5, -2.5, -0.5, 0.49999999999999994])).tolist() == [3, -2, 0, 0]
+
+    rng = random.Random(7)
+    catalog = [
+        {"id": i, "energy_kcal": rng.uniform(0, 900), "protein_g": rng.uniform(0, 40), "carbs_g": rng.uniform(0, 90),
+         "fat_g": rng.uniform(0, 100), "fiber_g": rng.choice([None, "Tr", rng.uniform(0, 15)])}
+        for i in range(300)
+    ]
+    table = MacroTable(catalog)
+    per100g = table.per100g.tolist()
+
+    rows, expected_groups, expected_plans = FoodRows(), [], []
+    for plan in range(200):
+        plan_foods = []
+        for meal in range(rng.randint(0, 6)):
+            for plan_index, count in ((plan, rng.randint(0, 8)), (-1, rng.randint(0, 4))):
+                group, foods = rows.new_group(), []
+                for _ in range(count):
+                    quantity = rng.choice([rng.uniform(0, 400), 150, 33.3])
+                    if rng.random() < 0.2:
+                        macros = [rng.uniform(0, 300) for _ in range(5)]
+                        rows.add(group, plan_index, quantity, None, macros)
+                    else:
+                        food_id = rng.randrange(300)
+                        macros = per100g[food_id]
+                        rows.add(group, plan_index, quantity, str(food_id), None)
+                    foods.append((macros, quantity))
+                expected_groups.append(_calc_totals(foods))
+                if plan_index >= 0:
+                    plan_foods.extend(foods)
+        expected_plans.append(_calc_totals(plan_foods))
+
+    groups, plans = compute_totals(rows, 200, table)
+    assert groups.tolist() == expected_groups
+    assert plans.tolist() == expected_plans
+
+
+def test_macros_compute_endpoint():
+    food_search.set_index(FoodIndex([
+        {"id": 1, "food_name": "Arroz, integral, cozido", "source": "TACO",
+         "energy_kcal": 124, "protein_g": 2.6, "carbs_g": 25.8, "fat_g": 1.0, "fiber_g": 2.7},
+        {"id": 2, "food_name": "Feijão, carioca, cozido", "source": "TACO",
+         "energy_kcal": 76, "protein_g": 4.8, "carbs_g": 13.6, "fat_g": 0.5, "fiber_g": 8.5},
+    ]))
+    client = TestClient(app)
+    payload = {"plans": [{"id": "p1", "meals": [{
+        "id": "almoco",
+        "foods": [{"food_id": 1, "quantity": 150}, {"food_id": "2", "quantity": 100}],
+        "substitutions": [{"id": "s1", "foods": [
+            {"macros": {"calories": 250, "protein": 8, "carbs": 50, "fat": 1}, "quantity": 50},
+        ]}],
+    }]}]}
+    try:
+        assert client.post("/api/macros/compute", json=payload).status_code == 401
+        client.cookies.set("auth_token", security.issue_jwt("u1", "colaborador"))
+
+        plan = client.post("/api/macros/compute", json=payload).json()["plans"][0]
+        # 150 g of rice + 100 g of beans
+        expected = {"calories": 262, "protein": 8.7, "carbs": 52.3, "fat": 2.0, "fiber": 12.6, "quantity": 250}
+        assert plan["total"] == expected and plan["meals"][0]["total"] == expected
+        assert plan["meals"][0]["substitutions"] == [{"id": "s1", "total": {
+            "calories": 125, "protein": 4.0, "carbs": 25.0, "fat": 0.5, "fiber": 0.0, "quantity": 50,
+        }}]
+
+        payload["plans"][0]["meals"][0]["foods"].append({"food_id": 99, "quantity": 10})
+        r = client.post("/api/macros/compute", json=payload)
+        assert r.status_code == 422 and r.json()["detail"]["food_ids"] == ["99"]
+        bad = {"plans": [{"id": "p", "meals": [{"id": "m", "foods": [{"quantity": 10}]}]}]}
+        assert client.post("/api/macros/compute", json=bad).status_code == 422
+    finally:
+        food_search.set_index(None)
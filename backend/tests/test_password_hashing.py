@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services import password_hashing
+from app.services.password_hashing import PasswordHasher, PasswordHasherBusy
+
+
+def test_process_pool_round_trip():
+    hasher = PasswordHasher(workers=1, max_pending=4, rounds=4)
+    try:
+        hashed = asyncio.run(hasher.hash_password("Passw0rd1"))
+        assert asyncio.run(hasher.verify_password("Passw0rd1", hashed))
+        assert not hasher.verify_password_sync("wrong", hashed)
+    finally:
+        hasher.shutdown()
+    assert hasher.pending == 0
+
+
+def test_rejects_when_queue_is_full(monkeypatch):
+    gate = threading.Event()
+    monkeypatch.setattr(password_hashing, "_hashpw", lambda password, rounds: gate.wait(5) and "h")
+    hasher = PasswordHasher(workers=0, max_pending=1, rounds=4, retry_after=3)
+    try:
+        first = hasher._submit(password_hashing._hashpw, b"a", 4)
+        with pytest.raises(PasswordHasherBusy) as exc:
+            hasher.hash_password_sync("b")
+        assert exc.value.retry_after == 3
+        gate.set()
+        first.result(timeout=5)
+    finally:
+        gate.set()
+        hasher.shutdown()
@@ -0,0 +1,35 @@
+from app.rate_limit import MemoryRateLimitBackend, RateLimiter, SQLiteRateLimitBackend
+
+
+def _burst(backend, now):
+    return [backend.hit("k", now, 60 / 5, 60) for _ in range(6)]
+
+
+def test_gcra_allows_burst_then_rejects():
+    results = _burst(MemoryRateLimitBackend(), now=1000.0)
+    assert results[:5] == [0.0] * 5
+    assert results[5] > 0
+    # One interval later a single hit is allowed again
+    backend = MemoryRateLimitBackend()
+    _burst(backend, now=1000.0)
+    assert backend.hit("k", 1012.0, 12.0, 60) == 0.0
+
+
+def test_memory_backend_evicts_least_recently_used_keys():
+    backend = MemoryRateLimitBackend(max_keys=100)
+    limiter = RateLimiter("login", limit=5, backend=backend)
+    for i in range(1000):
+        limiter.hit(f"10.0.{i // 256}.{i % 256}")
+    assert len(backend) == 100
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    path = str(tmp_path / "limits.db")
+    worker_a, worker_b = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+    try:
+        for _ in range(5):
+            assert worker_a.hit("k", 1000.0, 12.0, 60) == 0.0
+        assert worker_b.hit("k", 1000.0, 12.0, 60) > 0
+    finally:
+        worker_a.close()
+        worker_b.close()
@@ -0,0 +1,43 @@
+import time
+
+from app.sessions import MemorySessionStore, SQLiteSessionStore
+
+
+def test_memory_store_sweeps_only_expired():
+    store = MemorySessionStore()
+    store.create("old", "u1", ttl=-1)
+    store.create("new", "u2", ttl=60)
+    assert store.get("old") is None
+    assert store.sweep() == 0  # already dropped on read
+    store.create("old2", "u3", ttl=-1)
+    assert store.sweep() == 1
+    assert len(store) == 1
+    assert store.get("new") == "u2"
+
+
+def test_memory_store_is_bounded():
+    store = MemorySessionStore(max_sessions=3)
+    for i in range(10):
+        store.create(f"s{i}", f"u{i}", ttl=60 + i)
+    assert len(store) == 3
+    # The sessions closest to expiry were evicted first
+    assert store.get("s0") is None
+    assert store.get("s9") == "u9"
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    worker_a = SQLiteSessionStore(path)
+    worker_b = SQLiteSessionStore(path)
+    try:
+        worker_a.create("sid", "u1", ttl=60)
+        assert worker_b.get("sid") == "u1"
+        worker_b.delete("sid")
+        assert worker_a.get("sid") is None
+
+        worker_a.create("gone", "u2", ttl=60)
+        assert worker_b.sweep(now=time.time() + 120) == 1
+        assert len(worker_a) == 0
+    finally:
+        worker_a.close()
+        worker_b.close()
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import store
+from app.models import InviteToken
+
+
+@pytest.fixture(autouse=True)
+def _empty_store():
+    store.clear()
+    yield
+    store.clear()
+
+
+def test_lookup_by_username_and_email_is_case_insensitive():
+    created = store.create_user_with_hash(username="Ana", name="Ana", password_hash="x", email="Ana@Example.com")
+    assert store.find_by_username("ana").id == created.id
+    assert store.find_by_email("ANA@example.com").id == created.id
+    assert store.find_by_username_or_email("ana@example.com").id == created.id
+    assert store.find_by_username_or_email("nobody") is None
+
+
+def test_duplicate_username_rejected():
+    store.create_user_with_hash(username="bob", name="Bob", password_hash="x")
+    with pytest.raises(ValueError):
+        store.create_user_with_hash(username="BOB", name="Bob 2", password_hash="y")
+
+
+def test_invite_token_hash_index_follows_replacement():
+    token = InviteToken(token_hash="h1", expires_at=datetime.utcnow() + timedelta(hours=1))
+    store.create_invite_token(token)
+    assert store.find_invite_token_by_hash("h1").id == token.id
+
+    store.create_invite_token(token.model_copy(update={"token_hash": "h2"}))
+    assert store.find_invite_token_by_hash("h1") is None
+    assert store.find_invite_token_by_hash("h2").id == token.id
@@ -0,0 +1,113 @@
+import math
+import random
+
+from fastapi.testclient import TestClient
+
+from app import db, food_search, security
+from app.food_search import FoodIndex
+from app.main import app
+from app.substitutions import SubstitutionIndex
+
+
+def _profile(food):
+    energy = [4 * food["protein_g"], 4 * food["carbs_g"], 9 * food["fat_g"]]
+    return [e / sum(energy) for e in energy]
+
+
+def test_nearest_foods_match_brute_force_and_grow_incrementally():
+    rng = random.Random(5)
+    foods = [
+        {"id": i, "food_name": f"Alimento {i}", "source": rng.choice(["TACO", "TBCA"]),
+         "category": rng.choice(["Cereais", "Carnes", None]), "protein_g": rng.uniform(0, 30),
+         "carbs_g": rng.uniform(0, 70), "fat_g": rng.uniform(0, 20), "energy_kcal": rng.uniform(50, 500)}
+        for i in range(200)
+    ]
+    foods.append({"id": "agua", "food_name": "Água", "source": "TACO", "protein_g": 0, "carbs_g": 0, "fat_g": 0})
+    index = SubstitutionIndex(foods)
+    assert len(index) == 200  # no calories, no profile
+
+    def expected(query, pool, k):
+        distances = sorted((math.dist(_profile(query), _profile(f)), str(f["id"])) for f in pool if f is not query)
+        return [food_id for _, food_id in distances[:k]]
+
+    query = foods[17]
+    items = index.substitutes("17", 150, k=8)
+    assert [item["id"] for item in items] == expected(query, foods[:200], 8)
+    for item in items:
+        # Same calories as 150 g of the original
+        assert abs(item["quantity"] * item["energy_kcal"] - 150 * query["energy_kcal"]) <= 0.5 * item["energy_kcal"]
+        assert item["macros"]["calories"] == round(150 * query["energy_kcal"] / 100)
+
+    same = [f for f in foods[:200] if f["source"] == query["source"] and f["category"] == query["category"]]
+    items = index.substitutes("17", 100, k=5, same_source=True, same_category=True)
+    assert [item["id"] for item in items] == expected(query, same, 5)
+    tbca = [f for f in foods[:200] if f["source"] == "TBCA"]
+    assert [item["id"] for item in index.substitutes("17", 100, k=5, sources=["tbca"])] == expected(query, tbca, 5)
+
+    # Appending past the initial capacity keeps earlier answers; private foods stay private
+    extra = [dict(f, id=f"c{f['id']}") for f in foods[:200]]
+    index.add(extra[:100], owner="u1")
+    index.add(extra[100:], owner="u1")
+    assert len(index) == 400
+    twin = index.substitutes("17", 100, k=1, owner="u1")[0]
+    assert twin["id"] == "c17" and twin["distance"] == 0
+    assert [item["id"] for item in index.substitutes("17", 150, k=8, owner="u2")] == expected(query, foods[:200], 8)
+    try:
+        index.substitutes("c17", 100, owner="u2")
+        assert False, "another user's food"
+    except KeyError:
+        pass
+
+
+def test_substitutes_and_custom_foods_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "app.db"))
+    db.init_db()
+    food_search.set_index(FoodIndex([
+        {"id": 1, "food_name": "Arroz, integral, cozido", "source": "TACO", "category": "Cereais e derivados",
+         "energy_kcal": 124, "protein_g": 2.6, "carbs_g": 25.8, "fat_g": 1.0, "fiber_g": 2.7},
+        {"id": 2, "food_name": "Macarrão, trigo, cru", "source": "TACO", "category": "Cereais e derivados",
+         "energy_kcal": 371, "protein_g": 10.0, "carbs_g": 77.9, "fat_g": 1.3, "fiber_g": 2.9},
+        {"id": 3, "food_name": "Frango, peito, sem pele, grelhado", "source": "TACO", "category": "Carnes e derivados",
+         "energy_kcal": 159, "protein_g": 32.0, "carbs_g": 0.0, "fat_g": 2.5, "fiber_g": 0},
+        {"id": 4, "food_name": "Tapioca, com manteiga", "source": "TBCA", "category": "Cereais e derivados",
+         "energy_kcal": 348, "protein_g": 0.1, "carbs_g": 63.6, "fat_g": 10.9, "fiber_g": 0},
+    ]))
+    client = TestClient(app)
+    try:
+        assert client.get("/api/foods/1/substitutes").status_code == 401
+        client.cookies.set("auth_token", security.issue_jwt("u1", "colaborador"))
+
+        body = client.get("/api/foods/1/substitutes", params={"grams": 150, "k": 2}).json()
+        assert [item["food_name"] for item in body["items"]] == ["Macarrão, trigo, cru", "Tapioca, com manteiga"]
+        # 150 g of rice (186 kcal) = 50 g of dry pasta
+        assert body["items"][0]["quantity"] == 50 and body["items"][0]["macros"]["calories"] == 186
+        items = client.get("/api/foods/1/substitutes", params={"same_source": True}).json()["items"]
+        assert [item["id"] for item in items] == ["2", "3"]
+        items = client.get("/api/foods/1/substitutes", params={"same_category": True, "sources": "TACO"}).json()["items"]
+        assert [item["id"] for item in items] == ["2"]
+        assert client.get("/api/foods/99/substitutes").status_code == 404
+
+        # A custom food joins the index at once, for its owner only (values per 30 g portion)
+        r = client.post("/api/foods/custom", json={
+            "food_name": "Cuscuz da casa", "grams": 30, "energy_kcal": 34, "carbs_g": 7.5, "protein_g": 0.7, "fat_g": 0.3,
+        })
+        assert r.status_code == 201
+        custom = r.json()
+        assert custom["source"] == "CUSTOM" and custom["energy_kcal"] == 113.3 and custom["portion_grams"] == 30
+        items = client.get("/api/foods/1/substitutes", params={"k": 1}).json()["items"]
+        assert items[0]["id"] == custom["id"]
+
+        client.cookies.set("auth_token", security.issue_jwt("u2", "colaborador"))
+        items = client.get("/api/foods/1/substitutes", params={"k": 1}).json()["items"]
+        assert items[0]["id"] == "2"
+        assert client.get(f"/api/foods/{custom['id']}/substitutes").status_code == 404
+
+        # It survives a catalog reload (rebuilt from alimentos_custom)
+        food_search.set_index(FoodIndex(food_search.get_index().items))
+        client.cookies.set("auth_token", security.issue_jwt("u1", "colaborador"))
+        assert client.get("/api/foods/1/substitutes", params={"k": 1}).json()["items"][0]["id"] == custom["id"]
+        assert client.post("/api/foods/custom", json={"food_name": "", "energy_kcal": 1, "carbs_g": 0,
+                                                      "protein_g": 0, "fat_g": 0}).status_code == 422
+    finally:
+        food_search.set_index(None)
+        db.close_pool()
@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app import organizations, supabase_client
+from app.invite_api import AsyncInviteTokenManager, InviteTokenManager
+from app.services.invite_tokens import hash_token
+from app.supabase_async import AsyncSupabase, AsyncSupabaseDAL
+from app.testing import supabase_fake
+from app.testing.supabase_fake import FakeSupabase
+
+
+def _dal(handler):
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncSupabaseDAL(AsyncSupabase("https://project.supabase.co", "service-key", http=http))
+
+
+def test_create_invite_costs_one_write_once_organization_is_cached():
+    organizations.invalidate()
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["apikey"] == "service-key"
+        calls.append((request.method, request.url.path))
+        if request.method == "GET" and request.url.path == "/rest/v1/organizations":
+            return httpx.Response(200, json=[{"id": "org-1"}])
+        if request.method == "POST" and request.url.path == "/rest/v1/invite_tokens":
+            row = json.loads(request.content)
+            return httpx.Response(201, json=[{**row, "created_at": "2026-01-01T00:00:00", "used_at": None}])
+        return httpx.Response(404, json={"message": "unexpected"})
+
+    async def run():
+        dal = _dal(handler)
+        manager = AsyncInviteTokenManager(dal)
+        try:
+            first = await manager.create_invite_token("New@Example.com", role="admin")
+            await manager.create_invite_token("other@example.com")
+            return first
+        finally:
+            await dal.db.aclose()
+
+    created = asyncio.run(run())
+    assert created.email == "new@example.com"
+    assert created.role == "admin"
+    assert calls == [
+        ("GET", "/rest/v1/organizations"),
+        ("POST", "/rest/v1/invite_tokens"),
+        ("POST", "/rest/v1/invite_tokens"),
+    ]
+    assert organizations.cache_stats()["hits"] >= 1
+
+
+def test_bulk_create_inserts_in_chunks_and_streams_records():
+    organizations.invalidate()
+    batches = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/rest/v1/organizations":
+            return httpx.Response(200, json=[{"id": "org-1"}])
+        assert request.headers["Prefer"] == "return=minimal"
+        batches.append(json.loads(request.content))
+        return httpx.Response(201)
+
+    async def run():
+        dal = _dal(handler)
+        manager = AsyncInviteTokenManager(dal)
+        entries = [(f"user{i}@example.com", "member") for i in range(1200)]
+        try:
+            chunks = await manager.create_invite_tokens_bulk(entries)
+            return [records async for records in chunks]
+        finally:
+            await dal.db.aclose()
+
+    streamed = asyncio.run(run())
+    assert [len(batch) for batch in batches] == [500, 500, 200]
+    assert [len(records) for records in streamed] == [500, 500, 200]
+    record, row = streamed[2][-1], batches[2][-1]
+    assert record["email"] == row["email"] == "user1199@example.com"
+    assert row["token_hash"] == hash_token(record["token"])
+    assert row["organization_id"] == "org-1"
+
+
+def test_sync_bulk_create_checks_every_role_before_writing(tmp_path, monkeypatch):
+    fake = FakeSupabase(str(tmp_path / "supabase.db"))
+    monkeypatch.setattr(supabase_client, "SUPABASE_FAKE", True)
+    monkeypatch.setattr(supabase_fake, "_fake", fake)
+    supabase = supabase_client.SupabaseClientRegistry().get()
+    manager = InviteTokenManager(supabase)
+    # The bad role is in the third chunk: nothing may be inserted before it is seen
+    entries = [(f"user{i}@example.com", "member") for i in range(1200)] + [("x@example.com", "superuser")]
+    try:
+        with pytest.raises(HTTPException) as excinfo:
+            manager.create_invite_tokens_bulk(iter(entries), organization_id="org-1")
+        assert excinfo.value.status_code == 400
+        assert fake.rows("invite_tokens") == []
+    finally:
+        supabase.close()
+
+
+def test_list_uses_keyset_cursor_and_status_filters():
+    seen = []
+    rows = [
+        {"id": f"00000000-0000-0000-0000-00000000000{i}", "email": f"a{i}@x.com", "role": "member",
+         "expires_at": "2026-02-01T00:00:00+00:00", "created_at": f"2026-01-0{9 - i}T00:00:00+00:00", "used_at": None}
+        for i in range(3)
+    ]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.params)
+        return httpx.Response(200, json=rows)
+
+    async def run():
+        dal = _dal(handler)
+        manager = AsyncInviteTokenManager(dal)
+        try:
+            first, cursor = await manager.list_invite_tokens("org-1", limit=2, status_filter="active", email_prefix="A")
+            await manager.list_invite_tokens("org-1", limit=2, cursor=cursor)
+            return first, cursor
+        finally:
+            await dal.db.aclose()
+
+    first, cursor = asyncio.run(run())
+    assert [item["email"] for item in first] == ["a0@x.com", "a1@x.com"]
+    assert first[0]["token"] == "[hidden]"
+    assert cursor is not None
+    assert seen[0]["limit"] == "3"
+    assert seen[0]["order"] == "created_at.desc,id.desc"
+    assert seen[0]["used_at"] == "is.null"
+    assert seen[0]["expires_at"].startswith("gte.")
+    assert seen[0]["email"] == "like.a*"
+    assert seen[1]["or"] == (
+        '(created_at.lt."2026-01-08T00:00:00+00:00",and(created_at.eq."2026-01-08T00:00:00+00:00",'
+        'id.lt.00000000-0000-0000-0000-000000000001))'
+    )
+
+
+def test_delete_expired_is_bounded_by_limit():
+    seen = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.method, request.url.params))
+        if request.method == "GET":
+            return httpx.Response(200, json=[{"id": "a"}, {"id": "b"}])
+        return httpx.Response(200, json=[{"id": "a"}, {"id": "b"}])
+
+    async def run():
+        dal = _dal(handler)
+        try:
+            return await dal.invite_tokens.delete_expired("2026-01-01T00:00:00", "2025-12-01T00:00:00", limit=2)
+        finally:
+            await dal.db.aclose()
+
+    assert asyncio.run(run()) == 2
+    (get, select_params), (delete, delete_params) = seen
+    assert (get, delete) == ("GET", "DELETE")
+    assert select_params["limit"] == "2"
+    assert select_params["or"] == '(expires_at.lt."2026-01-01T00:00:00",used_at.lt."2025-12-01T00:00:00")'
+    assert delete_params["id"] == "in.(a,b)"
+
+
+def test_api_errors_surface_status_and_message():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"msg": "Invalid login credentials"})
+
+    async def run():
+        dal = _dal(handler)
+        try:
+            await dal.db.sign_in_with_password("a@b.c", "bad")
+        except Exception as e:
+            return e
+        finally:
+            await dal.db.aclose()
+
+    error = asyncio.run(run())
+    assert error.status_code == 400
+    assert error.message == "Invalid login credentials"
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import supabase_client
+from app.supabase_async import AsyncSupabase, AsyncSupabaseDAL, SupabaseAPIError
+from app.testing import supabase_fake
+from app.testing.supabase_fake import FAKE_URL, FakeSupabase
+
+
+def _dal(fake: FakeSupabase) -> AsyncSupabaseDAL:
+    http = httpx.AsyncClient(transport=fake.async_transport())
+    return AsyncSupabaseDAL(AsyncSupabase(FAKE_URL, fake.service_role_key, http=http))
+
+
+def test_fake_postgrest_filters_order_and_constraints():
+    fake = FakeSupabase()
+
+    async def run():
+        dal = _dal(fake)
+        rows = [
+            {"id": f"00000000-0000-0000-0000-00000000000{i}", "token_hash": f"h{i}", "email": f"user{i}@x.com",
+             "role": "member", "created_at": f"2026-01-0{i}T00:00:00", "expires_at": "2030-01-01T00:00:00",
+             "used_at": "2026-02-01T00:00:00" if i == 1 else None}
+            for i in range(1, 5)
+        ]
+        await dal.invite_tokens.insert_many(rows)
+        with pytest.raises(SupabaseAPIError) as excinfo:
+            await dal.invite_tokens.insert(dict(rows[0]))
+        assert excinfo.value.status_code == 409
+
+        listed = await dal.invite_tokens.list(filters=[("used_at", "is", None), ("email", "like", "user*")], limit=2)
+        assert [r["email"] for r in listed] == ["user4@x.com", "user3@x.com"]
+        after = await dal.invite_tokens.list(filters=[(
+            "or", None, '(created_at.lt."2026-01-03T00:00:00",and(created_at.eq."2026-01-03T00:00:00",id.lt.0))'
+        )])
+        assert [r["email"] for r in after] == ["user2@x.com", "user1@x.com"]
+
+        assert await dal.invite_tokens.delete_expired("2020-01-01T00:00:00", "2026-03-01T00:00:00") == 1
+        assert len(fake.rows("invite_tokens")) == 3
+        await dal.db.aclose()
+
+    asyncio.run(run())
+
+
+def test_fake_gotrue_sign_in_and_user_lookup():
+    fake = FakeSupabase()
+
+    async def run():
+        dal = _dal(fake)
+        created = await dal.db.create_user("Owner@x.com", "pw-123456")
+        session = await dal.db.sign_in_with_password("owner@x.com", "pw-123456")
+        assert session["user"]["id"] == created["id"]
+        assert (await dal.db.get_user(session["access_token"]))["email"] == "owner@x.com"
+        assert await dal.db.get_user("not-a-token") is None
+        with pytest.raises(SupabaseAPIError) as excinfo:
+            await dal.db.sign_in_with_password("owner@x.com", "wrong")
+        assert excinfo.value.status_code == 400
+        await dal.db.aclose()
+
+    asyncio.run(run())
+
+
+def test_supabase_py_client_switches_to_fake(monkeypatch, tmp_path):
+    fake = FakeSupabase(str(tmp_path / "supabase.db"))
+    monkeypatch.setattr(supabase_client, "SUPABASE_FAKE", True)
+    monkeypatch.setattr(supabase_fake, "_fake", fake)
+    client = supabase_client.SupabaseClientRegistry().get()
+    try:
+        created = client.auth.admin.create_user({"email": "a@x.com", "password": "pw-123456", "email_confirm": True})
+        assert [u.email for u in client.auth.admin.list_users()] == ["a@x.com"]
+        client.table("user_roles").insert(
+            [{"user_id": created.user.id, "organization_id": "org", "role": "admin", "created_at": "2026-01-01"}]
+            + [{"user_id": f"u{i}", "organization_id": "org", "role": "member", "created_at": f"2026-01-0{i}"}
+               for i in (2, 3, 4)]
+        ).execute()
+        client.table("user_roles").update({"role": "owner"}).eq("user_id", created.user.id).execute()
+        rows = (
+            client.table("user_roles").select("user_id, role").eq("organization_id", "org")
+            .lt("created_at", "2026-01-04").order("created_at", desc=True).limit(2).execute().data
+        )
+        assert rows == [{"user_id": "u3", "role": "member"}, {"user_id": "u2", "role": "member"}]
+        client.table("user_roles").delete().eq("user_id", "u4").execute()
+
+        # A second fake on the same file sees the same rows, users and signing key
+        other = FakeSupabase(str(tmp_path / "supabase.db"))
+        assert {r["role"] for r in other.rows("user_roles")} == {"owner", "member"}
+        token = other.access_token(created.user.id)
+        assert client.auth.get_user(token).user.email == "a@x.com"
+    finally:
+        client.close()
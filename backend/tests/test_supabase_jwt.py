@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+os.environ.setdefault("CORS_ORIGINS", "*")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import invite_routes, supabase_jwt  # noqa: E402
+from app.main import app  # noqa: E402
+from app.supabase_jwt import JWKSCache, LocalVerificationUnavailable, SupabaseTokenVerifier  # noqa: E402
+from app.testing.jwks import LocalJWKS  # noqa: E402
+
+
+@pytest.fixture
+def local_jwks(monkeypatch):
+    monkeypatch.setattr(supabase_jwt, "JWKS_MIN_REFRESH_SECS", 0)
+    jwks = LocalJWKS()
+    verifier = SupabaseTokenVerifier(jwks=JWKSCache("local", fetch=jwks.fetch))
+    supabase_jwt.set_token_verifier(verifier)
+    invite_routes._role_cache.clear()
+    yield jwks, verifier
+    supabase_jwt.set_token_verifier(None)
+    invite_routes._role_cache.clear()
+
+
+def test_verifies_signature_and_expiry_locally(local_jwks):
+    jwks, verifier = local_jwks
+    assert verifier.verify(jwks.issue("user-1"))["sub"] == "user-1"
+    assert verifier.verify(jwks.issue("user-1", ttl=-60)) is None
+    forged = jwks.issue("user-1")[:-4] + "AAAA"
+    assert verifier.verify(forged) is None
+
+
+def test_unknown_kid_refreshes_once_then_defers(local_jwks):
+    jwks, verifier = local_jwks
+    verifier.verify(jwks.issue("user-1"))
+    fetches = jwks.fetch_count
+    jwks.rotate()
+    assert verifier.verify(jwks.issue("user-2"))["sub"] == "user-2"
+    assert jwks.fetch_count == fetches + 1
+
+    with pytest.raises(LocalVerificationUnavailable):
+        verifier.verify(LocalJWKS(jwks.algorithm).issue("user-3"))
+
+
+def test_invite_list_has_no_remote_calls_in_steady_state(local_jwks, monkeypatch):
+    jwks, _ = local_jwks
+    role_lookups = []
+
+    async def fake_load(user_id):
+        role_lookups.append(user_id)
+        return {"role": "owner", "organization_id": "org-1"}
+
+    async def fake_list(organization_id=None, **page):
+        return [], None
+
+    monkeypatch.setattr(invite_routes, "_load_user_role", fake_load)
+    monkeypatch.setattr(invite_routes.invite_manager, "list_invite_tokens", fake_list)
+    monkeypatch.setattr(invite_routes, "require_async_dal", None)  # any remote call would fail
+
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {jwks.issue('owner-1')}"}
+    for _ in range(3):
+        r = client.get("/api/invite/list", headers=headers)
+        assert r.status_code == 200
+        assert r.json() == {"items": [], "next_cursor": None}
+    assert role_lookups == ["owner-1"]
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+from app import db
+
+
+@pytest.fixture()
+def token_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "app.db"))
+    db.init_db()
+    master_id = db.create_usuario("Master", "master@example.com", "x", "master")
+    yield master_id
+    db.close_pool()
+
+
+def test_cursor_pages_cover_every_token_once(token_db, monkeypatch):
+    # Same timestamp for everything, so the id tie-break has to do the work
+    monkeypatch.setattr(db, "_now_iso", lambda: "2026-01-01T00:00:00Z")
+    ids = {db.insert_token(token_db)[0] for _ in range(45)}
+
+    seen, cursor, sizes = [], None, []
+    while True:
+        items, cursor = db.list_tokens_page(limit=20, cursor=cursor)
+        sizes.append(len(items))
+        seen.extend(item["id"] for item in items)
+        if cursor is None:
+            break
+    assert sizes == [20, 20, 5]
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_status_filter_and_index_backed_plan(token_db):
+    used_id, _ = db.insert_token(token_db)
+    db.insert_token(token_db)
+    assert db.mark_token_used(used_id)
+    assert not db.mark_token_used(used_id)  # single-use: a second claim loses
+    assert db.create_usuario_with_token(used_id, "Ana", "ana@example.com", "x", "colaborador") is None
+
+    used, _ = db.list_tokens_page(status="used")
+    active, _ = db.list_tokens_page(status="active")
+    assert [t["id"] for t in used] == [used_id]
+    assert len(active) == 1 and active[0]["id"] != used_id
+    assert set(used[0]) == {"id", "usado", "criado_por", "criado_em", "usado_em"}  # nothing token-shaped
+
+    with db._connection() as conn:
+        plan = " ".join(
+            row["detail"]
+            for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM tokens_convite WHERE usado = 0 AND (criado_em, id) < (?, ?) "
+                "ORDER BY criado_em DESC, id DESC LIMIT 21",
+                ("2026", "x"),
+            )
+        )
+    assert "idx_tokens_convite_usado" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_failed_sign_up_leaves_the_token_unused(token_db):
+    token_id, token = db.insert_token(token_db)
+    # master@example.com is taken: the insert fails and the claim is rolled back with it
+    with pytest.raises(sqlite3.IntegrityError):
+        db.create_usuario_with_token(token_id, "Outro", "master@example.com", "x", "colaborador")
+    assert not db.get_token_record_by_token(token)["usado"]
+
+    user_id = db.create_usuario_with_token(token_id, "Ana", "Ana@example.com", "x", "colaborador")
+    assert db.get_usuario_by_email("ana@example.com")["id"] == user_id
+    assert db.get_token_record_by_token(token)["usado"]
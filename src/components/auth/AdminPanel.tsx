@@ -8,7 +8,7 @@ interface AdminPanelProps {
 }
 
 export const AdminPanel: React.FC<AdminPanelProps> = ({ onClose }) => {
-  const [inviteTokens, setInviteTokens] = useState<Array<{ id: string; token: string; criado_em?: string; usado?: boolean }>>([])
+  const [inviteTokens, setInviteTokens] = useState<Array<{ id: string; criado_em?: string; usado?: boolean }>>([])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
   const [newTokenExpiresIn, setNewTokenExpiresIn] = useState(7)
@@ -103,8 +103,9 @@ export const AdminPanel: React.FC<AdminPanelProps> = ({ onClose }) => {
                       <div className="flex justify-between items-center">
                         <div className="flex-1">
                           <div className="flex items-center space-x-4">
+                            {/* Only the HMAC is stored: the token itself is shown once, when it is generated */}
                             <div>
-                              <p className="font-mono text-sm bg-gray-100 dark:bg-gray-800 px-2 py-1 rounded">{token.token}</p>
+                              <p className="font-mono text-sm bg-gray-100 dark:bg-gray-800 px-2 py-1 rounded">ID: {token.id}</p>
                             </div>
                             <div className="text-sm text-gray-600 dark:text-gray-400">Criado em: {token.criado_em}</div>
                             <div className="text-sm">Usado? {isUsed ? 'Sim' : 'Não'}</div>